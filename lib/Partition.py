@@ -1,6 +1,8 @@
 
 import re
+import numpy as np
 import detMetrics as dm
+from queryMasks import queryMasks
 from itertools import product
 from collections import OrderedDict
 import pandas as pd
@@ -13,7 +15,7 @@ class Partition:
        DetMetric objects.
     """
 
-    def __init__(self, dataframe, query, factor_mode, fpr_stop=1, isCI=False, ciLevel=0.9, dLevel=0.0, total_num=1, sys_res='all', overlap_cols=['ProbeFileID']):
+    def __init__(self, dataframe, query, factor_mode, fpr_stop=1, isCI=False, ciLevel=0.9, dLevel=0.0, total_num=1, sys_res='all', overlap_cols=['ProbeFileID'], pool=None):
         """Constructor
         Attributes:
         - factor_mode : 'q' = single query
@@ -52,9 +54,13 @@ class Partition:
             self.part_query_list = self.gen_part_query_list()
             self.n_partitions = len(self.part_values_list)
 
-        self.part_df_list = self.gen_part_df_list(dataframe)
+        part_points = None
+        if self.factor_mode == 'qp':
+            self.part_df_list, part_points = self.gen_part_grid(dataframe)
+        else:
+            self.part_df_list = self.gen_part_df_list(dataframe)
         self.part_dm_list = self.gen_part_dm_list(
-            fpr_stop, isCI, ciLevel, dLevel, total_num, sys_res)
+            fpr_stop, isCI, ciLevel, dLevel, total_num, sys_res, pool, part_points)
 
     def gen_index_factor(self, list_factors):
         """ Function used only in the constructor,
@@ -140,13 +146,16 @@ class Partition:
             generated according to its query in part_query_list.
         """
         df = df.fillna("")
+        masks = queryMasks(df)
         df_list = list()
         for query in self.part_query_list:
             #            df_list.append(df.query(query))
             if self.factor_mode == 'qm':
                 # testing as the manipulation task
-                query = "(" + query + " and IsTarget == ['Y']) or IsTarget == ['N']"
-                print("Query for target trials: {}".format(query))
+                print("Query for target trials: {}".format("(" + query + " and IsTarget == ['Y']) or IsTarget == ['N']"))
+                sub_df = df[(masks.mask(query) & masks.mask("IsTarget == ['Y']")) | masks.mask("IsTarget == ['N']")]
+            else:
+                sub_df = masks.select(query)
 
 #                #TBD:while testing by each task (remove, add, clone), may need to drop_duplicates by the chosen column in the tf mode
 #                operators = ['!=', '==']
@@ -154,7 +163,6 @@ class Partition:
 #                    chosenField = [x.strip() for x in query.replace('!=', '==').split('==')]
 #                    new_df = sub_df.drop_duplicates('ProbeFileID', chosenField[0])
 
-            sub_df = df.query(query)
             new_df = sub_df.drop_duplicates(subset=self.overlap_cols)
             #print("sub_df data {}".format(sub_df))
             #print("sub_df data size {}".format(sub_df.shape))
@@ -175,19 +183,77 @@ class Partition:
 
         return df_list
 
-    def gen_part_dm_list(self, fpr_stop, isCI, ciLevel, dLevel, total_num, sys_res):
+    def gen_part_grid(self, df):
+        """ Function used only in the constructor,
+            should'nt be called outside of the class.
+
+            This function computes each partition's dataframe in 'qp' mode
+            as gen_part_df_list does, along with its ROC points, in one pass
+            over the dataframe rather than one query per partition.
+            Each row is given the number of its partition in part_values_list,
+            and the ROC points of all the partitions are then computed at once
+            by detMetrics.Metrics.compute_points_grouped.
+        """
+        df = df.fillna("")
+        d = OrderedDict(self.factors_dict)
+        L_num = d.pop('Numericals_factors_conditions')
+        del d['Numericals_factors']
+        if len(L_num) > 0:
+            df = queryMasks(df).select(' & '.join(L_num))
+
+        # number the partitions as in the cartesian product of gen_part_values_list.
+        # A value repeated in a factor's list is a level of its own, so the rows with
+        # that value are repeated, once for each of its levels
+        row_ix = np.arange(df.shape[0])
+        codes = np.zeros(df.shape[0], dtype=np.int64)
+        for factor, values in d.items():
+            values = eval(values)
+            levels = OrderedDict()
+            for i, x in enumerate(values):
+                levels.setdefault(x, []).append(i)
+            level_table = np.full((len(levels) + 1, max([len(v) for v in levels.values()] + [1])), -1, dtype=np.int64)
+            for u, ix in enumerate(levels.values()):
+                level_table[u, :len(ix)] = ix
+            # the values not in the list take the last row of the table, which has no levels
+            col = df[factor].iloc[row_ix]
+            value_ix = col.map(dict((x, u) for u, x in enumerate(levels))).fillna(len(levels)).values.astype(np.int64)
+            n_match = (level_table >= 0).sum(axis=1)[value_ix]
+            rep = np.repeat(np.arange(row_ix.size), n_match)
+            # the k-th copy of a row takes the k-th level of its value
+            k = np.arange(rep.size) - np.repeat(np.cumsum(n_match) - n_match, n_match)
+            row_ix = row_ix[rep]
+            codes = codes[rep] * len(values) + level_table[value_ix[rep], k]
+
+        part_col = '_partition'
+        df = df.iloc[row_ix].assign(**{part_col: codes})
+        # Removing duplicates within each partition, in case the data were merged by the JTmask metadata
+        df = df.drop_duplicates(subset=list(self.overlap_cols) + [part_col])
+        codes = df[part_col].values
+        df = df.drop(part_col, axis=1)
+
+        rows = df.groupby(codes, sort=False).indices
+        empty = df.iloc[0:0]
+        df_list = [df.iloc[rows[i]] if i in rows else empty for i in range(self.n_partitions)]
+        points = dm.Metrics.compute_points_grouped(df['ConfidenceScore'].values, df['IsTarget'].values == 'Y',
+                                                  codes, self.n_partitions)
+        return df_list, points
+
+    def gen_part_dm_list(self, fpr_stop, isCI, ciLevel, dLevel, total_num, sys_res, pool=None, part_points=None):
         """ Function used only in the constructor,
             should'nt be called outside of the class.
 
             This function creates and store each partition's detMetric
-            object according to its dataframe in part_df_list.
+            object according to its dataframe in part_df_list, and its
+            ROC points in part_points if these are already computed.
         """
         dm_list = list()
-        for df, query in zip(self.part_df_list, self.part_query_list):
+        if part_points is None:
+            part_points = [None] * len(self.part_df_list)
+        for df, query, points in zip(self.part_df_list, self.part_query_list, part_points):
             if not df.empty:
                 print("Current query: {}".format(query))
                 dm_list.append(dm.detMetrics(
-                    df['ConfidenceScore'], df['IsTarget'], fpr_stop, isCI, ciLevel, dLevel, total_num, sys_res))
+                    df['ConfidenceScore'], df['IsTarget'], fpr_stop, isCI, ciLevel, dLevel, total_num, sys_res, pool, points))
             else:
                 print(
                     '#### Error: Empty DataFrame for this query "{}"\n#### Please verify factors conditions.'.format(query))
@@ -227,11 +293,16 @@ class Partition:
                         'CDR@FAR': dm.tpr_at_fpr,
                         'AUC_CI_LOWER@FAR': dm.ci_lower,
                         'AUC_CI_UPPER@FAR': dm.ci_upper,
+                        'CDR_CI_LOWER@FAR': dm.ci_cdr_lower,
+                        'CDR_CI_UPPER@FAR': dm.ci_cdr_upper,
+                        'EER_CI_LOWER': dm.ci_eer_lower,
+                        'EER_CI_UPPER': dm.ci_eer_upper,
                         'TRR': dm.trr,
                         'SYS_RESPONSE': dm.sys_res}
                 index = ['Q' + str(i)]
                 columns = ['QUERY', 'AUC', 'EER', 'FAR_STOP', 'AUC@FAR', 'CDR@FAR', 'AUC_CI_LOWER@FAR',
-                           'AUC_CI_UPPER@FAR', 'TRR', 'SYS_RESPONSE']
+                           'AUC_CI_UPPER@FAR', 'CDR_CI_LOWER@FAR', 'CDR_CI_UPPER@FAR', 'EER_CI_LOWER', 'EER_CI_UPPER',
+                           'TRR', 'SYS_RESPONSE']
                 df_list.append(pd.DataFrame(data, index, columns).round(6))
             return df_list
 
@@ -239,7 +310,8 @@ class Partition:
             data = dict()
             # Looking for the values of each fields
             data = {'AUC': [], 'EER': [], 'FAR_STOP': [], 'AUC@FAR': [], 'CDR@FAR': [],
-                    'AUC_CI_LOWER@FAR': [], 'AUC_CI_UPPER@FAR': [], 'TRR': [], 'SYS_RESPONSE': []}
+                    'AUC_CI_LOWER@FAR': [], 'AUC_CI_UPPER@FAR': [], 'CDR_CI_LOWER@FAR': [], 'CDR_CI_UPPER@FAR': [],
+                    'EER_CI_LOWER': [], 'EER_CI_UPPER': [], 'TRR': [], 'SYS_RESPONSE': []}
             for i, partition in enumerate(self.part_values_list):
                 for field in self.factors_order:
                     full_condition = partition[find_factor_list_pos(partition, field)]
@@ -261,12 +333,17 @@ class Partition:
                 data['CDR@FAR'].append(dm.tpr_at_fpr)
                 data['AUC_CI_LOWER@FAR'].append(dm.ci_lower)
                 data['AUC_CI_UPPER@FAR'].append(dm.ci_upper)
+                data['CDR_CI_LOWER@FAR'].append(dm.ci_cdr_lower)
+                data['CDR_CI_UPPER@FAR'].append(dm.ci_cdr_upper)
+                data['EER_CI_LOWER'].append(dm.ci_eer_lower)
+                data['EER_CI_UPPER'].append(dm.ci_eer_upper)
                 data['TRR'].append(dm.trr)
                 data['SYS_RESPONSE'].append(dm.sys_res)
 
             columns = list(self.factors_order)
             columns.extend(['AUC', 'EER', 'FAR_STOP', 'AUC@FAR', 'CDR@FAR', 'AUC_CI_LOWER@FAR',
-                            'AUC_CI_UPPER@FAR', 'TRR', 'SYS_RESPONSE'])
+                            'AUC_CI_UPPER@FAR', 'CDR_CI_LOWER@FAR', 'CDR_CI_UPPER@FAR', 'EER_CI_LOWER', 'EER_CI_UPPER',
+                            'TRR', 'SYS_RESPONSE'])
             index = ['P' + str(i) for i in range(self.n_partitions)]
             df = pd.DataFrame(data, index, columns).round(6)
             return df
@@ -5,6 +5,7 @@ from itertools import product
 from collections import OrderedDict
 import pandas as pd
 import numpy as np
+from queryMasks import queryMasks
 
 class Partition:
     """This class represents a set of partitions for a single panda's dataframe,
@@ -175,6 +176,8 @@ class Partition:
             opt_out_col = 'ProbeStatus'
             #TODO: something with splice. See the splice average for implementation.
 
+        #the conditions shared by the queries, e.g. the factors of the partitions, are evaluated once
+        masks = queryMasks(df)
         #TODO: for each of these, generate its own individual values for TRR, etc.
         for query in self.part_query_list:
 #            df_list.append(df.query(query))
@@ -186,7 +189,7 @@ class Partition:
 #                    new_df = sub_df.drop_duplicates('ProbeFileID', chosenField[0])
 
             try:
-                sub_df = df.query(query)
+                sub_df = masks.select(query)
             except pd.computation.ops.UndefinedVariableError:
                 print("The query '{}' doesn't seem to refer to a valid key. Partitioning has failed. Please correct the query and try again.".format(query))
                 exit(1)
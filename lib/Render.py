@@ -42,12 +42,16 @@ class Render:
         multi_fig: generate a single curve plot per partition
         """
 
-        if not display:
-            import matplotlib
-            matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-
-        fig = plt.figure(num=fig_number, figsize=(7, 6.5), dpi=120, facecolor='w', edgecolor='k')
+        if display:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(num=fig_number, figsize=(7, 6.5), dpi=120, facecolor='w', edgecolor='k')
+        else:
+            # drawn on its own Agg canvas, which needs no display whichever backend pyplot is set to
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(figsize=(7, 6.5), dpi=120, facecolor='w', edgecolor='k')
+            FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
         nb_dm_objects = len(dm_list)
         # DET curve settings
         if self.plot_opts['plot_type'] == 'DET':
@@ -66,15 +70,15 @@ class Render:
                              '5', '10', '20', '40', '60', '80', '90', '95', '98', '99', '99.5', '99.9']
 
             if multi_fig:
-                plt.plot(norm_fprs[0], norm_fnrs[0], **self.opts_list[fig_number])
+                ax.plot(norm_fprs[0], norm_fnrs[0], **self.opts_list[fig_number])
             else:
                 for i, points in enumerate(zip(norm_fprs, norm_fnrs)):
                     fpr, fnr = points
-                    plt.plot(fpr, fnr, **self.opts_list[i])
+                    ax.plot(fpr, fnr, **self.opts_list[i])
 
-            plt.xlim([0, 1])
-            plt.ylim([0, 1])
-#            plt.plot((1, 0), 'k--', lw=2)
+            ax.set_xlim([0, 1])
+            ax.set_ylim([0, 1])
+#            ax.plot((1, 0), 'k--', lw=2)
 
             # display the eer when there is only one curve
             if nb_dm_objects == 1:
@@ -82,31 +86,31 @@ class Render:
                 norm_fnrs_pos_ci = list(map(norm.ppf, DM.fnr + DM.ci_tpr))
                 norm_fnrs_neg_ci = list(map(norm.ppf, DM.fnr - DM.ci_tpr))
                 norm_fpr = list(map(norm.ppf, DM.fpr))
-                plt.plot(norm_fpr, norm_fnrs_pos_ci, 'k--')
-                plt.plot(norm_fpr, norm_fnrs_neg_ci, 'k--')
+                ax.plot(norm_fpr, norm_fnrs_pos_ci, 'k--')
+                ax.plot(norm_fpr, norm_fnrs_neg_ci, 'k--')
 
                 if isNoNumber:
                     if isOptOut:
-                        plt.annotate("trEER = %.2f (TRR: %.2f)" % (DM.eer * 100, DM.trr), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
+                        ax.annotate("trEER = %.2f (TRR: %.2f)" % (DM.eer * 100, DM.trr), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
                                      xytext=(norm.ppf(DM.eer + 0.05) + 0.5, norm.ppf(DM.eer + 0.05) + 0.5), textcoords='data',
                                      arrowprops=dict(arrowstyle="-|>",
                                                      connectionstyle="arc3, rad=+0.2", fc="w"),
                                      size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"),)
                     else:
-                        plt.annotate("EER = %.2f%%" % (DM.eer * 100), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
+                        ax.annotate("EER = %.2f%%" % (DM.eer * 100), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
                                      xytext=(norm.ppf(DM.eer + 0.05) + 0.5, norm.ppf(DM.eer + 0.05) + 0.5), textcoords='data',
                                      arrowprops=dict(arrowstyle="-|>",
                                                      connectionstyle="arc3, rad=+0.2", fc="w"),
                                      size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"),)
                 else:
                     if isOptOut:
-                        plt.annotate("trEER = %.2f \n(TRR: %.2f, T#: %d, NT#: %d)" % (DM.eer * 100, DM.trr, DM.t_num, DM.nt_num), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
+                        ax.annotate("trEER = %.2f \n(TRR: %.2f, T#: %d, NT#: %d)" % (DM.eer * 100, DM.trr, DM.t_num, DM.nt_num), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
                                      xytext=(norm.ppf(DM.eer + 0.05) + 0.5, norm.ppf(DM.eer + 0.05) + 0.5), textcoords='data',
                                      arrowprops=dict(arrowstyle="-|>",
                                                      connectionstyle="arc3, rad=+0.2", fc="w"),
                                      size=9, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"),)
                     else:
-                        plt.annotate("EER = %.2f \n(T#: %d, NT#: %d)" % (DM.eer * 100, DM.t_num, DM.nt_num), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
+                        ax.annotate("EER = %.2f \n(T#: %d, NT#: %d)" % (DM.eer * 100, DM.t_num, DM.nt_num), xy=(norm.ppf(DM.eer), norm.ppf(DM.eer)), xycoords='data',
                                      xytext=(norm.ppf(DM.eer + 0.05) + 0.5, norm.ppf(DM.eer + 0.05) + 0.5), textcoords='data',
                                      arrowprops=dict(arrowstyle="-|>",
                                                      connectionstyle="arc3, rad=+0.2", fc="w"),
@@ -122,40 +126,40 @@ class Render:
             fprs = [dm.fpr for dm in dm_list]
 
             if multi_fig:
-                plt.plot(fprs[0], tprs[0], **self.opts_list[fig_number])
+                ax.plot(fprs[0], tprs[0], **self.opts_list[fig_number])
             else:
                 for i, points in enumerate(zip(fprs, tprs)):
                     fpr, tpr = points
-                    plt.plot(fpr, tpr, **self.opts_list[i])
+                    ax.plot(fpr, tpr, **self.opts_list[i])
 
-            plt.plot((0, 1), '--', lw=0.5)  # plot bisector
-            plt.xlim([0, 1])
-            plt.ylim([0, 1])
+            ax.plot((0, 1), '--', lw=0.5)  # plot bisector
+            ax.set_xlim([0, 1])
+            ax.set_ylim([0, 1])
 
             # We display the confidence interval when there is only one curve
             if nb_dm_objects == 1:
                 DM = dm_list[0]
-                plt.plot(DM.fpr, DM.tpr + DM.ci_tpr, 'k--')
-                plt.plot(DM.fpr, DM.tpr - DM.ci_tpr, 'k--')
+                ax.plot(DM.fpr, DM.tpr + DM.ci_tpr, 'k--')
+                ax.plot(DM.fpr, DM.tpr - DM.ci_tpr, 'k--')
 
                 if isNoNumber:  # deleted at FAR=%.2f and DM.fpr_stop,
                     if isOptOut:
-                        plt.annotate("trAUC=%.2f\n(TRR: %.2f)" % (DM.auc, DM.trr), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
+                        ax.annotate("trAUC=%.2f\n(TRR: %.2f)" % (DM.auc, DM.trr), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
                                      size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"))
                     else:
-                        plt.annotate("AUC=%.2f" % (DM.auc), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
+                        ax.annotate("AUC=%.2f" % (DM.auc), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
                                      size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"))
 
                 else:
                     if isOptOut:
-                        plt.annotate("trAUC=%.2f\n(TRR: %.2f, T#: %d, NT#: %d) " % (DM.auc, DM.trr, DM.t_num, DM.nt_num), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
+                        ax.annotate("trAUC=%.2f\n(TRR: %.2f, T#: %d, NT#: %d) " % (DM.auc, DM.trr, DM.t_num, DM.nt_num), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
                                      size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"))
                     else:
-                        plt.annotate("AUC=%.2f\n(T#: %d, NT#: %d) " % (DM.auc, DM.t_num, DM.nt_num), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
+                        ax.annotate("AUC=%.2f\n(T#: %d, NT#: %d) " % (DM.auc, DM.t_num, DM.nt_num), xy=(0.7, 0.2), xycoords='data', xytext=(0.7, 0.2), textcoords='data',
                                      size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"))
 
 
-#                plt.annotate("d = %.2f" %(DM.d), xy=(DM.dpoint[0], DM.dpoint[1]), xycoords='data', xytext=(0.9,0.5), textcoords='data',
+#                ax.annotate("d = %.2f" %(DM.d), xy=(DM.dpoint[0], DM.dpoint[1]), xycoords='data', xytext=(0.9,0.5), textcoords='data',
 #                     size=10, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"),)
                 if DM.d is not None:
                     x = DM.dpoint[0]
@@ -167,33 +171,35 @@ class Render:
                     elif (y >= .9):
                         y -= .1
 
-                    plt.annotate("d' = %.2f" % (DM.d), xy=(DM.dpoint[0], DM.dpoint[1]), xycoords='data',
+                    ax.annotate("d' = %.2f" % (DM.d), xy=(DM.dpoint[0], DM.dpoint[1]), xycoords='data',
                                  xytext=(x, y), textcoords='data',
                                  # http://matplotlib.org/examples/pylab_examples/annotation_demo2.html
                                  arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=0"),
                                  size=8, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"))
 
-#                plt.annotate("a' = %.2f" %(DM.a),xy=(DM.apoint[0], DM.apoint[1]), xycoords='data',
+#                ax.annotate("a' = %.2f" %(DM.a),xy=(DM.apoint[0], DM.apoint[1]), xycoords='data',
 #                             xytext=(DM.apoint[0]+0.1, DM.apoint[1]+0.1), textcoords='data',
 #                             arrowprops=dict(arrowstyle="-|>", connectionstyle="arc3, rad=+0.1", fc="w"),
 # size=10, va='center', ha='center', bbox=dict(boxstyle="round4",
 # fc="w"),)
 
                 # TODO: how to add variable here for fpr_stop
-#                plt.annotate("PAUC = %.2f%% at FAR=" %(pauc*100), xy=(0.7,0.2), xycoords='data', xytext=(0.7,0.2), textcoords='data',
+#                ax.annotate("PAUC = %.2f%% at FAR=" %(pauc*100), xy=(0.7,0.2), xycoords='data', xytext=(0.7,0.2), textcoords='data',
 #                     size=12, va='center', ha='center', bbox=dict(boxstyle="round4", fc="w"),)
 
-        plt.xticks(xytick, x_tick_labels, size=self.plot_opts['xticks_size'])
-        plt.yticks(xytick, y_tick_labels, size=self.plot_opts['yticks_size'])
-        plt.suptitle(self.plot_opts['title'], fontsize=self.plot_opts['title_fontsize'])
-        plt.title(self.plot_opts['subtitle'], fontsize=self.plot_opts['subtitle_fontsize'])
-        plt.xlabel(self.plot_opts['xlabel'], fontsize=self.plot_opts['xlabel_fontsize'])
+        ax.set_xticks(xytick)
+        ax.set_xticklabels(x_tick_labels, size=self.plot_opts['xticks_size'])
+        ax.set_yticks(xytick)
+        ax.set_yticklabels(y_tick_labels, size=self.plot_opts['yticks_size'])
+        fig.suptitle(self.plot_opts['title'], fontsize=self.plot_opts['title_fontsize'])
+        ax.set_title(self.plot_opts['subtitle'], fontsize=self.plot_opts['subtitle_fontsize'])
+        ax.set_xlabel(self.plot_opts['xlabel'], fontsize=self.plot_opts['xlabel_fontsize'])
 
         if self.plot_opts['plot_type'] == 'ROC':
-            plt.ylabel("Correct Detection Rate [%]", fontsize=self.plot_opts['ylabel_fontsize'])
+            ax.set_ylabel("Correct Detection Rate [%]", fontsize=self.plot_opts['ylabel_fontsize'])
         else:
-            plt.ylabel(self.plot_opts['ylabel'], fontsize=self.plot_opts['ylabel_fontsize'])
-        plt.grid()
+            ax.set_ylabel(self.plot_opts['ylabel'], fontsize=self.plot_opts['ylabel_fontsize'])
+        ax.grid()
 
         if self.opts_list[0]['label'] != None:
             #            lgd = plt.legend(loc='lower right', prop={'size':8}, shadow=True, fontsize='medium', bbox_to_anchor=(0., -0.35, 1., .102))
@@ -202,13 +208,12 @@ class Render:
             #plt.legend(loc='upper left', prop={'size':6}, bbox_to_anchor=(1,1))
             fig.tight_layout(pad=2.5)
 
-            plt.legend(loc='upper left', bbox_to_anchor=(0.6, 0.4), borderaxespad=0,
-                       prop={'size': 8}, shadow=True, fontsize='small')
+            ax.legend(loc='upper left', bbox_to_anchor=(0.6, 0.4), borderaxespad=0,
+                      prop={'size': 8}, shadow=True, fontsize='small')
 
         if display is True:
             plt.show()
-
-        plt.close()
+            plt.close()
         return fig
 
 
@@ -0,0 +1,226 @@
+"""
+ *File: csvCache.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the shared loader of the pipe-separated reference, index, and journal CSV files.
+               A file is parsed by pandas once, and then stored column by column next to it: numeric columns as
+               arrays, and text columns as integer codes into their unique values. Later reads memory-map the stored
+               columns instead of parsing the file again, for as long as the file and the parsing options are unchanged.
+               The environment variable MEDISCORE_CSV_CACHE sets where the columns are stored: unset for a .csvcache
+               directory next to each file, a directory to store them all there, or 'off' to parse every file.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import os
+import shutil
+import pickle
+import hashlib
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+#bump whenever the layout of the stored columns changes
+csv_cache_version = 1
+#the directory of the stored files, made next to the CSV files unless another is given
+csv_cache_dir_name = '.csvcache'
+#the environment variable setting the directory of the stored files, or turning them off
+csv_cache_env = 'MEDISCORE_CSV_CACHE'
+
+def to_bytes(s):
+    if isinstance(s,bytes):
+        return s
+    return s.encode('utf-8')
+
+def env_cache_dir():
+    """
+    * Description: reads the directory of the stored files from the environment variable MEDISCORE_CSV_CACHE
+    * Output:
+    *     None if the variable is unset, False if it turns the stored files off, or else the directory it names
+    """
+    value = os.environ.get(csv_cache_env)
+    if value is None:
+        return None
+    if value.strip().lower() in ['','0','off','no','false']:
+        return False
+    return value
+
+def file_digest(path,blocksize=1 << 20):
+    """
+    * Description: hashes the contents of a file
+    * Inputs:
+    *     path: the file to hash
+    *     blocksize: the number of bytes read at a time
+    * Output:
+    *     the hex digest of the file
+    """
+    h = hashlib.sha1()
+    with open(path,'rb') as f:
+        block = f.read(blocksize)
+        while block:
+            h.update(block)
+            block = f.read(blocksize)
+    return h.hexdigest()
+
+def entry_dir_name(fname,cache_dir,kwds):
+    """
+    * Description: names the directory of the stored columns of a file read with the given options
+    * Inputs:
+    *     fname: the CSV file
+    *     cache_dir: the directory of the stored files. None for a directory next to fname
+    *     kwds: the options passed to pandas.read_csv
+    * Output:
+    *     the path of the directory
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(fname)),csv_cache_dir_name)
+    h = hashlib.sha1()
+    h.update(to_bytes('v{}|{}'.format(csv_cache_version,os.path.abspath(fname))))
+    for k in sorted(kwds):
+        v = kwds[k]
+        if isinstance(v,dict):
+            v = sorted(v.items())
+        h.update(to_bytes('|{}={!r}'.format(k,v)))
+    return os.path.join(cache_dir,'{}.{}'.format(os.path.basename(fname),h.hexdigest()[:16]))
+
+def load_entry(entry_dir,fname):
+    """
+    * Description: reads the stored columns of a file if the file is unchanged since they were stored.
+                   The file is taken as unchanged if its size and modification time are, or else if its
+                   contents hash to the same digest
+    * Inputs:
+    *     entry_dir: the directory of the stored columns
+    *     fname: the CSV file
+    * Output:
+    *     the dataframe, or None if there are no stored columns for the current file
+    """
+    meta_name = os.path.join(entry_dir,'meta.pkl')
+    if not os.path.isfile(meta_name):
+        return None
+    with open(meta_name,'rb') as f:
+        meta = pickle.load(f)
+    st = os.stat(fname)
+    if (meta['size'] != st.st_size) or (meta['mtime'] != st.st_mtime):
+        if (meta['size'] != st.st_size) or (meta['digest'] != file_digest(fname)):
+            return None
+        #the contents are the same, so skip hashing them next time
+        meta['mtime'] = st.st_mtime
+        try:
+            with open(meta_name,'wb') as f:
+                pickle.dump(meta,f,2)
+        except (IOError,OSError):
+            pass
+
+    columns = OrderedDict()
+    for i,(name,kind) in enumerate(meta['columns']):
+        col_name = os.path.join(entry_dir,'c{}'.format(i))
+        if kind == 'array':
+            columns[name] = np.load(col_name + '.npy',mmap_mode='r')
+        else:
+            codes = np.load(col_name + '.codes.npy',mmap_mode='r')
+            uniques = np.load(col_name + '.uniques.npy',allow_pickle=True)
+            columns[name] = uniques.take(codes)
+    #copy out of the mapped files, so that the dataframe can be modified like one read from the CSV file
+    return pd.DataFrame(columns,columns=list(columns.keys()),copy=True)
+
+def save_entry(entry_dir,fname,df):
+    """
+    * Description: stores the columns of a dataframe read from a file. The columns are written to a temporary
+                   directory that is renamed into place, so that concurrent readers never see a partial entry
+    * Inputs:
+    *     entry_dir: the directory of the stored columns
+    *     fname: the CSV file the dataframe was read from
+    *     df: the dataframe
+    * Output:
+    *     True if the columns were stored, False if the dataframe has columns or an index that are not stored
+    """
+    if not isinstance(df.index,pd.RangeIndex) or not df.index.equals(pd.RangeIndex(df.shape[0])):
+        return False
+    if any(df[c].dtype.kind not in 'biufO' for c in df.columns):
+        return False
+
+    cache_dir = os.path.dirname(entry_dir)
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            #another process may have created it in the meantime
+            if not os.path.isdir(cache_dir):
+                raise
+
+    st = os.stat(fname)
+    meta = {'size':st.st_size,'mtime':st.st_mtime,'digest':file_digest(fname),'columns':[]}
+    tmp_dir = tempfile.mkdtemp(suffix='.tmp',dir=cache_dir)
+    try:
+        for i,c in enumerate(df.columns):
+            col_name = os.path.join(tmp_dir,'c{}'.format(i))
+            col = df[c]
+            if col.dtype.kind == 'O':
+                #text columns are stored as codes into their unique values, with missing values as the last of them
+                codes,uniques = pd.factorize(col)
+                uniques = np.asarray(uniques,dtype=object)
+                if (codes < 0).any():
+                    codes = np.where(codes < 0,uniques.size,codes)
+                    uniques = np.append(uniques,np.array([np.nan],dtype=object))
+                np.save(col_name + '.codes.npy',codes.astype(np.int32))
+                np.save(col_name + '.uniques.npy',uniques)
+                meta['columns'].append((c,'codes'))
+            else:
+                np.save(col_name + '.npy',col.values)
+                meta['columns'].append((c,'array'))
+        with open(os.path.join(tmp_dir,'meta.pkl'),'wb') as f:
+            pickle.dump(meta,f,2)
+
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir,ignore_errors=True)
+        os.rename(tmp_dir,entry_dir)
+    except:
+        shutil.rmtree(tmp_dir,ignore_errors=True)
+        raise
+    return True
+
+def read_csv(fname,cache_dir=None,**kwds):
+    """
+    * Description: reads a CSV file as pandas.read_csv does, from its stored columns where these are current,
+                   and otherwise parsing it and storing its columns for the next read. If the columns cannot be
+                   stored, e.g. because the directory is read-only, the file is simply parsed
+    * Inputs:
+    *     fname: the CSV file
+    *     cache_dir: the directory to store the columns in, or False to parse the file without storing them.
+                     None for the setting of MEDISCORE_CSV_CACHE, and if that is unset, a directory named
+                     .csvcache next to fname
+    *     kwds: the options passed to pandas.read_csv, e.g. sep, dtype, and na_filter
+    * Output:
+    *     the dataframe
+    """
+    if cache_dir is None:
+        cache_dir = env_cache_dir()
+    if cache_dir is False:
+        return pd.read_csv(fname,**kwds)
+
+    entry_dir = entry_dir_name(fname,cache_dir,kwds)
+    try:
+        df = load_entry(entry_dir,fname)
+        if df is not None:
+            return df
+    except (IOError,OSError,EOFError,ValueError,KeyError,pickle.UnpicklingError):
+        #absent, or being replaced by another process
+        pass
+
+    df = pd.read_csv(fname,**kwds)
+    try:
+        save_entry(entry_dir,fname,df)
+    except (IOError,OSError):
+        pass
+    return df
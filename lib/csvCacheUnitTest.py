@@ -0,0 +1,92 @@
+#!/usr/bin/env python2
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+import csvCache
+
+class TestCSVCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmp_dir,'test-ref.csv')
+        self.cache_dir = os.path.join(self.tmp_dir,'cache')
+        #mixed text and numbers, missing values, empty strings, integers, and floats
+        self.write(["ProbeFileID|Mixed|Sparse|Width|Score|Flag",
+                    "p1|1|a|100|0.5|Y",
+                    "p2|b||200|NaN|N",
+                    "p3|3.5|c|300||Y",
+                    "p4|||400|0.25|"])
+        self.old_env = os.environ.pop(csvCache.csv_cache_env,None)
+
+    def tearDown(self):
+        if self.old_env is not None:
+            os.environ[csvCache.csv_cache_env] = self.old_env
+        else:
+            os.environ.pop(csvCache.csv_cache_env,None)
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self,lines):
+        with open(self.fname,'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def assertReadsAsPandas(self,**kwds):
+        expected = pd.read_csv(self.fname,**kwds)
+        #parsed and stored, then read from the stored columns
+        for i in range(2):
+            df = csvCache.read_csv(self.fname,cache_dir=self.cache_dir,**kwds)
+            pd.testing.assert_frame_equal(df,expected)
+        return df
+
+    def test_round_trip(self):
+        self.assertReadsAsPandas(sep='|')
+        self.assertReadsAsPandas(sep='|',na_filter=False)
+        self.assertReadsAsPandas(sep='|',dtype={'Width':np.int64,'Mixed':str})
+        self.assertEqual(len(os.listdir(self.cache_dir)),3)
+
+        #the stored dataframe can be modified like a parsed one
+        df = csvCache.read_csv(self.fname,cache_dir=self.cache_dir,sep='|')
+        df.loc[0,'Width'] = 0
+        df['New'] = 1
+        pd.testing.assert_frame_equal(csvCache.read_csv(self.fname,cache_dir=self.cache_dir,sep='|'),pd.read_csv(self.fname,sep='|'))
+
+    def test_changed_file(self):
+        self.assertReadsAsPandas(sep='|')
+
+        #a file of another size
+        self.write(["ProbeFileID|Mixed|Sparse|Width|Score|Flag",
+                    "p1|1|a|100|0.5|Y"])
+        self.assertEqual(csvCache.read_csv(self.fname,cache_dir=self.cache_dir,sep='|').shape[0],1)
+        self.assertReadsAsPandas(sep='|')
+
+        #a file of the same size is told apart by its contents
+        st = os.stat(self.fname)
+        self.write(["ProbeFileID|Mixed|Sparse|Width|Score|Flag",
+                    "p1|1|a|900|0.5|Y"])
+        os.utime(self.fname,(st.st_atime,st.st_mtime + 10))
+        self.assertEqual(csvCache.read_csv(self.fname,cache_dir=self.cache_dir,sep='|').loc[0,'Width'],900)
+        self.assertReadsAsPandas(sep='|')
+
+        #a file only touched keeps its entry
+        entries = os.listdir(self.cache_dir)
+        os.utime(self.fname,(st.st_atime,st.st_mtime + 20))
+        self.assertReadsAsPandas(sep='|')
+        self.assertEqual(os.listdir(self.cache_dir),entries)
+
+    def test_opt_out(self):
+        pd.testing.assert_frame_equal(csvCache.read_csv(self.fname,cache_dir=False,sep='|'),pd.read_csv(self.fname,sep='|'))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+        os.environ[csvCache.csv_cache_env] = 'off'
+        csvCache.read_csv(self.fname,sep='|')
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir,csvCache.csv_cache_dir_name)))
+
+        os.environ[csvCache.csv_cache_env] = self.cache_dir
+        csvCache.read_csv(self.fname,sep='|')
+        self.assertEqual(len(os.listdir(self.cache_dir)),1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,13 +18,18 @@ class detMetrics:
        - Confidence Interval for AUC
     """
 
-    def __init__(self, score, gt, fpr_stop=1, isCI=False, ciLevel=0.9, dLevel=0.0, total_num=1, sys_res='all'):
-        """Constructor"""
+    def __init__(self, score, gt, fpr_stop=1, isCI=False, ciLevel=0.9, dLevel=0.0, total_num=1, sys_res='all', pool=None, points=None):
+        """Constructor
+        pool: a multiprocessing.Pool to spread the bootstrap of the confidence intervals over,
+        or None to compute them in this process
+        points: the ROC points of the trials, as returned by Metrics.compute_points_sk,
+        if already computed (e.g. by Metrics.compute_points_grouped)"""
 #        s = time.time()
 #        print("sklearn: Computing points...")
 #        sys.stdout.flush()
-        self.fpr, self.tpr, self.fnr, self.thres, self.t_num, self.nt_num = Metrics.compute_points_sk(
-            score, gt)
+        if points is None:
+            points = Metrics.compute_points_sk(score, gt)
+        self.fpr, self.tpr, self.fnr, self.thres, self.t_num, self.nt_num = points
         #print("count {}".format(score.shape))
         # print("Total# ({}),  Target# ({}),  NonTarget# ({}) \n".format(
         #     total_num, self.t_num, self.nt_num)) #total_num is the original total number
@@ -55,10 +60,13 @@ class detMetrics:
         self.ci_lower = 0
         self.ci_upper = 0
         self.ci_tpr = 0
+        self.ci_eer_lower = 0
+        self.ci_eer_upper = 0
+        self.ci_cdr_lower = 0
+        self.ci_cdr_upper = 0
 
         if isCI:
-            self.ci_lower, self.ci_upper, self.ci_tpr = Metrics.compute_ci(
-                score, gt, ciLevel, fpr_stop)
+            self.set_ci(Metrics.compute_ci(score, gt, ciLevel, fpr_stop, pool))
 
         self.fpr_stop = fpr_stop
         self.sys_res = sys_res
@@ -84,7 +92,8 @@ class detMetrics:
         from collections import OrderedDict
         from pandas import DataFrame
         data = OrderedDict([('AUC', self.auc), ('EER', self.eer), ('FAR_STOP', self.fpr_stop), ('AUC@FAR', self.auc_at_fpr), ('CDR@FAR', self.tpr_at_fpr), (
-            'AUC_CI_LOWER@FAR', self.ci_lower), ('AUC_CI_UPPER@FAR', self.ci_upper), ('TRR', self.trr), ('SYS_RESPONSE', self.sys_res)])
+            'AUC_CI_LOWER@FAR', self.ci_lower), ('AUC_CI_UPPER@FAR', self.ci_upper), ('CDR_CI_LOWER@FAR', self.ci_cdr_lower), ('CDR_CI_UPPER@FAR', self.ci_cdr_upper), (
+            'EER_CI_LOWER', self.ci_eer_lower), ('EER_CI_UPPER', self.ci_eer_upper), ('TRR', self.trr), ('SYS_RESPONSE', self.sys_res)])
         my_table = DataFrame(data, index=['0'])
 
         return my_table.round(6)
@@ -101,9 +110,15 @@ class detMetrics:
         return self.auc
 
     def get_ci(self):
-        self.ci_lower, self.ci_upper, self.ci_tpr = Metrics.compute_ci(self)
         return self.ci_lower, self.ci_upper, self.ci_tpr
 
+    def set_ci(self, ci):
+        """ Set the confidence intervals from the bounds computed by Metrics.compute_ci
+        """
+        self.ci_lower, self.ci_upper = ci['AUC@FAR']
+        self.ci_eer_lower, self.ci_eer_upper = ci['EER']
+        self.ci_cdr_lower, self.ci_cdr_upper = ci['CDR@FAR']
+
     def set_eer(self, eer):
         self.eer = eer
 
@@ -122,6 +137,22 @@ def load_dm_file(path):
     return myObject
 
 
+# the bootstrap of the confidence intervals. The chunks are the unit of work, each drawn with its own seed.
+# Within a chunk, the resamples are drawn and evaluated a few at a time, up to about ci_chunk_elements trials
+ci_bootstraps = 500
+ci_chunk_size = 25
+ci_chunk_elements = 1 << 22
+ci_seed = 77  # control reproducibility
+
+
+def bootstrap_chunk(args):
+    """ draws and evaluates one chunk of bootstrap resamples. Defined at module
+    level so that it can be sent to worker processes.
+    args: (levels, target, n_levels, seed, n_bootstraps, fpr_stop)"""
+    levels, target, n_levels, seed, n_bootstraps, fpr_stop = args
+    return Metrics.bootstrap_stats(levels, target, n_levels, np.random.RandomState(seed), n_bootstraps, fpr_stop)
+
+
 class Metrics:
 
     @staticmethod
@@ -149,88 +180,261 @@ class Metrics:
         return fpr, tpr, fnr, thres, target_num, nontarget_num
 
     @staticmethod
-    def compute_auc(fpr, tpr, fpr_stop=1):
+    def compute_points_grouped(score, label, group, n_groups):
+        """ computes the ROC points of several groups of trials at once, as
+        compute_points_sk does for each group. The trials are sorted once by group
+        and decreasing score, and the true and false positives of every group are
+        read off one cumulative sum over all of them.
+        score: system output scores
+        label: 1 for each target trial, 0 for each non-target trial
+        group: the group of each trial, from 0 to n_groups - 1
+        n_groups: the number of groups
+        output: the list of the points of each group, in the format of
+        compute_points_sk, or None for the groups without trials"""
+        score = np.asarray(score, dtype=np.float64)
+        label = np.asarray(label, dtype=np.int64)
+        group = np.asarray(group, dtype=np.int64)
+        order = np.lexsort((-score, group))
+        score = score[order]
+        label = label[order]
+        group = group[order]
+
+        tps_all = np.cumsum(label)
+        starts = np.searchsorted(group, np.arange(n_groups), side='left')
+        ends = np.searchsorted(group, np.arange(n_groups), side='right')
+        # the last trial at each distinct score of each group is where its ROC points are
+        is_last = np.ones(score.size, dtype=bool)
+        is_last[:-1] = (group[1:] != group[:-1]) | (score[1:] != score[:-1])
+
+        points = []
+        for start, end in zip(starts, ends):
+            if start == end:
+                points.append(None)
+                continue
+            ix = np.flatnonzero(is_last[start:end]) + start
+            tps = tps_all[ix] - (tps_all[start - 1] if start > 0 else 0)
+            fps = ix + 1 - start - tps
+            points.append(Metrics.roc_points(fps, tps, score[ix]))
+        return points
+
+    @staticmethod
+    def roc_points(fps, tps, thres):
+        """ computes the ROC points from the cumulative counts of false and true
+        positives at each distinct threshold, from the highest down, following the
+        conventions of sklearn's roc_curve as used by compute_points_sk: collinear
+        points are dropped, and (0,0) is added if the curve does not start at FPR 0.
+        fps: cumulative false positives
+        tps: cumulative true positives
+        thres: the thresholds"""
+        if fps.size > 2:
+            keep = np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True]
+            fps = fps[keep]
+            tps = tps[keep]
+            thres = thres[keep]
+        if fps[0] != 0:
+            fps = np.r_[0, fps]
+            tps = np.r_[0, tps]
+            thres = np.r_[thres[0] + 1, thres]
+
+        target_num = tps[-1]
+        nontarget_num = fps[-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fpr = fps / float(nontarget_num)
+            tpr = tps / float(target_num)
+        fnr = 1 - tpr
+        return fpr, tpr, fnr, thres, target_num, nontarget_num
+
+    @staticmethod
+    def compute_auc(fpr, tpr, fpr_stop=1, clip=False):
         """ Computes the under area curve (AUC) given FPR and TPR values
-        fpr: false positive rates
+        fpr: false positive rates, as an array, list, or pandas Series
         tpr: true positive rates
-        fpr_stop: fpr value for calculating partial AUC"""
-        width = [x - fpr[i] for i, x in enumerate(fpr[1:]) if fpr[i + 1] <= fpr_stop]
-        height = [(x + tpr[i]) / 2 for i, x in enumerate(tpr[1:])]
-        p_height = height[0:len(width)]
-        auc = sum([width[i] * p_height[i] for i in range(0, len(width))])
+        fpr_stop: fpr value for calculating partial AUC
+        clip: if True, the partial AUC extends up to fpr_stop itself, interpolating the
+        TPR there. Otherwise it stops at the last point at or before fpr_stop"""
+        fpr = np.asarray(fpr, dtype=np.float64)
+        tpr = np.asarray(tpr, dtype=np.float64)
+        widths = np.diff(fpr)
+        keep = fpr[1:] <= fpr_stop
+        widths = widths[keep]
+        heights = ((tpr[1:] + tpr[:-1]) / 2)[:widths.size]
+        n_keep = widths.size
+        # 0 rather than 0.0 when no trapezoid is kept, as the reports print it
+        auc = np.dot(widths, heights) if n_keep > 0 else 0
+        if clip and (n_keep + 1 < fpr.size) and (fpr[n_keep] < fpr_stop):
+            # the trapezoid from the last point kept up to fpr_stop
+            x0, y0 = fpr[n_keep], tpr[n_keep]
+            x1, y1 = fpr[n_keep + 1], tpr[n_keep + 1]
+            y_stop = y0 + (y1 - y0) * (fpr_stop - x0) / (x1 - x0)
+            auc += (fpr_stop - x0) * (y0 + y_stop) / 2
         return auc
 
     @staticmethod
-    def compute_eer(fpr, fnr):
+    def compute_eer(fpr, fnr, interpolate=False):
         """ computes the equal error rate (EER) given FNR and FPR values
-        fpr: false positive rates
-        fnr: false negative rates"""
-        errdif = [abs(fpr[j] - fnr[j]) for j in range(0, len(fpr))]
-        idx = errdif.index(min(errdif))
-        eer = np.mean([fpr[idx], fnr[idx]])
+        fpr: false positive rates, as an array, list, or pandas Series
+        fnr: false negative rates
+        interpolate: if True, the EER is taken where the line between the two points
+        on either side of fpr == fnr crosses it. Otherwise it is the mean of the FPR and
+        FNR at the point where they are closest"""
+        fpr = np.asarray(fpr, dtype=np.float64)
+        fnr = np.asarray(fnr, dtype=np.float64)
+        errdif = fpr - fnr
+        if interpolate:
+            ix_cross = np.flatnonzero(errdif >= 0)
+            if (ix_cross.size > 0) and (ix_cross[0] > 0) and (errdif[ix_cross[0]] > 0):
+                j = ix_cross[0]
+                t = -errdif[j - 1] / (errdif[j] - errdif[j - 1])
+                return fpr[j - 1] + t * (fpr[j] - fpr[j - 1])
+        idx = np.abs(errdif).argmin()
+        eer = (fpr[idx] + fnr[idx]) / 2
         return eer
 
-    # TODO: need to validate this and make command-line inputs
     @staticmethod
-    def compute_ci(score, gt, ci_level, fpr_stop):
-        """ compute the confidence interval for AUC
+    def compute_ci(score, gt, ci_level, fpr_stop, pool=None):
+        """ compute the bootstrap confidence intervals for the partial AUC, the EER,
+        and the CDR (TPR) at fpr_stop. The scores are sorted once, and each resample
+        is then evaluated from its multinomial trial counts at the sorted score levels
+        (see bootstrap_stats), in chunks of ci_chunk_size resamples. Each chunk has its
+        own seed, so the intervals do not depend on the number of processes.
         score: system output scores
         gt: ground-truth for given trials
-        lower_bound: lower bound percentile
-        upper_bound: upper bound percentile"""
-        from sklearn.metrics import roc_auc_score
-#        from sklearn.metrics import roc_curve
-#        score = score.astype(np.float64)
-#        mean = np.mean(score)
-#        size = len(score) - 1
-#        return abs(mean - st.t.interval(prob, size, loc=mean, scale=st.sem(score))[1])
-
+        ci_level: confidence level of the intervals
+        fpr_stop: fpr value for calculating partial AUC and the CDR
+        pool: a multiprocessing.Pool to spread the chunks over, shared by all the
+        calls of a run, or None to evaluate them in this process
+        output: an OrderedDict of the (lower, upper) bounds of 'AUC@FAR', 'EER' and 'CDR@FAR'"""
+        from collections import OrderedDict
         lower_bound = round((1.0 - float(ci_level)) / 2.0, 3)
         upper_bound = round((1.0 - lower_bound), 3)
-        n_bootstraps = 500
-        rng_seed = 77  # control reproducibility
-        bootstrapped_auc = []
-#        bootstrapped_tpr = []
-
-        rng = np.random.RandomState(rng_seed)
-        indices = np.copy(score.index.values)
-        #print("Original indices {}".format(indices))
-        for i in range(n_bootstraps):
-            # bootstrap by sampling with replacement on the prediction indices
-            new_indices = rng.choice(indices, len(indices))
-            fpr, tpr, fnr, thres, t_num, nt_num = Metrics.compute_points_sk(
-                score[new_indices].values, gt[new_indices])
-            auc = Metrics.compute_auc(fpr, tpr, fpr_stop)
-            # print("Bootstrap #{} FPR_stop {}, AUC: {:0.3f}".format(i + 1, fpr_stop, auc))
-
-            #print("New indices {}".format(new_indices))
-            #label = np.where(gt[new_indices] == 'Y', 1, 0)
-            #print("New label {}".format(label))
-            # if np.unique(label).size < 2:
-            #print("Ignore: we need at least one positive and one negative sample for ROC AUC.")
-            #    continue
-
-            #auc = roc_auc_score(label, score[new_indices].values)
-
-            bootstrapped_auc.append(auc)
-            # TODO: need pdf and ecdf distribution at each FPR
-            # see the paper: Nonparametic confidence intervals for receiver operating characteristic curves (2.4)
-            #fpr, tpr, thres = roc_curve(label[indices], score[indices])
-            # bootstrapped_tpr.append(tpr)
-            # print("Bootstrap #{} AUC: {:0.3f}".format(i + 1, auc))
-
-        sorted_aucs = sorted(bootstrapped_auc)
-        #print("sorted AUCS {}".format(sorted_aucs))
-
-        # Computing the lower and upper bound of the 90% confidence interval (default)
-        # You can change the bounds percentiles to 0.025 and 0.975 to get
-        # a 95% confidence interval instead.
-        ci_lower = sorted_aucs[int(lower_bound * len(sorted_aucs))]
-        ci_upper = sorted_aucs[int(upper_bound * len(sorted_aucs))]
-
-        ci_tpr = 0  # TODO: after calculating CI for each TPR
-        #print("Confidence interval for AUC: [{:0.5f} - {:0.5f}]".format(ci_lower, ci_upper))
-        return ci_lower, ci_upper, ci_tpr
+
+        # sort once, highest score first, and number the distinct score levels
+        score = np.asarray(score, dtype=np.float64)
+        order = np.argsort(-score, kind='mergesort')
+        score_sorted = score[order]
+        is_new = np.ones(score_sorted.size, dtype=bool)
+        is_new[1:] = score_sorted[1:] != score_sorted[:-1]
+        levels = np.cumsum(is_new) - 1
+        target = (np.asarray(gt) == 'Y')[order].astype(np.int64)
+        n_levels = int(levels[-1]) + 1
+
+        chunk_sizes = [min(ci_chunk_size, ci_bootstraps - i) for i in range(0, ci_bootstraps, ci_chunk_size)]
+        seeds = np.random.RandomState(ci_seed).randint(0, 2**31 - 1, size=len(chunk_sizes))
+        tasks = [(levels, target, n_levels, seed, size, fpr_stop) for seed, size in zip(seeds, chunk_sizes)]
+        if pool is not None:
+            results = pool.map(bootstrap_chunk, tasks)
+        else:
+            results = [bootstrap_chunk(t) for t in tasks]
+
+        ci = OrderedDict()
+        for i, met in enumerate(['AUC@FAR', 'EER', 'CDR@FAR']):
+            # resamples without both targets and non-targets have no ROC curve, and are ignored
+            stats = np.sort(np.concatenate([r[i] for r in results]))
+            if stats.size == 0:
+                ci[met] = (np.nan, np.nan)
+                continue
+            ci[met] = (stats[int(lower_bound * stats.size)],
+                       stats[min(int(upper_bound * stats.size), stats.size - 1)])
+        return ci
+
+    @staticmethod
+    def bootstrap_stats(levels, target, n_levels, rng, n_bootstraps, fpr_stop):
+        """ computes the partial AUC, EER, and CDR at fpr_stop of a batch of bootstrap
+        resamples of the trials. The resamples are drawn and counted in batches of at
+        most ci_chunk_elements trials (one resample at least), so that the memory used
+        does not grow with both the number of trials and the number of resamples. rng
+        draws the same values whatever the batches, so the statistics do not depend on them
+        levels: the score level of each trial, numbered from the highest score
+        target: 1 for each target trial, 0 for each non-target trial
+        n_levels: the number of distinct score levels
+        rng: the numpy RandomState to draw the resamples with
+        n_bootstraps: the number of resamples
+        fpr_stop: fpr value for calculating partial AUC and the CDR
+        output: the arrays of the AUC, EER, and CDR of each resample with both
+        target and non-target trials"""
+        n = levels.size
+        batch_size = max(1, ci_chunk_elements // n)
+        stats = []
+        for start in range(0, n_bootstraps, batch_size):
+            n_batch = min(batch_size, n_bootstraps - start)
+            draws = rng.randint(0, n, size=(n_batch, n))
+            # count the target and non-target trials drawn at each level, for all resamples of the batch at once
+            codes = 2 * levels[draws] + target[draws]
+            codes += (2 * n_levels * np.arange(n_batch))[:, np.newaxis]
+            counts = np.bincount(codes.ravel(), minlength=2 * n_levels * n_batch)
+            counts = counts.reshape(n_batch, n_levels, 2)
+            stats.append(Metrics.weighted_roc_stats(counts[:, :, 1], counts[:, :, 0], fpr_stop))
+        return tuple(np.concatenate([s[i] for s in stats]) for i in range(3))
+
+    @staticmethod
+    def weighted_roc_stats(t_counts, nt_counts, fpr_stop):
+        """ computes the partial AUC, EER, and CDR at fpr_stop of several ROC curves, each
+        given by the counts of its target and non-target trials at each score level.
+        Each curve is reduced to the points compute_points_sk would give for it (see
+        roc_points): the levels without trials and the collinear points are dropped.
+        t_counts: (curves x levels) target counts, highest score level first
+        nt_counts: (curves x levels) non-target counts, highest score level first
+        fpr_stop: fpr value for calculating partial AUC and the CDR
+        output: the arrays of the AUC, EER, and CDR of each curve with both target
+        and non-target trials"""
+        t_num = t_counts.sum(axis=1)
+        nt_num = nt_counts.sum(axis=1)
+        valid = (t_num > 0) & (nt_num > 0)
+        t_counts = t_counts[valid]
+        nt_counts = nt_counts[valid]
+        t_num = t_num[valid][:, np.newaxis].astype(np.float64)
+        nt_num = nt_num[valid][:, np.newaxis].astype(np.float64)
+        n_curves, n_levels = t_counts.shape
+        rows = np.arange(n_curves)
+
+        # the levels with trials are the points of the curve. A point is collinear when the
+        # step to it equals the step to the next point, i.e. its counts equal the next level's
+        # with trials. The first and last points are always kept, as in roc_points
+        cols = np.arange(n_levels)
+        nonzero = (t_counts + nt_counts) > 0
+        ix_next = np.where(nonzero, cols, n_levels)
+        ix_next = np.minimum.accumulate(ix_next[:, ::-1], axis=1)[:, ::-1]
+        ix_next = np.hstack([ix_next[:, 1:], np.full((n_curves, 1), n_levels)])
+        is_last = ix_next == n_levels
+        ix_next = np.minimum(ix_next, n_levels - 1)
+        same_step = ((t_counts[rows[:, np.newaxis], ix_next] == t_counts) &
+                     (nt_counts[rows[:, np.newaxis], ix_next] == nt_counts))
+        is_first = nonzero & (np.cumsum(nonzero, axis=1) == 1)
+        keep = nonzero & (is_first | is_last | ~same_step)
+
+        # the ROC points from the highest threshold down, starting at (0,0)
+        zeros = np.zeros((n_curves, 1))
+        tpr = np.hstack([zeros, np.cumsum(t_counts, axis=1) / t_num])
+        fpr = np.hstack([zeros, np.cumsum(nt_counts, axis=1) / nt_num])
+        keep = np.hstack([np.ones((n_curves, 1), dtype=bool), keep])
+
+        if fpr_stop >= 1:
+            # Mann-Whitney: the chance that a target outscores a non-target, counting ties as half
+            nt_below = nt_num - np.cumsum(nt_counts, axis=1)
+            auc = ((nt_below + 0.5 * nt_counts) * t_counts).sum(axis=1) / (t_num[:, 0] * nt_num[:, 0])
+        else:
+            # trapezoids up to the last kept point at or before fpr_stop, as in compute_auc. The
+            # trapezoid between two kept points is the sum of those through the dropped points
+            # between them, so each step counts if the next kept point is at or before fpr_stop
+            ix_kept = np.where(keep, np.arange(n_levels + 1), n_levels)
+            ix_kept = np.minimum.accumulate(ix_kept[:, ::-1], axis=1)[:, ::-1]
+            widths = np.diff(fpr, axis=1)
+            heights = (tpr[:, 1:] + tpr[:, :-1]) / 2
+            auc = (widths * heights * (fpr[rows[:, np.newaxis], ix_kept[:, 1:]] <= fpr_stop)).sum(axis=1)
+
+        # the kept point where the FPR and FNR are closest, as in compute_eer
+        ix_eer = np.where(keep, np.abs(fpr - (1 - tpr)), np.inf).argmin(axis=1)
+        eer = (fpr[rows, ix_eer] + 1 - tpr[rows, ix_eer]) / 2
+
+        # the TPR at fpr_stop, interpolated as in linear_interpolated_point. The dropped points
+        # lie on the lines between the kept ones, so they do not change the interpolation
+        ix_hi = np.minimum((fpr < fpr_stop).sum(axis=1), fpr.shape[1] - 1)
+        ix_lo = np.maximum(ix_hi - 1, 0)
+        x_lo, y_lo = fpr[rows, ix_lo], tpr[rows, ix_lo]
+        x_hi, y_hi = fpr[rows, ix_hi], tpr[rows, ix_hi]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cdr = np.where(x_hi == fpr_stop, y_hi, y_lo + (y_hi - y_lo) / (x_hi - x_lo) * (fpr_stop - x_lo))
+        return auc, eer, cdr
 
     # Calculate d-prime and beta
     @staticmethod
@@ -313,9 +517,6 @@ class Metrics:
         # given a list or numpy array of x and y, compute the y for some x0.
         # currently only applicable to interpolating ROC curves
 
-        xy = list(zip(x, y))
-        xy.sort(key=lambda x: x[0])
-
         if (len(x) == 0) or (len(y) == 0):
             print("ERROR: no data in x or y to interpolate.")
             exit(1)
@@ -323,47 +524,43 @@ class Metrics:
             print("ERROR: x and y are not the same length.")
             exit(1)
 
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        order = np.argsort(x, kind='mergesort')
+        x = x[order]
+        y = y[order]
+
         # find x0 in the set of x's
-        tuples = [p for p in xy if p[0] == x0]
-        if len(tuples) > 0:
-            return tuples
-        else:
-            # find the largest x smaller than x0
-            smaller = [p for p in xy if p[0] < x0]
-            ix_x01 = len(smaller) - 1  # index for the relevant point
+        exact = x == x0
+        if exact.any():
+            return list(zip(x[exact], y[exact]))
 
+        # find the largest x smaller than x0
+        ix_x02 = np.searchsorted(x, x0, side='left')
+        if ix_x02 == 0:
             # if nothing is in the list of smaller points
-            if ix_x01 == -1:
-                x01 = 0
-                y01 = 0
-                x02 = xy[0][0]
-                y02 = xy[0][1]
-                if x02 != x01:
-                    y0 = y01 + (y02 - y01) / (x02 - x01) * (x0 - x01)
-                else:
-                    y0 = (y02 + y01) / 2
-                return [(x0, y0)]
-
-            x01 = xy[ix_x01][0]
-            y01 = xy[ix_x01][1]
-            ix_x02 = ix_x01 + 1
-
-            # check to see if there is a next x. If not, let it be (1,1)
-            try:
-                x02 = xy[ix_x02][0]
-                y02 = xy[ix_x02][1]
-            except IndexError:
-                x02 = 1
-                y02 = 1
-
-            # linear interpolate
-            if x02 != x01:
-                y0 = y01 + (y02 - y01) / (x02 - x01) * (x0 - x01)
-            else:
-                y0 = (y02 + y01) / 2
+            x01 = 0
+            y01 = 0
+        else:
+            x01 = x[ix_x02 - 1]
+            y01 = y[ix_x02 - 1]
+
+        # check to see if there is a next x. If not, let it be (1,1)
+        if ix_x02 < x.size:
+            x02 = x[ix_x02]
+            y02 = y[ix_x02]
+        else:
+            x02 = 1
+            y02 = 1
+
+        # linear interpolate
+        if x02 != x01:
+            y0 = y01 + (y02 - y01) / (x02 - x01) * (x0 - x01)
+        else:
+            y0 = (y02 + y01) / 2
 
-            # return a single set of tuples to maintain format
-            return [(x0, y0)]
+        # return a single set of tuples to maintain format
+        return [(x0, y0)]
 
     # TODO: optimize the speed (maybe vertorization?)
     @staticmethod
@@ -0,0 +1,131 @@
+"""
+ *File: fileOps.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the filesystem operations used by the scorer, made with native calls
+               rather than shell commands, which would fork a shell from the (often large) scoring process.
+               The operations made in each process are counted for the run summary.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import os
+import errno
+import shutil
+import difflib
+
+op_names = ['mkdir','remove','rmtree','compare']
+op_counts = dict([(op,0) for op in op_names])
+
+def count(op,n=1):
+    op_counts[op] += n
+
+def get_counts():
+    return dict(op_counts)
+
+def add_counts(counts):
+    """
+    * Description: adds the counts of the operations made elsewhere, e.g. in a worker process, to those of this process
+    * Inputs:
+    *     counts: a dictionary of the number of each operation
+    """
+    for op in op_names:
+        count(op,counts.get(op,0))
+
+def count_diff(after,before):
+    return dict([(op,after[op] - before[op]) for op in op_names])
+
+def summary():
+    return "Filesystem operations: {}.".format(", ".join(["{} {}".format(op_counts[op],op) for op in op_names]))
+
+def mkdir(dirname):
+    """
+    * Description: makes a directory and any of its missing parents, if it does not already exist
+    * Inputs:
+    *     dirname: the directory to make
+    * Output:
+    *     dirname
+    """
+    if (dirname == '') or os.path.isdir(dirname):
+        return dirname
+    try:
+        os.makedirs(dirname)
+    except OSError as e:
+        #another process may have made it in the meantime
+        if (e.errno != errno.EEXIST) or not os.path.isdir(dirname):
+            raise
+    count('mkdir')
+    return dirname
+
+def mkdirs(dirnames):
+    """
+    * Description: makes each of a list of directories up front, once each
+    * Inputs:
+    *     dirnames: the directories to make
+    """
+    for d in sorted(set(dirnames)):
+        mkdir(d)
+
+def remove(path):
+    """
+    * Description: removes a file, if present
+    * Inputs:
+    *     path: the file to remove
+    """
+    try:
+        os.unlink(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return
+    count('remove')
+
+def rmtree(path):
+    """
+    * Description: removes a directory and everything in it, if present
+    * Inputs:
+    *     path: the directory to remove
+    """
+    if not os.path.lexists(path):
+        return
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path,ignore_errors=True)
+        count('rmtree')
+    else:
+        remove(path)
+
+def clear_dir(dirname):
+    """
+    * Description: removes everything in a directory, keeping the directory itself
+    * Inputs:
+    *     dirname: the directory to clear
+    """
+    if not os.path.isdir(dirname):
+        return
+    for name in os.listdir(dirname):
+        rmtree(os.path.join(dirname,name))
+
+def diff_files(path1,path2):
+    """
+    * Description: compares two text files, e.g. two configuration files
+    * Inputs:
+    *     path1: the first file
+    *     path2: the second file
+    * Output:
+    *     a list of the lines of the differences between the two files in unified format, empty if they are identical
+    """
+    with open(path1) as f1, open(path2) as f2:
+        lines1 = f1.readlines()
+        lines2 = f2.readlines()
+    count('compare')
+    return [l.rstrip('\n') for l in difflib.unified_diff(lines1,lines2,fromfile=path1,tofile=path2)]
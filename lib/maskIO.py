@@ -0,0 +1,120 @@
+"""
+ *File: maskIO.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the reading of the mask and image files used in scoring. Each file is
+               decoded with the reader for its format, and the decoded matrices are kept in a cache of
+               bounded size in each process, so that a file read more than once by a process (e.g. a mask
+               shared by several rows, or re-read for the report) is only decoded once.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import os
+import cv2
+import rawpy
+import glymur
+from collections import OrderedDict
+from scipy import misc
+
+raw_exts = ['arw','nef','raf','dng','cr2']
+
+class decodedCache:
+    """
+    This class holds decoded matrices by key, evicting the least recently used ones once their
+    total size exceeds its bound.
+    """
+    def __init__(self,max_size):
+        """
+        Constructor
+
+        Attributes:
+        - max_size: the maximum total size of the matrices held, in bytes
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self,key):
+        mat = self.entries.pop(key,None)
+        if mat is not None:
+            self.entries[key] = mat
+        return mat
+
+    def put(self,key,mat):
+        if mat.nbytes > self.max_size:
+            return
+        old = self.entries.pop(key,None)
+        if old is not None:
+            self.size -= old.nbytes
+        self.entries[key] = mat
+        self.size += mat.nbytes
+        while self.size > self.max_size:
+            _,lru = self.entries.popitem(last=False)
+            self.size -= lru.nbytes
+
+#one per process. Processes forked from the parent start with a copy of its entries
+decoded_cache = decodedCache(256 << 20)
+
+def decode(path,readopt=0):
+    """
+    * Description: decodes an image file with the reader for its format
+    * Inputs:
+    *     path: the image file
+    *     readopt: 0 to read the image as single-channel grayscale, 1 as 3-channel BGR.
+                   JPEG2000 files are read with all of their layers regardless
+    * Output:
+    *     the image matrix, or None if the file cannot be read
+    """
+    ext = path.split('.')[-1].lower()
+    if ext in raw_exts:
+        mat = rawpy.imread(path).postprocess()
+        #rgb2gray this if readopt==0
+        if readopt == 0:
+            mat = cv2.cvtColor(mat,cv2.COLOR_BGR2GRAY)
+    elif ext == 'bmp':
+        bmpmode = 'L'
+        if readopt == 1:
+            bmpmode = 'RGB'
+        mat = misc.imread(path,mode=bmpmode)
+    elif ext == 'jp2':
+        mat = glymur.Jp2k(path)[:]
+    else: #covers png, jpeg, jpg, JPG, tif, tiff
+        mat = cv2.imread(path,readopt)
+    return mat
+
+def imread(path,readopt=0):
+    """
+    * Description: reads an image file, decoding it only if it is not already cached for this process.
+                   Entries are keyed by the file's path, size, and modification time, so that a file
+                   rewritten in place is decoded again
+    * Inputs:
+    *     path: the image file
+    *     readopt: 0 to read the image as single-channel grayscale, 1 as 3-channel BGR
+    * Output:
+    *     a copy of the image matrix that the caller is free to modify, or None if the file cannot be read
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        #let the reader report the missing file
+        return decode(path,readopt)
+
+    key = (os.path.abspath(path),readopt,st.st_size,st.st_mtime)
+    mat = decoded_cache.get(key)
+    if mat is None:
+        mat = decode(path,readopt)
+        if mat is None:
+            return None
+        decoded_cache.put(key,mat)
+    return mat.copy()
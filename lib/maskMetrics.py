@@ -49,7 +49,7 @@ class maskMetrics:
     The image parameters necessary to evaluate most of the objects are included
     in the initialization.
     """
-    def __init__(self,ref,sys,w,systh=-10,metrics=['MCC','NMM','BWL1']):
+    def __init__(self,ref,sys,w,systh=-10,metrics=['MCC','NMM','BWL1'],engine='bincount'):
         """
         Constructor
 
@@ -61,6 +61,9 @@ class maskMetrics:
                  binary mask. Letting systh = -1 will compute the metrics across all
                  distinct thresholds for the system output mask, with the threshold
                  corresponding to the highest MCC chosen
+        - engine: the method used to count the confusion measures over all thresholds.
+                  'bincount' counts over a compact key in strips of the masks; 'unique'
+                  counts the distinct values of a full-size composite matrix
         """
         #get masks for ref and sys
         if ref.bwmat is 0:
@@ -71,6 +74,7 @@ class maskMetrics:
         self.sys = sys
         self.w = w
         self.metrics = metrics
+        self.engine = engine
 #        if systh >= 0:
 #            sys.binarize(systh)
 #        else:
@@ -98,7 +102,39 @@ class maskMetrics:
         """
 
         conf = self.confusion_measures(ref,sys,w,systh)
+        return self.getMetricsConfusion(conf,myprintbuffer)
 
+    def getMetricsHistograms(self,hists,systh=-10,myprintbuffer=0):
+        """
+        * Description: this function calculates the metrics at a single threshold from the
+                       histograms of the system output mask values, as accumulated in strips
+                       by the tiled scoring mode
+
+        * Output:
+        *     dictionary of the NMM, MCC, BWL1, and the confusion measures.
+        """
+        conf = self.confusion_measures_histograms(hists,systh)
+        return self.getMetricsConfusion(conf,myprintbuffer)
+
+    def getMetricsTable(self,thresMets,systh=-10,myprintbuffer=0):
+        """
+        * Description: this function calculates the metrics at a single threshold by looking up
+                       the confusion measures in the table of all thresholds from runningThresholds,
+                       so that the system output mask need not be binarized and counted again
+
+        * Output:
+        *     dictionary of the NMM, MCC, BWL1, and the confusion measures.
+        """
+        conf = self.confusion_measures_table(thresMets,systh)
+        return self.getMetricsConfusion(conf,myprintbuffer)
+
+    def getMetricsConfusion(self,conf,myprintbuffer=0):
+        """
+        * Description: this function calculates the metrics from the confusion measures
+
+        * Output:
+        *     dictionary of the NMM, MCC, BWL1, and the confusion measures.
+        """
         mcc = self.matthews(conf)
         nmm = self.NimbleMaskMetric(conf)
         bwL1 = self.binaryWeightedL1(conf)
@@ -202,59 +238,209 @@ class maskMetrics:
 
         return {'TP':tp,'TN':tn,'FP':fp,'FN':fn,'N':n}
 
-    def confusion_mets_apply_iter(self,thresrow):
-        t = thresrow['Threshold']
-        wtd_vals = self.wtd_vals
-        c_wtd_vals = self.c_wtd_vals
-        ref_const = self.ref_const
-
-        tp_idx = wtd_vals <= t
-        tn_idx = (wtd_vals > (t + ref_const*255))
-        fp_idx = (wtd_vals <= (t + ref_const*255)) & (wtd_vals >= ref_const*255)
-        fn_idx = (wtd_vals <= 255) & (wtd_vals > t)
-        
-        thresrow['TP'] = c_wtd_vals[tp_idx].sum()
-        thresrow['TN'] = c_wtd_vals[tn_idx].sum()
-        thresrow['FP'] = c_wtd_vals[fp_idx].sum()
-        thresrow['FN'] = c_wtd_vals[fn_idx].sum()
-
-        return thresrow
-
-    def confusion_mets_all_thresholds(self,ref,sys,w):
+    def confusion_histograms_unique(self,ref,sys,w):
+        """
+        * Description: this function counts the system output mask values per reference class
+                       by taking the distinct values of a full-size composite of the reference,
+                       system output, and weight matrices. This is the original counting method
+        * Inputs:
+        *     ref: the reference mask object
+        *     sys: the system output mask object
+        *     w: the weight matrix
+        * Output:
+        *     hists: a 4 x 256 matrix of counts of each system output value, for the no-score
+                     pixels and the scored reference, non-reference, and other pixels respectively
+        """
         r = ref.bwmat
         s = sys.matrix
         ref_const = (1 << 8)
         w_const = (1 << 16)
 
-        t_list = np.unique(s).tolist()
-        t_list = [-1] + t_list
-#        thresMet_fields = ['Reference Mask','System Output Mask','Threshold','NMM','MCC','BWL1','TP','TN','FP','FN','N']
-        thresMets = pd.DataFrame({'Reference Mask':ref.name,
-                                  'System Output Mask':sys.name,
-                                  'Threshold':t_list,
-                                  'NMM':-1.,
-                                  'MCC':0.,
-                                  'BWL1':1.,
-                                  'TP':0,
-                                  'TN':0,
-                                  'FP':0,
-                                  'FN':0,
-                                  'N':0})
-
         full_composite = s + r*ref_const + (1-w)*w_const
         all_vals,c_all_vals = np.unique(full_composite,return_counts=True)
-        c_wtd_vals = c_all_vals[all_vals < w_const]
-        wtd_vals = all_vals[all_vals < w_const]
-        self.ref_const = ref_const
-        self.wtd_vals = wtd_vals
-        self.c_wtd_vals = c_wtd_vals
-        thresMets['N'] = c_wtd_vals.sum()
-        thresMets = thresMets.apply(self.confusion_mets_apply_iter,axis=1) 
-
-        #want to vectorize computation of the metrics here
-        thresMets['MCC'] = thresMets.apply(self.matthews,axis=1)
-        thresMets['NMM'] = thresMets.apply(self.NimbleMaskMetric,axis=1)
-        thresMets['BWL1'] = thresMets.apply(self.binaryWeightedL1,axis=1)
+
+        hists = np.zeros((4,ref_const),dtype=np.int64)
+        nonscored_idx = all_vals >= w_const
+        pos_idx = all_vals < ref_const
+        neg_idx = (all_vals >= 255*ref_const) & ~nonscored_idx
+        other_idx = ~(nonscored_idx | pos_idx | neg_idx)
+        for i,idx in enumerate([nonscored_idx,pos_idx,neg_idx,other_idx]):
+            np.add.at(hists[i],all_vals[idx] % ref_const,c_all_vals[idx])
+        return hists
+
+    def confusion_histograms_bincount(self,ref,sys,w,block_size=(1 << 20)):
+        """
+        * Description: this function counts the system output mask values per reference class
+                       with a single bincount over a compact 10-bit key made up of the system
+                       output value, the reference bit, and the weight bit. The masks are
+                       processed in strips of rows, so that no full-size integer image is made
+        * Inputs:
+        *     ref: the reference mask object
+        *     sys: the system output mask object
+        *     w: the weight matrix
+        *     block_size: the approximate number of pixels to count at a time
+        * Output:
+        *     hists: a 4 x 256 matrix of counts of each system output value, for the no-score
+                     pixels and the scored reference, non-reference, and other pixels respectively
+        """
+        r = ref.bwmat
+        s = sys.matrix
+        nrows = s.shape[0]
+        strip = max(block_size//max(s.size//max(nrows,1),1),1)
+
+        counts = np.zeros(1 << 10,dtype=np.int64)
+        for i in range(0,nrows,strip):
+            r_strip = r[i:i + strip]
+            w_strip = w[i:i + strip] == 1
+            key = s[i:i + strip].astype(np.uint16)
+            key |= (w_strip & (r_strip != 255)).astype(np.uint16) << 8
+            key |= (w_strip & (r_strip != 0)).astype(np.uint16) << 9
+            counts += np.bincount(key.ravel(),minlength=(1 << 10))
+        return counts.reshape(4,1 << 8)
+
+    def confusion_histograms_const(self,ref,sys,w):
+        """
+        * Description: this function counts the system output mask values per reference class
+                       for a system output mask of a single value. All of the pixels fall in the
+                       bin of that value, so only the reference classes need to be counted
+        * Inputs:
+        *     ref: the reference mask object
+        *     sys: the constant system output mask object
+        *     w: the weight matrix
+        * Output:
+        *     hists: a 4 x 256 matrix of counts of each system output value, for the no-score
+                     pixels and the scored reference, non-reference, and other pixels respectively
+        """
+        r = ref.bwmat
+        scored = w == 1
+        n_scored = np.count_nonzero(scored)
+        n_pos = np.count_nonzero(scored & (r == 0))
+        n_neg = np.count_nonzero(scored & (r == 255))
+
+        hists = np.zeros((4,1 << 8),dtype=np.int64)
+        hists[:,sys.value] = [w.size - n_scored,n_pos,n_neg,n_scored - n_pos - n_neg]
+        return hists
+
+    def confusion_histograms(self,ref,sys,w):
+        """
+        * Description: this function counts the system output mask values per reference class
+                       with the counting method selected for this object
+        * Inputs:
+        *     ref: the reference mask object
+        *     sys: the system output mask object
+        *     w: the weight matrix
+        * Output:
+        *     hists: a 4 x 256 matrix of counts of each system output value, for the no-score
+                     pixels and the scored reference, non-reference, and other pixels respectively
+        """
+        if isinstance(sys,masks.constmask):
+            return self.confusion_histograms_const(ref,sys,w)
+        if self.engine == 'unique':
+            return self.confusion_histograms_unique(ref,sys,w)
+        return self.confusion_histograms_bincount(ref,sys,w)
+
+    def confusion_measures_histograms(self,hists,th):
+        """
+        * Metric: confusion_measures
+        * Description: this function calculates the values in the confusion matrix (TP, TN, FP, FN)
+                       at a single threshold from the histograms of the system output mask values
+        * Inputs:
+        *     hists: the 4 x 256 histograms from confusion_histograms
+        *     th: the threshold for binarization
+        * Output:
+        *     dictionary of the TP, TN, FP, and FN areas, and total score region N
+        """
+        if th == -10:
+            th = 254
+        th = int(min(max(th,-1),hists.shape[1] - 1))
+
+        tp = np.float64(hists[1,:th + 1].sum())
+        fp = np.float64(hists[2,:th + 1].sum())
+        fn = np.float64(hists[1].sum() - tp)
+        tn = np.float64(hists[2].sum() - fp)
+        n = hists[1:].sum()
+
+        return {'TP':tp,'TN':tn,'FP':fp,'FN':fn,'N':n}
+
+    def confusion_measures_table(self,thresMets,th):
+        """
+        * Metric: confusion_measures
+        * Description: this function looks up the values in the confusion matrix (TP, TN, FP, FN)
+                       at a single threshold in the table of all thresholds. The row of the largest
+                       threshold in the table not above th is taken, since no system output value
+                       lies between the two
+        * Inputs:
+        *     thresMets: the dataframe of the confusion measures for each threshold, in increasing
+                         order of threshold and starting at -1
+        *     th: the threshold for binarization
+        * Output:
+        *     dictionary of the TP, TN, FP, and FN areas, and total score region N
+        """
+        if th == -10:
+            th = 254
+        row = max(np.searchsorted(thresMets['Threshold'].values,th,side='right') - 1,0)
+
+        conf = {}
+        for mes in ['TP','TN','FP','FN']:
+            conf[mes] = np.float64(thresMets[mes].values[row])
+        conf['N'] = thresMets['N'].values[row]
+        return conf
+
+    def confusion_mets_all_thresholds(self,ref,sys,w):
+        """
+        * Description: this function calculates the confusion measures and the metrics
+                       for all distinct thresholds of the system output mask at once. The
+                       system output values are histogrammed separately over the scored
+                       reference and non-reference regions, and the cumulative sums of the
+                       histograms give the confusion measures for every threshold
+        * Inputs:
+        *     ref: the reference mask object
+        *     sys: the system output mask object
+        *     w: the weight matrix
+        * Output:
+        *     thresMets: a dataframe of the confusion measures and metrics for each threshold
+        """
+        hists = self.confusion_histograms(ref,sys,w)
+        return self.confusion_mets_histograms(hists,ref.name,sys.name)
+
+    def confusion_mets_histograms(self,hists,refname,sysname):
+        """
+        * Description: this function calculates the confusion measures and the metrics
+                       for all distinct thresholds from the histograms of the system output mask values
+        * Inputs:
+        *     hists: the 4 x 256 histograms from confusion_histograms
+        *     refname: the name of the reference mask
+        *     sysname: the name of the system output mask
+        * Output:
+        *     thresMets: a dataframe of the confusion measures and metrics for each threshold
+        """
+        #thresholds are taken over the entire system output mask, no-score zones included
+        t_list = np.nonzero(hists.sum(axis=0))[0]
+        t_list = np.append(-1,t_list)
+
+        #index 0 of each cumulative sum is reserved for the threshold -1
+        pos_cum = np.append(0,np.cumsum(hists[1]))
+        neg_cum = np.append(0,np.cumsum(hists[2]))
+
+        tp = pos_cum[t_list + 1]
+        fp = neg_cum[t_list + 1]
+        conf = {'TP':tp,
+                'TN':neg_cum[-1] - fp,
+                'FP':fp,
+                'FN':pos_cum[-1] - tp,
+                'N':np.full(len(t_list),hists[1:].sum(),dtype=np.int64)}
+
+        thresMets = pd.DataFrame({'Reference Mask':refname,
+                                  'System Output Mask':sysname,
+                                  'Threshold':t_list,
+                                  'NMM':self.NimbleMaskMetric_thresholds(conf),
+                                  'MCC':self.matthews_thresholds(conf),
+                                  'BWL1':self.binaryWeightedL1_thresholds(conf),
+                                  'TP':conf['TP'],
+                                  'TN':conf['TN'],
+                                  'FP':conf['FP'],
+                                  'FN':conf['FN'],
+                                  'N':conf['N']})
 
         return thresMets
 
@@ -311,6 +497,48 @@ class maskMetrics:
             score = float(score)
         return score
 
+    def NimbleMaskMetric_thresholds(self,conf,c=-1):
+        """
+        * Metric: NMM
+        * Description: this function calculates the NMM over a set of thresholds at once
+        * Inputs:
+        *     conf: dictionary of arrays of the confusion measures, one entry per threshold
+        *     c: hinge value, the cutoff at which the region is scored (default: -1)
+        * Output:
+        *     array of NMM scores in range [c, 1], nan where there is no reference region
+        """
+        tp = conf['TP'].astype(np.float64)
+        Rgt = tp + conf['FN']
+        with np.errstate(divide='ignore',invalid='ignore'):
+            nmm = np.maximum(c,(tp - conf['FN'] - conf['FP'])/Rgt)
+        nmm[Rgt == 0] = np.nan
+        return nmm
+
+    def matthews_thresholds(self,conf):
+        """
+        * Metric: MCC (Matthews correlation coefficient)
+        * Description: this function calculates the MCC over a set of thresholds at once.
+                       Extended precision is used to stay close to the Decimal computation
+                       in the matthews function
+        * Input:
+        *     conf: dictionary of arrays of the confusion measures, one entry per threshold
+        * Output:
+        *     array of scores in range [-1, 1], nan where n is 0
+        """
+        tp = conf['TP'].astype(np.longdouble)
+        fp = conf['FP'].astype(np.longdouble)
+        tn = conf['TN'].astype(np.longdouble)
+        fn = conf['FN'].astype(np.longdouble)
+        n = conf['N']
+
+        s = tp + fn
+        p = tp + fp
+        valid = (s != n) & (p != n) & (s != 0) & (p != 0)
+        score = np.zeros(len(n),dtype=np.float64)
+        score[valid] = ((tp*tn - fp*fn)[valid]/(np.sqrt(p*s)*np.sqrt((tn + fp)*(tn + fn)))[valid]).astype(np.float64)
+        score[n == 0] = np.nan
+        return score
+
     def hamming(self,ref,sys):
         """
         * Metric: Hamming distance
@@ -356,6 +584,22 @@ class maskMetrics:
         norm_wL1=float(conf['FP'] + conf['FN'])/n
         return norm_wL1
 
+    def binaryWeightedL1_thresholds(self,conf):
+        """
+        * Metric: binary Weighted L1
+        * Description: this function calculates the binary weighted L1 loss over a set of
+                       thresholds at once
+        * Inputs:
+        *     conf: dictionary of arrays of the confusion measures, one entry per threshold
+        * Outputs:
+        *     array of normalized binary WL1 values, nan where n is 0
+        """
+        n = conf['N'].astype(np.float64)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            norm_wL1 = (conf['FP'] + conf['FN'])/n
+        norm_wL1[n == 0] = np.nan
+        return norm_wL1
+
 #    def binaryWeightedL1(self,ref,sys,w,th):
 #        """
 #        * Metric: binary Weighted L1
@@ -492,16 +736,33 @@ class maskMetrics:
             weighted_weights = weighted_weights + 4*(1-pns)
             ptotal = np.sum(weighted_weights >= 4)
 
-#        if not (self.sys_threshold in uniques) and self.sys_threshold > -10:
-        smat = sys.matrix
-        uniques=np.unique(smat.astype(float))
-        uniques=np.sort(np.append(uniques,-1)) #NOTE: adding the threshold that makes everything white. The threshold that makes everything black is already there.
-
         #for all thresholds
         #sys.binarize(0)
         self.myprintbuffer = myprintbuffer
 #        thresMets = thresMets.apply(self.assign_mets,axis=1,reduce=False)
-        thresMets = self.confusion_mets_all_thresholds(ref,sys,w)
+        hists = self.confusion_histograms(ref,sys,w)
+        return self.runningThresholdsHistograms(hists,ref.name,sys.name,btotal,stotal,ptotal,myprintbuffer)
+
+    def runningThresholdsHistograms(self,hists,refname,sysname,btotal,stotal,ptotal,myprintbuffer=0):
+        """
+        * Description: this function computes the metrics over the set of thresholds from the
+                       histograms of the system output mask values, which may have been
+                       accumulated over strips of the masks
+
+        * Inputs:
+        *     hists: the 4 x 256 histograms from confusion_histograms
+        *     refname: the name of the reference mask
+        *     sysname: the name of the system output mask
+        *     btotal: the number of pixels in the boundary no-score zone
+        *     stotal: the number of pixels in the selected no-score zone
+        *     ptotal: the number of pixels in the pixel no-score zone
+        *     myprintbuffer: buffer to store verbose printout for atomic printout.
+
+        * Outputs:
+        *     thresMets: a dataframe of the computed threshold metrics
+        *     tmax: the threshold yielding the maximum MCC 
+        """
+        thresMets = self.confusion_mets_histograms(hists,refname,sysname)
         thresMets['BNS'] = btotal
         thresMets['SNS'] = stotal
         thresMets['PNS'] = ptotal
@@ -617,9 +878,7 @@ class maskMetrics:
 
             if sbin >= -1:
                 #just get scores in one run if threshold is chosen
-                #TODO: threshold table lookup this instead.
-                self.sys.binarize(sbin)
-                myameas = self.getMetrics(self.ref,self.sys,w,sbin,myprintbuffer)
+                myameas = self.getMetricsTable(thresMets,sbin,myprintbuffer)
                 all_metrics['ActualThreshold'] = sbin
 
             mets['GWL1'] = maskMetrics.grayscaleWeightedL1(self.ref,self.sys,w)
@@ -0,0 +1,1051 @@
+"""
+ *File: maskMetricsRender.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the rendering of the per-probe HTML reports of the mask scorer. Scoring
+               saves only what each report is drawn from (the scores, the threshold table, and the binarized
+               masks and no-score zones) to a render data file in the probe's output directory, and the
+               reports are rendered from those files in a separate stage, on a pool of processes and for
+               all or a selection of the probes.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+import cv2
+import numpy as np
+import pandas as pd
+import os
+import sys
+import pickle
+import multiprocessing
+from numpngw import write_apng
+from string import Template
+lib_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(lib_path)
+import masks
+import Render as p
+import fileOps
+from collections import OrderedDict
+from scheduler import imap_largest_first
+from constants import *
+
+render_data_name = 'renderData.npz'
+
+class renderParams:
+    """
+    This class holds the scoring parameters the reports are rendered with. It is saved with the
+    render data of each probe, so that the reports can be rendered without the scorer.
+    """
+    def __init__(self,**kwds):
+        self.__dict__.update(kwds)
+
+def saveRenderData(path,meta,**mats):
+    """
+    * Description: saves the data the HTML report of one probe is rendered from. Matrices taking at most
+                   one nonzero value, such as binarized masks and no-score zones, are stored as bits
+    * Inputs:
+    *     path: the render data file
+    *     meta: a dictionary of the scores, names, and parameters for the report
+    *     mats: the matrices for the report
+    """
+    payload = {'meta':np.frombuffer(pickle.dumps(meta,2),dtype=np.uint8)}
+    for n,m in mats.items():
+        m = np.asarray(m)
+        on = m.max() if m.size > 0 else 1
+        bits = m != 0
+        if np.count_nonzero(m == on) == np.count_nonzero(bits):
+            payload['%s_bits' % n] = np.packbits(bits)
+            payload['%s_shape' % n] = np.array(m.shape,dtype=np.int64)
+            payload['%s_on' % n] = np.array([on],dtype=m.dtype)
+        else:
+            payload['%s_mat' % n] = m
+    np.savez_compressed(path,**payload)
+
+def loadRenderData(path,meta_only=False):
+    """
+    * Description: reads the data saved by saveRenderData
+    * Inputs:
+    *     path: the render data file
+    *     meta_only: whether to read only the dictionary of scores, names, and parameters
+    * Outputs:
+    *     meta: the dictionary of scores, names, and parameters
+    *     mats: the dictionary of matrices, empty if meta_only is set
+    """
+    mats = {}
+    with np.load(path) as entry:
+        meta = pickle.loads(entry['meta'].tostring())
+        if meta_only:
+            return meta,mats
+        for f in entry.files:
+            if f.endswith('_bits'):
+                n = f[:-5]
+                shape = tuple(entry['%s_shape' % n])
+                size = int(np.prod(shape))
+                mats[n] = np.unpackbits(entry[f])[:size].reshape(shape)*entry['%s_on' % n][0]
+            elif f.endswith('_mat'):
+                mats[f[:-4]] = entry[f]
+    return meta,mats
+
+def findRenderData(dirname):
+    """
+    * Description: finds the render data files saved under a directory by the scorer
+    * Inputs:
+    *     dirname: the output directory of the scorer
+    * Output:
+    *     a sorted list of the render data files
+    """
+    paths = []
+    for root,dirs,files in os.walk(dirname):
+        if render_data_name in files:
+            paths.append(os.path.join(root,render_data_name))
+    return sorted(paths)
+
+def selectRenderData(paths,worst=0,query=''):
+    """
+    * Description: selects the probes to render the reports of
+    * Inputs:
+    *     paths: the render data files
+    *     worst: the number of probes with the lowest OptimumMCC to select. 0 selects them all
+    *     query: a query over the scored rows of the probes (e.g. "OptimumMCC < 0.5"), applied before worst
+    * Output:
+    *     the list of the selected render data files
+    """
+    if (len(paths) == 0) or ((worst == 0) and (query == '')):
+        return paths
+    rows = pd.DataFrame([loadRenderData(path,meta_only=True)[0]['row'] for path in paths])
+    rows['RenderData'] = paths
+    if query != '':
+        rows = rows.query(query)
+    if worst > 0:
+        rows = rows.sort_values('OptimumMCC',kind='mergesort').head(worst)
+    return rows['RenderData'].tolist()
+
+def renderReport(path,roc_format='pdf'):
+    """
+    * Description: renders the HTML report of one probe in the directory of its render data file
+    * Inputs:
+    *     path: the render data file
+    *     roc_format: the format to save the ROC curve of the probe in, 'pdf' or 'png'
+    * Outputs:
+    *     the printout of the rendering, the list of errors encountered, and the filesystem operations made
+    """
+    myprintbuffer = []
+    errlist = []
+    fs_counts = fileOps.get_counts()
+    try:
+        meta,mats = loadRenderData(path)
+        myprintbuffer.append("Rendering the HTML report in {}...".format(os.path.dirname(path)))
+        maskMetricsRender(meta['params'],roc_format).renderProbe(os.path.dirname(path),meta,mats,myprintbuffer)
+    except:
+        exc_type,exc_obj,exc_tb = sys.exc_info()
+        print("The HTML report for {} encountered exception {} at line {}.".format(path,exc_type,exc_tb.tb_lineno))
+        errlist.append(exc_type)
+    return "\n".join(myprintbuffer),errlist,fileOps.count_diff(fileOps.get_counts(),fs_counts)
+
+def renderReportTask(args):
+    return renderReport(*args)
+
+def renderReports(paths,processors=1,verbose=False,roc_format='pdf',remove=False):
+    """
+    * Description: renders the HTML reports of a list of probes, spread over a pool of processes
+    * Inputs:
+    *     paths: the render data files of the probes
+    *     processors: the number of processes to render with
+    *     verbose: permit printout from the rendering
+    *     roc_format: the format to save the per-probe ROC curves in, 'pdf' or 'png'
+    *     remove: whether to remove the render data file of each report rendered without error
+    * Output:
+    *     the list of errors encountered
+    """
+    processors = max(min(processors,len(paths),multiprocessing.cpu_count() - 2),1)
+    if processors == 1:
+        results = [renderReport(path,roc_format) for path in paths]
+    else:
+        #render the reports of the largest masks first
+        sizes = [np.prod(loadRenderData(path,meta_only=True)[0]['dims']) for path in paths]
+        results = imap_largest_first(renderReportTask,[(path,roc_format) for path in paths],sizes,processors)
+
+    errlist = []
+    for path,(msg,errs,counts) in zip(paths,results):
+        if processors > 1:
+            fileOps.add_counts(counts)
+        if verbose:
+            print("="*30)
+            print(msg)
+        errlist.extend(errs)
+        if remove and (len(errs) == 0):
+            fileOps.remove(path)
+    return errlist
+
+def colorMaskNames(sysMaskName,outputMaskPath,usejpeg2000):
+    """
+    * Description: names the aggregate mask image and its composite with the probe for the HTML report
+    * Inputs:
+    *     sysMaskName: the name of the system output mask
+    *     outputMaskPath: the directory in which to output the composite images
+    *     usejpeg2000: whether the reference masks are JPEG2000 masks, whose composites are animated
+    * Outputs:
+    *     the colored mask path and the aggregate mask path
+    """
+    outputMaskBase = sysMaskName.split('/')[-1].split('.')[0]
+    compositeExt = 'jpg'
+    if usejpeg2000:
+        compositeExt = 'png'
+    return (os.path.join(outputMaskPath,"_".join([outputMaskBase,"colored.jpg"])),
+            os.path.join(outputMaskPath,"_".join([outputMaskBase,"composite.%s" % compositeExt])))
+
+#for use with detection metrics plotter
+class detPackage:
+    def __init__(self,
+                 tpr,
+                 fpr,
+                 fpr_stop,
+                 ci_tpr,
+                 auc,
+                 nTarget,
+                 nNonTarget):
+        """
+        This class is a wrapper for a collection of metrics for rendering the ROC curve
+        of the detection metrics.
+        """
+        self.tpr = tpr
+        self.fpr = fpr
+        self.fpr_stop = fpr_stop
+        self.ci_tpr = ci_tpr
+        self.auc = auc
+        self.t_num = nTarget
+        self.nt_num = nNonTarget
+        self.d = None #TODO: possibility of computing d in the future
+        
+def plotROC(mydets,plotname,plot_title,outdir):
+    #initialize plot options for ROC
+#    dict_plot_options_path_name = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../tools/MaskScorer/plotJsonFiles/plot_options.json")
+#    dict_plot_options_path_name = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../tools/DetectionScorer/plotJsonFiles/plot_options.json")
+#    p.gen_default_plot_options(dict_plot_options_path_name,plot_title=plot_title,plot_type='ROC')
+#    plot_opts = p.load_plot_options(dict_plot_options_path_name)
+    plot_opts = OrderedDict([
+            ('title', plot_title),
+            ('subtitle', ''),
+            ('plot_type', 'ROC'),
+            ('title_fontsize', 13),  # 15
+            ('subtitle_fontsize', 11),
+            ('xticks_size', 'medium'),
+            ('yticks_size', 'medium'),
+            ('xlabel', "False Alarm Rate [%]"),
+            ('xlabel_fontsize', 11),
+            ('ylabel', "Miss Detection Rate [%]"),
+            ('ylabel_fontsize', 11)])
+    
+    opts_list = [OrderedDict([('color', 'red'),
+                              ('linestyle', 'solid'),
+                              ('marker', '.'),
+                              ('markersize', 6),
+                              ('markerfacecolor', 'red'),
+                              ('label',None),
+                              ('antialiased', 'False')])]
+
+    #compute AUC and EER with detection metrics and store in 
+    #add ci_tpr to rocvalues
+#            rocvalues['ci_tpr'] = 0
+
+    configRender = p.setRender([mydets],opts_list,plot_opts)
+    myRender = p.Render(configRender)
+    myroc = myRender.plot_curve()
+
+    #save roc curve in the output. Automatically closes the plot.
+    #TODO: error with savefig. RuntimeError involving plots. Hack around it more elegantly.
+    while True:
+        try:
+            myroc.savefig(os.path.join(outdir,'.'.join([plotname,'pdf'])), bbox_inches='tight')
+            break
+        except RuntimeError:
+            pass
+
+    return myroc
+
+
+class rocPlotter:
+    """
+    This class plots the per-probe ROC curves of the HTML reports. It draws on one figure for all of the
+    probes rendered in a process: the axes, labels, and grid are set up once, and only the curve, its
+    annotation, and the title are updated in place for each probe before the figure is saved.
+    """
+    def __init__(self,roc_format='pdf'):
+        """
+        Constructor
+
+        Attributes:
+        - roc_format: the format to save the ROC curves in, 'pdf' or 'png'
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.roc_format = roc_format
+        self.fig = Figure(figsize=(7,6.5),dpi=120,facecolor='w',edgecolor='k')
+        self.canvas = FigureCanvasAgg(self.fig)
+        ax = self.fig.add_subplot(111)
+
+        #the same options plotROC renders the curve with
+        self.curve, = ax.plot([],[],color='red',linestyle='solid',marker='.',markersize=6,markerfacecolor='red',label=None,antialiased='False')
+        ax.plot((0,1),'--',lw=0.5) #bisector
+        self.ci_upper, = ax.plot([],[],'k--')
+        self.ci_lower, = ax.plot([],[],'k--')
+        self.note = ax.annotate('',xy=(0.7,0.2),xycoords='data',xytext=(0.7,0.2),textcoords='data',
+                                size=10,va='center',ha='center',bbox=dict(boxstyle="round4",fc="w"))
+        ax.set_xlim([0,1])
+        ax.set_ylim([0,1])
+        xytick = np.linspace(0,1,11)
+        tick_labels = [str(int(x*100)) for x in xytick]
+        ax.set_xticks(xytick)
+        ax.set_xticklabels(tick_labels,size='medium')
+        ax.set_yticks(xytick)
+        ax.set_yticklabels(tick_labels,size='medium')
+        self.title = self.fig.suptitle('',fontsize=13)
+        ax.set_title('',fontsize=11)
+        ax.set_xlabel("False Alarm Rate [%]",fontsize=11)
+        ax.set_ylabel("Correct Detection Rate [%]",fontsize=11)
+        ax.grid()
+
+        #the bounds of everything but the title, which are the same for every curve. The tight bounds of
+        #each plot are these together with its title's, which spares savefig drawing the figure twice
+        self.renderer = self.canvas.get_renderer()
+        self.title.set_visible(False)
+        self.frame_bbox = self.fig.get_tightbbox(self.renderer)
+        self.title.set_visible(True)
+
+    def plot(self,fpr,tpr,auc,nTarget,nNonTarget,plot_title,outdir,plotname='roc'):
+        """
+        * Description: plots and saves the ROC curve of one probe
+        * Inputs:
+        *     fpr: the false positive rates of the curve
+        *     tpr: the true positive rates of the curve
+        *     auc: the area under the curve
+        *     nTarget: the number of target pixels
+        *     nNonTarget: the number of non-target pixels
+        *     plot_title: the title of the plot
+        *     outdir: the directory to save the plot in
+        *     plotname: the name of the plot file, without its extension
+        * Output:
+        *     the path of the saved plot
+        """
+        from matplotlib.transforms import Bbox
+        fpr = np.asarray(fpr)
+        tpr = np.asarray(tpr)
+        #there is no confidence interval for a single probe, so its bounds coincide with the curve
+        for line in [self.curve,self.ci_upper,self.ci_lower]:
+            line.set_data(fpr,tpr)
+        self.note.set_text("AUC=%.2f\n(T#: %d, NT#: %d) " % (auc,nTarget,nNonTarget))
+        self.title.set_text(plot_title)
+        title_bbox = self.title.get_window_extent(self.renderer).transformed(self.fig.dpi_scale_trans.inverted())
+        bbox = Bbox.union([self.frame_bbox,title_bbox]).padded(0.1)
+        path = os.path.join(outdir,'.'.join([plotname,self.roc_format]))
+        self.fig.savefig(path,format=self.roc_format,bbox_inches=bbox)
+        return path
+
+#one plotter per process and format, reused across the reports the process renders
+roc_plotters = {}
+def getRocPlotter(roc_format='pdf'):
+    if roc_format not in roc_plotters:
+        roc_plotters[roc_format] = rocPlotter(roc_format)
+    return roc_plotters[roc_format]
+
+class maskMetricsRender:
+    """
+    This class renders the HTML report of a probe from the data saved for it by the mask metric runner.
+    """
+    def __init__(self,params,roc_format='pdf'):
+        """
+        Constructor
+
+        Attributes:
+        - roc_format: the format to save the ROC curve of the probe in, 'pdf' or 'png'
+        - params: the renderParams the probe was scored with, with the following variables:
+            - task: the task over which the scorer is run
+            - mode: 0 for the manipulation task, 1 for the probe of the splice task, 2 for the donor of the splice task
+            - refDir: the reference directory
+            - rbin: the threshold to binarize the reference mask at. -1 selects the regions with the journal
+            - sbin: the threshold to binarize the system output mask at. Below -1 if not given
+            - usejpeg2000: whether the reference masks are JPEG2000 masks
+            - cache_dir: the directory reference mask data is cached in, or None
+            - kern: kernel shape to be used
+            - erodeKernSize: length of the erosion kernel matrix
+            - colordict: the dictionary of colors to use for the HTML output, in BGR array format
+        """
+        self.__dict__.update(params.__dict__)
+        self.roc_format = roc_format
+        self.journalData = 0
+
+    def renderProbe(self,outputRoot,meta,mats,myprintbuffer):
+        """
+        * Description: renders the HTML report of a probe, and the images it displays
+        * Inputs:
+        *     outputRoot: the directory to deposit the images and the HTML file, where the render data is saved
+        *     meta: the dictionary of scores, names, and parameters saved by the mask metric runner
+        *     mats: the dictionary of matrices saved by the mask metric runner, with the following keys:
+        *         refBW: the binarized reference mask
+        *         bns: the boundary no-score zone
+        *         sns: the unselected no-score zone
+        *         pns: the pixel no-score zone, absent if there is none
+        *         optBin: the system output mask binarized at the optimum threshold
+        *         sysBW: the binarized system output mask to compare with the reference in the aggregate mask
+        *     myprintbuffer: buffer to append printout for atomic printout
+        """
+        self.journalData = meta['journal']
+        probeFileID = meta['probeFileID']
+
+        sysMaskName = meta['sysMaskName']
+        if sysMaskName == '':
+            #the system output mask was empty. The report links to a white mask in its place
+            sysMaskName = os.path.abspath(os.path.join(outputRoot,'whitemask.png'))
+            masks.constmask(sysMaskName,meta['dims']).save(sysMaskName)
+
+        if self.usejpeg2000 and (self.rbin == -1):
+            #the colors of the regions are needed for the animated masks
+            rImg = masks.refmask(meta['refMaskName'],jData=meta['refJournal'],mode=self.mode)
+        else:
+            rImg = masks.mask(meta['refMaskName'],1)
+        rImg.bwmat = mats['refBW']
+
+        bns = mats['bns']
+        sns = mats['sns']
+        pns = mats.get('pns',0)
+        rbin_name = os.path.join(outputRoot,meta['rbinName'])
+        rImg.save_color_ns(rbin_name,bns,sns,pns)
+        cv2.imwrite(os.path.join(outputRoot,meta['optbinName']),mats['optBin'],[png_compress_const,0])
+
+        roc = meta['roc']
+        if roc is not None:
+            myprintbuffer.append("Plotting ROC curve...")
+            getRocPlotter(self.roc_format).plot(roc['fpr'],roc['tpr'],roc['auc'],roc['nTarget'],roc['nNonTarget'],roc['title'],outputRoot)
+
+        maniImgName = os.path.join(self.refDir,meta['probeFileName'])
+        colordirs = self.aggregateColorMask(rImg,mats['sysBW'],sysMaskName,bns,sns,pns,self.kern,self.erodeKernSize,probeFileID,maniImgName,outputRoot)
+        myprintbuffer.append("Generating aggregate color mask for HTML report...")
+
+        myprintbuffer.append("Generating HTML report...")
+        self.manipReport(self.task,outputRoot,probeFileID,meta['probeFileName'],meta['baseFileName'],rImg,sysMaskName,
+                         rbin_name,os.path.join(outputRoot,meta['sbinName']),meta['sysThreshold'],meta['thresMets'],
+                         bns,sns,pns,meta['mets'],meta['confMeasures'],colordirs['mask'],colordirs['agg'],myprintbuffer)
+
+    def num2hex(self,color):
+        """
+        * Description: this function converts one BGR color to a hex string at a time
+        * Inputs:
+        *     color: a list of three integers from 0 to 255 denoting a color code
+        * Outputs:
+        *     hexcolor: the hexadecimal color code corresponding to that color
+        """
+
+        myb = hex(color[0])[2:]
+        myg = hex(color[1])[2:]
+        myr = hex(color[2])[2:]
+        if len(myb)==1:
+            myb = '0' + myb 
+        if len(myg)==1:
+            myg = '0' + myg 
+        if len(myr)==1:
+            myr = '0' + myr
+        hexcolor = (''.join([myr,myg,myb])).upper()
+        return hexcolor
+
+    def nums2hex(self,colors):
+        """
+        * Description: this function outputs the hexadecimal strings for a dictionary of colors for the HTML report
+        * Inputs:
+        *     colors: list of strings corresponding to the colors in self.colordict
+        * Outputs:
+        *     hexcolors: dictionary of hexadecimal color codes
+        """
+        hexcolors = {}
+        for c in colors:
+            mybgr = self.colordict[c]
+            hexcolors[c] = self.num2hex(mybgr)
+        return hexcolors
+    
+    def manipReport(self,task,outputRoot,probeFileID,maniImageFName,baseImageFName,rImg,sysMaskName,rbin_name,sbin_name,sys_threshold,thresMets,b_weights,s_weights,p_weights,metrics,confmeasures,colMaskName,aggImgName,myprintbuffer):
+        """
+        * Description: this function assembles the HTML report for the manipulated image and is meant to be used solely by renderProbe
+        * Inputs:
+        *     task: the task over which the scorer is run
+        *     outputRoot: the directory to deposit the weight image and the HTML file
+        *     probeFileID: the ID of the image to be considered
+        *     maniImageFName: the manipulated probe file name, relative to the reference directory (self.refDir) 
+        *     baseImageFName: the base file name of the probe, relative to the reference directory (self.refDir) 
+        *     rImg: the unmodified reference image used for the mask evaluation
+        *     sysMaskName: the name of the unmodified system output image used for the mask evaluation
+        *     rbin_name: the name of the binarized reference image used for the mask evaluation
+        *     sbin_name: the name of the binarized system output image used for the mask evaluation
+        *     sys_threshold: the threshold used to binarize the system output mask
+        *     thresMets: the table of thresholds for the image and the scores they yielded for that threshold
+        *     b_weights: the weighted matrix of the no-score zones of the targeted regions
+        *     s_weights: the weighted matrix of the no-score zones generated from the non-target regions
+        *     p_weights: the weighted matrix of the no-score zones generated from pixels of a select value in the original mask
+        *     metrics: the dictionary of mask scores
+        *     confmeasures: truth table measures evaluated between the reference and system output masks
+        *     colMaskName: the aggregate mask image of the ground truth, system output, and no-score regions
+                           for the HTML report
+        *     aggImgName: the above colored mask superimposed on a grayscale of the reference image
+        *     myprintbuffer: buffer to append printout for atomic printout
+        """
+        fileOps.mkdir(outputRoot)
+
+        #compute the weights
+        bwts = np.uint8(b_weights)
+        swts = np.uint8(s_weights)
+
+        rImg_name = rImg.name
+        sImg_name = sysMaskName
+        sysBase = os.path.basename(sImg_name)[:-4]
+        weightFName = '-'.join([sysBase,'weights.png'])
+        weightpath = os.path.join(outputRoot,weightFName)
+
+        myprintbuffer.append("Generating weights image...")
+        mywts = cv2.bitwise_and(b_weights,s_weights)
+
+        dims = bwts.shape
+        colwts = 255*np.ones((dims[0],dims[1],3),dtype=np.uint8)
+        #combine the colors for bwts and swts to colwts
+        colwts[bwts==0] = self.colordict['yellow']
+        colwts[swts==0] = self.colordict['pink']
+
+        totalpns = 0
+        if p_weights is not 0:
+            colwts[p_weights==0] = self.colordict['purple']
+            totalpns = int(np.sum(p_weights==0))
+            mywts = cv2.bitwise_and(p_weights,mywts)
+
+        totalns = (mywts == 0).sum()
+
+        myprintbuffer.append("Saving weights image...")
+        cv2.imwrite(weightpath,colwts)
+
+        mPath = os.path.join(self.refDir,maniImageFName)
+        allshapes=min(dims[1],640) #limit on width for readability of the report
+
+        # generate HTML files
+        myprintbuffer.append("Reading HTML template...")
+        #TODO: save as variable in some other file that we can reformat with .format()?
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../tools/MaskScorer/html_template.txt"), 'r') as f:
+            htmlstr = Template(f.read())
+
+        #dictionary of colors corresponding to confusion measures
+        cols = {'tpcol':'green','fpcol':'red','tncol':'white','fncol':'blue','bnscol':'yellow','snscol':'pink','pnscol':'purple'}
+        hexs = self.nums2hex(cols.values()) #get hex strings from the BGR cols
+
+        jtable = ''
+        mymode = 'Probe'
+        if self.mode == 2:
+            mymode = 'Donor'
+        elif self.mode == 0: #TODO: temporary measure until we get splice sorted out, originally self.mode != 2
+            evalcol='Evaluated'
+            if self.mode == 1:
+                evalcol='ProbeEvaluated'
+
+            myprintbuffer.append("Composing journal table...")
+#            journalID = self.joinData.query("{}FileID=='{}'".format(mymode,probeFileID))['JournalName'].iloc[0]
+            journalHeaders = list(self.journalData)
+            toSequence = 'Sequence' in journalHeaders
+
+            journalkeys = ['Operation','Purpose','Color',evalcol]
+            if self.usejpeg2000:
+                journalkeys.insert(0,'BitPlane')
+            if toSequence:
+                journalkeys.insert(0,'Sequence')
+
+            jdata = self.journalData.query("ProbeFileID=='{}' & Color!=''".format(probeFileID))[journalkeys] #("JournalName=='{}'".format(journalID))[['Operation','Purpose','Color',evalcol]] #NOTE: as long as Purpose is in there. It is otherwise dispensible.
+            if toSequence:
+                jdata = jdata.sort_values("Sequence",ascending=False)
+            #jdata.loc[pd.isnull(jdata['Purpose']),'Purpose'] = '' #make NaN Purposes empty string
+
+            #make those color cells empty with only the color as demonstration
+            jDataColors = list(jdata['Color'])
+            jDataColArrays = [x[::-1] for x in [c.split(' ') for c in jDataColors]]
+            jDataColArrays = [[int(x) for x in c] for c in jDataColArrays]
+            jDataHex = pd.Series([self.num2hex(c) for c in jDataColArrays],index=jdata.index) #match the indices
+            jdata['Color'] = 'td bgcolor="#' + jDataHex + '"btd'
+            jtable = jdata.to_html(index=False)
+            jtable = jtable.replace('<td>td','<td').replace('btd','>')
+        
+        #generate the HTML for the metrics table here. Instead of reading in a template. Use a prebuilt variable of strings instead in a separate package.
+        met_table = self.gen_metrics_table(metrics)
+                
+        optidx = thresMets['MCC'].idxmax()
+
+        if not np.isnan(optidx):
+            optT = int(thresMets.loc[optidx]['Threshold'])
+    
+            met_table_prefix = 'Optimum Threshold: {}<br>'.format(optT)
+            if self.sbin >= -1:
+                met_table_prefix = "<ul><li><b>Optimum Threshold</b>: {}</li><li><b>Actual Threshold</b>: {}</li></ul><br>".format(optT,self.sbin)
+            met_table = ''.join([met_table_prefix,met_table])
+
+        myprintbuffer.append("Computing pixel count...") 
+        totalpx = np.sum(mywts==1)
+        allpx = dims[0]*dims[1]
+        totalbns = confmeasures['PixelBNS'] #np.sum(bwts==0)
+        totalsns = confmeasures['PixelSNS'] #np.sum(swts==0)
+
+        perctp="nan"
+        percfp="nan"
+        perctn="nan"
+        percfn="nan"
+        percbns="nan"
+        percsns="nan"
+        percpns="nan"
+        perctns="nan"
+
+        if totalpx > 0:
+            perctp='{0:.3f}'.format(float(confmeasures['OptimumPixelTP'])/totalpx)
+            percfp='{0:.3f}'.format(float(confmeasures['OptimumPixelFP'])/totalpx)
+            perctn='{0:.3f}'.format(float(confmeasures['OptimumPixelTN'])/totalpx)
+            percfn='{0:.3f}'.format(float(confmeasures['OptimumPixelFN'])/totalpx)
+
+        if allpx > 0: #standard protection
+            percbns='{0:.3f}'.format(float(totalbns)/allpx)
+            percsns='{0:.3f}'.format(float(totalsns)/allpx)
+            percpns='{0:.3f}'.format(float(totalpns)/allpx)
+            perctns='{0:.3f}'.format(float(totalns)/allpx)
+
+        #generate table for confusion measures
+        conf_measures = {}
+        for m in ['TP','FP','TN','FN']:
+            m_name = 'OptimumPixel%s' % m 
+            conf_measures[m_name] = int(confmeasures[m_name])
+            if self.sbin >= -1:
+                am_name = 'ActualPixel%s' % m
+                conf_measures[am_name] = int(confmeasures[am_name])
+        conf_measures['TotalPixels'] = totalpx
+
+        conf_table = self.gen_confusion_table(conf_measures)
+        
+        #recolor the conf_table measures
+        conf_table = (conf_table.replace("TP: green",'<font style="color:#{}">TP: green</font>'.format(hexs[cols['tpcol']]))
+                                .replace("FP: red",'<font style="color:#{}">FP: red</font>'.format(hexs[cols['fpcol']]))
+                                .replace("TN: white",'<font style="color:#{}">TN: white</font>'.format(hexs[cols['tncol']]))
+                                .replace("FN: blue",'<font style="color:#{}">FN: blue</font>'.format(hexs[cols['fncol']])))
+
+        thresString = ''
+        plt_width = 540 #NOTE: custom value for plot sizes
+
+        if len(thresMets.dropna()) > 1:
+            myprintbuffer.append("Generating MCC per threshold graph...")
+            #plot MCC
+            try:
+                #drawn on its own Agg canvas, as the ROC curve is, so that no display is needed
+                from matplotlib.figure import Figure
+                from matplotlib.backends.backend_agg import FigureCanvasAgg
+                fig = Figure()
+                FigureCanvasAgg(fig)
+                ax = fig.add_subplot(111)
+                ax.plot(thresMets['Threshold'],thresMets['MCC'],'bo',thresMets['Threshold'],thresMets['MCC'],'k')
+                #plot cyan point for supremum, red point for actual if sbin >= 0, and legend with two or three as appropriate
+                optidx = thresMets['MCC'].idxmax()
+                optT = thresMets.loc[optidx]['Threshold']
+                optMCC = thresMets.loc[optidx]['MCC']
+                optpt, = ax.plot([optT],[optMCC],'co',markersize=12)
+                handles = [optpt]
+                labels = ['Optimal MCC']
+                if self.sbin >= -1:
+                    tlist = thresMets['Threshold'].tolist()
+                    actT = sys_threshold
+                    if sys_threshold in tlist:
+                        actMCC = thresMets.query("Threshold=={}".format(sys_threshold)).iloc[0]['MCC']
+                    else:
+                        #get max threshold less than or equal to threshold
+                        actT = max([t for t in tlist if t <= sys_threshold])
+                        actMCC = thresMets.query("Threshold=={}".format(actT)).iloc[0]['MCC']
+                    actpt, = ax.plot([actT],[actMCC],'ro',markersize=8)
+                    handles.append(actpt)
+                    labels.append('Actual MCC')
+                ax.legend(handles,labels,loc='upper right', borderaxespad=0, prop={'size':8}, shadow=True, fontsize='small',numpoints=1)
+                fig.suptitle('MCC per Threshold',fontsize=14)
+                ax.set_xlabel("Binarization threshold value")
+                ax.set_ylabel("Matthews Correlation Coefficient (MCC)")
+                thresString = os.path.join(outputRoot,'thresMets.png')
+                fig.savefig(thresString,bbox_inches='tight') #save the graph
+                thresString = "<img src=\"{}\" alt=\"thresholds graph\" style=\"width:{}px;\">".format('thresMets.png',plt_width)
+            except:
+                raise
+                e = sys.exc_info()[0]
+#                print("The plotter encountered error {}. Defaulting to table display for the HTML report.".format(e))
+                print("Warning: The plotter encountered an issue. Defaulting to table display for the HTML report.")
+                thresMets = thresMets.round({'NMM':3,'MCC':3,'BWL1':3,'GWL1':3})
+                thresString = '<h4>Measures for Each Threshold</h4><br/>' + thresMets.to_html(index=False).replace("text-align: right;","text-align: center;")
+        else:
+            thresString = 'Threshold graph not applicable<br>'
+
+        #build soft links for mPath, rImg_name, sImg_name, use compact relative links for all
+        mBase = os.path.basename(mPath)
+        rBase = os.path.basename(rImg_name)
+        sBase = os.path.basename(sImg_name)
+
+        #change to donor depending on mode
+        basehtml = ''
+        mpfx = 'probe'
+        if self.mode==2:
+            mpfx = 'donor'
+        else:
+            bPath = os.path.join(self.refDir,baseImageFName)
+            bBase = os.path.basename(bPath)
+            bPathNew = os.path.join(outputRoot,''.join(['baseFile',baseImageFName[-4:]]))
+            try:
+                os.remove(bPathNew)
+            except OSError:
+                None
+            myprintbuffer.append(" ".join(["Creating link for base image",baseImageFName]))
+            os.symlink(os.path.abspath(bPath),bPathNew)
+            basehtml="<img src={} alt='base image' style='width:{}px;'>".format(''.join(['baseFile',baseImageFName[-4:]]),allshapes)
+
+        rPathNew = os.path.join(outputRoot,'refMask.png') #os.path.join(outputRoot,rBase)
+        mPathNew = os.path.join(outputRoot,''.join([mpfx,'File',maniImageFName[-4:]])) #os.path.join(outputRoot,mBase)
+        sPathNew = os.path.join(outputRoot,'sysMask.png') #os.path.join(outputRoot,sBase)
+
+        for mypath in [rPathNew,mPathNew,sPathNew]:
+            try:
+                os.remove(mypath)
+            except OSError:
+                None
+
+        #if color, create a symbolic link. Otherwise, create and save the refMask.png
+        if not self.usejpeg2000:
+            myprintbuffer.append(" ".join(["Creating link for reference mask", rImg_name]))
+            os.symlink(os.path.abspath(rImg_name),rPathNew)
+        else:
+            #create and save refMask.png.
+            if self.cache_dir: 
+                cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolor.png' % probeFileID))
+                acolor_in_cache = os.path.isfile(cache_acolor_path)
+                if acolor_in_cache:
+                    #generate sym link
+                    os.symlink(os.path.abspath(cache_acolor_path),rPathNew)
+                else:
+                    refMask = rImg.getAnimatedMask()
+                    write_apng(rPathNew,refMask,delay=600,use_palette=False)
+            else:
+                refMask = rImg.getAnimatedMask()
+                write_apng(rPathNew,refMask,delay=600,use_palette=False)
+            if self.cache_dir:
+                cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolor.png' % probeFileID))
+                if not acolor_in_cache:
+                    write_apng(cache_acolor_path,refMask,delay=600,use_palette=False)
+            
+        myprintbuffer.append(" ".join(["Creating link for manipulated image", maniImageFName]))
+        os.symlink(os.path.abspath(mPath),mPathNew)
+        myprintbuffer.append(" ".join(["Creating link for system output mask", sImg_name]))
+        os.symlink(os.path.abspath(sImg_name),sPathNew)
+
+        syspfx = ''
+        if self.sbin >= -1:
+            syspfx = 'Actual '
+
+        roc_curve = '<embed src=\"roc.pdf\" alt=\"roc curve\" width=\"{}\" height=\"{}\" type=\'application/pdf\'>'.format(plt_width,plt_width)
+        if self.roc_format == 'png':
+            roc_curve = '<img src=\"roc.png\" alt=\"roc curve\" style=\"width:{}px;\">'.format(plt_width)
+
+        myprintbuffer.append("Writing HTML...")
+        htmlstr = htmlstr.substitute({'probeName': maniImageFName,
+                                      'probeFname': "".join([mpfx,'File',maniImageFName[-4:]]),#mBase,
+                                      'width': allshapes,
+                                      'baseName': baseImageFName,
+                                      'basehtml': basehtml,#mBase,
+                                      'aggMask' : os.path.basename(aggImgName),
+                                      'refMask' : 'refMask.png',#rBase,
+                                      'sysMask' : 'sysMask.png',#sBase,
+                                      'binRefMask' : os.path.basename(rbin_name),
+                                      'binSysMask' : os.path.basename(sbin_name),
+                                      'systh' : sys_threshold,
+                                      'noScoreZone' : os.path.basename(weightFName),
+                                      'colorMask' : os.path.basename(colMaskName),
+                                      'met_table' : met_table,
+#  				      'nmm' : round(metrics['NMM'],3),
+#  				      'mcc' : round(metrics['MCC'],3),
+#  				      'bwL1' : round(metrics['BWL1'],3),
+#  				      'gwL1' : round(metrics['GWL1'],3),
+                                      'syspfx' : syspfx,
+                                      'totalPixels' : totalpx,
+                                      'conftable':conf_table,
+                                      'bns' : int(totalbns),
+                                      'sns' : int(totalsns),
+                                      'pns' : int(totalpns),
+                                      'tns' : int(totalns),
+                                      'bnscol':cols['bnscol'],
+                                      'snscol':cols['snscol'],
+                                      'pnscol':cols['pnscol'],
+                                      'bnshex':hexs[cols['bnscol']],
+                                      'snshex':hexs[cols['snscol']],
+                                      'pnshex':hexs[cols['pnscol']],
+                                      'percbns':percbns,
+                                      'percsns':percsns,
+                                      'percpns':percpns,
+                                      'perctns':perctns,
+                                      'jtable':jtable,
+                                      'th_table':thresString,
+                                      'roc_curve':roc_curve}) #add journal operations and set bg color to the html
+
+        #print htmlstr
+        fprefix=os.path.basename(maniImageFName)
+        fprefix=fprefix.split('.')[0]
+        fname=os.path.join(outputRoot,'.'.join([fprefix,'html']))
+        myhtml=open(fname,'w')
+        myhtml.write(htmlstr)
+        myprintbuffer.append("HTML page written.")
+        myhtml.close()
+
+    def gen_metrics_table(self,metrics,mets_for_some=['NMM','MCC','BWL1'],mets_for_all=['GWL1'],
+                          rename_dict={'NMM':'Nimble Mask Metric (NMM)',
+                                       'MCC':'Matthews Correlation Coefficient (MCC)',
+                                       'BWL1':'Binary Weighted L1 Loss (BWL1)',
+                                       'GWL1':'Grayscale Weighted L1 Loss (GWL1)'}):
+        """
+        *Description: this function generates the HTML string for the table of metrics and is not meant
+                      to be used otherwise
+
+        * Inputs:
+        *    metrics: values of the metrics to be scored
+        *    mets_for_some: list of metrics to evaluated that differ for different thresholds
+        *    mets_for_all: list of metrics that do not differ for different thresholds
+        *    rename_dict: dictionary of new names for metrics 
+
+        * Output
+        *    tablestring: the html string for the generated table
+        """
+        met_table = pd.DataFrame(index=mets_for_some,columns=['Optimum'])
+        
+        for met in mets_for_some:
+            metstr = "nan"
+            #round if numeric
+            if (not isinstance(metrics[met],str)) and not np.isnan(metrics[met]):
+                metstr = "{0:.3f}".format(metrics[met])
+
+            met_table.at[met,'Optimum'] = metstr
+            if self.sbin >= -1:
+                ametstr = "nan"
+                amet = 'Actual%s' % met
+                if not isinstance(metrics[amet],str):
+                    ametstr = "{0:.3f}".format(metrics[amet])
+                met_table.at[met,'Actual'] = ametstr
+
+        #rename indices
+        rename_keys = rename_dict.keys()
+        sub_rename_dict = {m:rename_dict[m] for m in mets_for_some if m in rename_keys}
+        met_table.rename(index=sub_rename_dict,inplace=True)
+
+        tablestring = met_table.to_html(index=True).replace("text-align: right;","text-align: center;")
+        otherrows = ''
+        colspan = 1
+        #make column span the row
+        if self.sbin >= -1:
+            colspan = 2
+        for met in mets_for_all:
+            #add into each row
+            if not isinstance(metrics[met],str) and not np.isnan(metrics[met]):
+                metstr = "{0:.3f}".format(metrics[met])
+            otherrows = '\n'.join([otherrows,"<tr><th>{}</th><td colspan={}>{}</td></tr>".format(rename_dict[met],colspan,metstr)])
+        #tack onto end of met_table.rename
+        tablestring = (tablestring.replace("</tbody>","".join([otherrows,"</tbody>"]))
+                                  .replace("<th></th>","<th>Localization Metrics</th>")
+                                  .replace("<th>","<th align='left'>")
+                                  .replace("<tr>","<tr align='right'>"))
+        
+        
+        return tablestring
+
+    def gen_confusion_table(self,conf_metrics,mets_for_some=['TP','FP','TN','FN'],mets_for_all=[],
+                          rename_dict={'TP':'True Postives (TP: green)',
+                                       'FP':'False Postives (FP: red)',
+                                       'TN':'True Negatives (TN: white)',
+                                       'FN':'False Negatives (FN: blue)'}):
+        """
+        *Description: this function generates the HTML string for the table of confusion measures (TP, TN, FP, and FN)
+                      and is not meant to be used otherwise
+        """
+        met_table = pd.DataFrame(index=mets_for_some,columns=['OptimumPixelCount','OptimumProportion'])
+        totalpx = conf_metrics['TotalPixels']
+        for met in mets_for_some:
+            metstr = "nan"
+            #generate Pixel count and Proportion separation
+            optcol = 'OptimumPixel%s' % met
+            met_table.at[met,'OptimumPixelCount'] = conf_metrics[optcol]
+
+            #round if numeric
+            if totalpx > 0:
+                metstr = "{0:.3f}".format(float(conf_metrics[optcol])/totalpx)
+            met_table.at[met,'OptimumProportion'] = metstr
+
+            #do the same for Actual metrics
+            if self.sbin >= -1:
+                ametstr = "nan"
+                optcol = 'ActualPixel%s' % met
+                met_table.at[met,'ActualPixelCount'] = conf_metrics[optcol]
+
+                if totalpx > 0:
+                    ametstr = "{0:.3f}".format(float(conf_metrics[optcol])/totalpx)
+                met_table.at[met,'ActualProportion'] = ametstr
+
+        #rename indices
+        rename_keys = rename_dict.keys()
+        sub_rename_dict = {m:rename_dict[m] for m in mets_for_some if m in rename_keys}
+        met_table.rename(index=sub_rename_dict,inplace=True)
+        cols = ['OptimumPixelCount','OptimumProportion']
+        met_table.OptimumPixelCount = met_table.OptimumPixelCount.astype(int)
+        if self.sbin >= -1:
+            cols.extend(['ActualPixelCount','ActualProportion'])
+            met_table.ActualPixelCount = met_table.ActualPixelCount.astype(int)
+
+        met_table = met_table[cols]
+
+        tablestring = met_table.to_html(index=True).replace("text-align: right;","text-align: center;")
+        otherrows = ''
+        for met in mets_for_all:
+            #add into each row
+            if not isinstance(conf_metrics[met],str):
+                metstr = "{0:.3f}".format(metrics[met])
+            otherrows = '\n'.join([otherrows,"<tr><th>{}</th><td>{}</td></tr>".format(rename_dict[met],metstr)])
+        #tack onto end of met_table.rename
+        tablestring = (tablestring.replace("</tbody>","".join([otherrows,"</tbody>"]))
+                                  .replace("<th></th>","<th>Confuson Measures</th>")
+                                  .replace("<th>","<th align='left'>")
+                                  .replace("<tr>","<tr align='right'>")
+                                  .replace('<table border="1" class="dataframe">','<table border="1" class="dataframe" bgcolor="#C8C8C8">'))
+
+        return tablestring
+
+    #prints out the aggregate mask, reference and other data
+    def aggregateColorMask(self,ref,sysbw,sysMaskName,bns,sns,pns,kern,erodeKernSize,probeFileID,maniImgName,outputMaskPath):
+        """
+        *Description: this function produces the aggregate mask image of the ground truth, system output,
+                      and no-score regions for the HTML report, and a composite of the same image superimposed
+                      on a grayscale of the reference image
+
+        * Inputs:
+        *     ref: the reference mask file
+        *     sysbw: the binarized system output mask to be evaluated
+        *     sysMaskName: the name of the system output mask file
+        *     bns: the boundary no-score weighted matrix
+        *     sns: the selected no-score weighted matrix
+        *     kern: kernel shape to be used
+        *     erodeKernSize: length of the erosion kernel matrix
+        *     probeFileID: the ID of the image to be considered
+        *     maniImgName: a list of reference probe images (not masks) for superimposition
+        *     outputMaskPath: the directory in which to output the composite images
+       
+        * Output
+        *     a dictionary containing the colored mask path and the aggregate mask path
+        """
+
+        #set new image as some RGB
+        mydims = ref.get_dims()
+        mycolor = 255*np.ones([mydims[0],mydims[1],3],dtype=np.uint8)
+
+        eData = masks.dilate(ref.bwmat,kern,erodeKernSize)
+
+        #flip all because black is 0 by default. Use the regions to determine where to color.
+#        b_sImg = 1-sysmask.bwmat/255
+#        b_eImg = 1-eData/255 #erosion of black/white reference mask
+#        b_bnsImg = 1-bns
+#        b_snsImg = 1-sns
+#        b_pnsImg = 1-pns
+        _,b_sImg = cv2.threshold(sysbw,0,1,cv2.THRESH_BINARY_INV)
+        _,b_eImg = cv2.threshold(eData,0,2,cv2.THRESH_BINARY_INV)
+        _,b_bnsImg = cv2.threshold(bns,0,4,cv2.THRESH_BINARY_INV)
+        _,b_snsImg = cv2.threshold(sns,0,8,cv2.THRESH_BINARY_INV)
+        mImg = b_sImg + b_eImg + b_bnsImg + b_snsImg
+        if pns is not 0:
+            b_pnsImg = 0
+        else:
+            _,b_pnsImg = cv2.threshold(pns,0,16,cv2.THRESH_BINARY_INV)
+            mImg = mImg + b_pnsImg
+            
+#        b_sImg[b_sImg != 0] = 1
+#        b_eImg[b_eImg != 0] = 2
+#        b_bnsImg[b_bnsImg != 0] = 4
+#        b_snsImg[b_snsImg != 0] = 8
+#        if b_pnsImg is not 1:
+#            b_pnsImg[b_pnsImg != 0] = 16
+#        else:
+#            b_pnsImg = 0
+
+
+        #set pixels equal to some value:
+        #red to false accept and false reject
+        #blue to no-score zone
+        #pink to no-score zone that intersects with system mask
+        #yellow to system mask intersect with GT
+        #black to true negatives
+
+        #get colors through colordict
+        colordict = self.colordict
+        mycolor[mImg==1] = colordict['red'] #only system (FP)
+        mycolor[mImg==2] = colordict['blue'] #only erode image (FN) (the part that is scored)
+        mycolor[mImg==3] = colordict['green'] #system and erode image coincide (TP)
+        mycolor[(mImg>=4) & (mImg <=7)] = colordict['yellow'] #boundary no-score zone
+        mycolor[(mImg>=8) & (mImg <=15)] = colordict['pink'] #selection no-score zone
+        mycolor[mImg>=16] = colordict['purple'] #system opt out
+
+        #return path to mask
+        path,compositePath = colorMaskNames(sysMaskName,outputMaskPath,self.usejpeg2000)
+        #write the aggregate mask to file
+        cv2.imwrite(path,mycolor)
+
+        #also aggregate over the grayscale maniImgName for direct comparison
+        #save as animated png if not using color.
+        maniImg = masks.mask(maniImgName)
+        mData = maniImg.matrix
+#        myagg = np.zeros((mydims[0],mydims[1],3),dtype=np.uint8)
+        m3chan = np.stack((mData,mData,mData),axis=2)
+        #np.reshape(np.kron(mData,np.uint8([1,1,1])),(mData.shape[0],mData.shape[1],3))
+        refbw = ref.bwmat
+#        myagg[refbw==255]=m3chan[refbw==255]
+        myagg = np.copy(m3chan)
+
+        #for modified images, weighted sum the colored mask with the grayscale
+        #np.kron(mData,np.uint8([1,1,1]))
+        #mData.shape=(mydims[0],mydims[1],3)
+        #things change here for pixel overlay
+        #NOTE: try/catch the overlay error. Print out the shapes of all involved items.
+        alpha=0.7
+        try:
+            refmat = ref.matrix
+            if not self.usejpeg2000:
+                modified = cv2.addWeighted(refmat,alpha,m3chan,1-alpha,0)
+                myagg[refbw==0] = modified[refbw==0]
+                cv2.imwrite(compositePath,myagg)
+            else:
+                if self.cache_dir:
+                    cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolorpart.npy' % probeFileID))
+                    if os.path.isfile(cache_acolor_path):
+                        #get this animated mask saved in and read from the cache
+                        aseq = np.load(cache_acolor_path)
+                    else:
+                        aseq = ref.getAnimatedMask('partial')
+                else:
+                    aseq = ref.getAnimatedMask('partial')
+                seq = []
+                for frame in aseq:
+                    #join the frame with the grayscale manipulated image
+                    refmat = frame
+                    modified = cv2.addWeighted(frame,alpha,m3chan,1-alpha,0)
+                    layermask = (frame[:,:,0] != 255) | (frame[:,:,1] != 255) | (frame[:,:,2] != 255)
+                    aggfr = np.copy(m3chan)
+                    #overlay colors with particular manipulated regions
+                    aggfr[layermask] = modified[layermask]
+                    seq.append(aggfr)
+                write_apng(compositePath,seq,delay=600,use_palette=False)
+                if self.cache_dir:
+                    cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolorpart.npy' % probeFileID))
+                    if not os.path.isfile(cache_acolor_path):
+                        np.save(cache_acolor_path,aseq)
+        except:
+            exc_type,exc_obj,exc_tb = sys.exc_info()
+            print("Exception {} encountered at line {} during mask overlay. Reference mask shape: {}. Probe image shape: {}".format(exc_type,exc_tb.tb_lineno,refmat.shape,m3chan.shape))
+            return {'mask':path,'agg':''}
+
+        return {'mask':path,'agg':compositePath}
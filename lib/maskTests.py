@@ -44,6 +44,19 @@ from constants import *
 #    except:
 #        png_compress_const=16
 
+def synthetic_refmask(mat,bitplanes=0):
+    #a bit-plane reference mask held in memory, as refmask would read it from a file
+    rImg = masks.refmask.__new__(masks.refmask)
+    rImg.name = 'synthetic_ref'
+    rImg.matrix = mat
+    rImg.is_multi_layer = mat.ndim == 3
+    rImg.bwmat = 0
+    rImg.bitplanes = bitplanes
+    rImg.journalData = 0
+    rImg.plane_masks_of = None
+    rImg.summary_of = None
+    return rImg
+
 class TestImageMethods(ut.TestCase):
     def test_bw(self):
         #Set existing image. Safer test.
@@ -795,5 +808,266 @@ class TestImageMethods(ut.TestCase):
 
         print("CASE 5 testing complete.")
 
+    def test_confusion_engines(self):
+        #the confusion measures counted from the histograms of each engine should equal those computed at each threshold
+        np.random.seed(1998)
+        params=[png_compress_const,0]
+        refimg = 255*np.ones((100,100),dtype=np.uint8)
+        refimg[21:61,31:71] = 0
+        cv2.imwrite('testRefConf.png',refimg,params)
+        rImg = masks.refmask_color('testRefConf.png',readopt=0)
+        rImg.binarize(254)
+
+        #no-score pixels around the boundary and in a separate region
+        wts = rImg.boundaryNoScoreRegion(3,3,'box')['wimg'].astype(np.uint8)
+        wts[80:90,10:30] = 0
+
+        sysimg = np.random.randint(0,256,(100,100)).astype(np.uint8)
+        sysimg[21:61,31:71] = np.random.randint(0,60,(40,40))
+        cv2.imwrite('testSysConf.png',sysimg,params)
+        cv2.imwrite('testSysConfWhite.png',255*np.ones((100,100),dtype=np.uint8),params)
+        sysmasks = [masks.mask('testSysConf.png'),masks.mask('testSysConfWhite.png')]
+
+        sbin_list = [-1,0,27,59,128,254,255]
+        thresholds = list(range(-1,256)) + [-10]
+
+        def assertConfEqual(conf,oldconf):
+            for mes in ['TP','TN','FP','FN','N']:
+                self.assertEqual(conf[mes],oldconf[mes])
+
+        for sImg in sysmasks:
+            for w in [np.ones((100,100),dtype=np.uint8),wts]:
+                metobj = mm.maskMetrics(rImg,sImg,w)
+                h_bincount = metobj.confusion_histograms_bincount(rImg,sImg,w)
+                h_bincount_strips = metobj.confusion_histograms_bincount(rImg,sImg,w,block_size=700)
+                h_unique = metobj.confusion_histograms_unique(rImg,sImg,w)
+                self.assertTrue(np.array_equal(h_bincount,h_unique))
+                self.assertTrue(np.array_equal(h_bincount_strips,h_unique))
+                self.assertEqual(h_bincount[0].sum(),np.sum(w==0))
+
+                for th in thresholds:
+                    assertConfEqual(metobj.confusion_measures_histograms(h_bincount,th),metobj.confusion_measures(rImg,sImg,w,th))
+
+                #the thresholds of --sbinList are looked up in the table of all thresholds
+                for engine in ['bincount','unique']:
+                    metobj.engine = engine
+                    thresMets = metobj.confusion_mets_all_thresholds(rImg,sImg,w)
+                    for th in sbin_list:
+                        assertConfEqual(metobj.confusion_measures_table(thresMets,th),metobj.confusion_measures(rImg,sImg,w,th))
+
+        #constant system output masks are counted without reading their pixels
+        for value in [0,100,255]:
+            sImg = masks.constmask('testSysConst.png',(100,100),value)
+            sImg_full = masks.mask('testSysConfWhite.png')
+            sImg_full.matrix = value*np.ones((100,100),dtype=np.uint8)
+            for w in [np.ones((100,100),dtype=np.uint8),wts]:
+                metobj = mm.maskMetrics(rImg,sImg,w)
+                h_const = metobj.confusion_histograms_const(rImg,sImg,w)
+                self.assertTrue(np.array_equal(h_const,metobj.confusion_histograms(rImg,sImg,w)))
+                self.assertTrue(np.array_equal(h_const,metobj.confusion_histograms_bincount(rImg,sImg_full,w)))
+                for th in thresholds:
+                    assertConfEqual(metobj.confusion_measures_histograms(h_const,th),metobj.confusion_measures(rImg,sImg_full,w,th))
+                thresMets = metobj.confusion_mets_all_thresholds(rImg,sImg,w)
+                for th in sbin_list:
+                    assertConfEqual(metobj.confusion_measures_table(thresMets,th),metobj.confusion_measures(rImg,sImg_full,w,th))
+
+        for f in ['testRefConf.png','testSysConf.png','testSysConfWhite.png']:
+            os.remove(f)
+
+    def test_morph(self):
+        #the decomposed and region-wise erosions and dilations should equal those by the whole kernel
+        np.random.seed(1998)
+        graymat = np.random.randint(0,256,(120,140)).astype(np.uint8)
+        regionmat = np.zeros((120,140),dtype=np.uint8)
+        regionmat[10:30,15:40] = 1
+        regionmat[70:75,90:130] = 1
+        regionmat[100:101,5:6] = 1
+        boxes = masks.region_boxes(regionmat)
+        invboxes = masks.region_boxes(regionmat == 0)
+
+        for kernel in ['box','disc','diamond','gaussian','line']:
+            for size in range(9,32,2):
+                kern = masks.getKern(kernel,size)
+                self.assertTrue(np.array_equal(masks.erode(graymat,kernel,size),cv2.erode(graymat,kern,iterations=1)))
+                self.assertTrue(np.array_equal(masks.dilate(graymat,kernel,size),cv2.dilate(graymat,kern,iterations=1)))
+                self.assertTrue(np.array_equal(masks.erode_roi(regionmat,kernel,size,boxes,0),cv2.erode(regionmat,kern,iterations=1)))
+                self.assertTrue(np.array_equal(masks.dilate_roi(regionmat,kernel,size,boxes,0),cv2.dilate(regionmat,kern,iterations=1)))
+                self.assertTrue(np.array_equal(masks.erode_roi(1 - regionmat,kernel,size,invboxes,1),cv2.erode(1 - regionmat,kern,iterations=1)))
+
+        #even kernel sizes are rejected, whether decomposed or not
+        for size in [4,10,16]:
+            with self.assertRaises(SystemExit):
+                masks.erode(graymat,'box',size)
+
+    def test_bitplanes(self):
+        #the bit planes decomposed over all layers at once should match those decomposed one layer at a time
+        np.random.seed(1998)
+        def loop_bitstack(bitplanes,n_layers):
+            stack = np.zeros((n_layers,),dtype=np.uint8)
+            for b in bitplanes:
+                layer = (int(b) - 1)//8
+                stack[layer] = stack[layer] + (1 << (int(b) - 1 - 8*layer))
+            return stack
+
+        #three layers of regions made of one to three bit planes each, overlapping across layers
+        mat = np.zeros((60,80,3),dtype=np.uint8)
+        for b in [1,2,5,8,9,12,16,20,24]:
+            r,c = np.random.randint(0,45),np.random.randint(0,65)
+            layer = (b - 1)//8
+            mat[r:r + 15,c:c + 15,layer] |= 1 << (b - 1 - 8*layer)
+        mat[50:60,0:10,0] = 7
+
+        for bitplanes in [0,[1],[8,9],[3,12,24],[2,5,16,20],[4],list(range(1,25))]:
+            for m in [mat,mat[:,:,0]]:
+                rImg = synthetic_refmask(m,bitplanes)
+                layers = m if m.ndim == 3 else m[:,:,np.newaxis]
+                n_layers = layers.shape[2]
+                if bitplanes is 0:
+                    stack = 255*np.ones((n_layers,),dtype=np.uint8)
+                else:
+                    inlayers = [b for b in bitplanes if b <= 8*n_layers]
+                    stack = loop_bitstack(inlayers,n_layers)
+                    self.assertTrue(np.array_equal(masks.layer_bitstack(bitplanes,n_layers),stack))
+
+                selected = np.zeros(m.shape[:2],dtype=np.uint8)
+                unselected = np.zeros(m.shape[:2],dtype=np.uint8)
+                regions = np.zeros(m.shape[:2],dtype=np.uint8)
+                summary = np.zeros((n_layers,),dtype=np.uint8)
+                for l in range(n_layers):
+                    _,pixels = cv2.threshold(layers[:,:,l] & stack[l],0,1,cv2.THRESH_BINARY)
+                    selected = selected | pixels
+                    _,pixels = cv2.threshold(layers[:,:,l] & ~stack[l],0,1,cv2.THRESH_BINARY)
+                    unselected = unselected | pixels
+                    _,pixels = cv2.threshold(layers[:,:,l],0,1,cv2.THRESH_BINARY)
+                    regions = regions | pixels
+                    for v in np.unique(layers[:,:,l]):
+                        summary[l] = summary[l] | v
+
+                planes = rImg.planeMasks()
+                self.assertTrue(np.array_equal(planes['selected'],selected))
+                self.assertTrue(np.array_equal(planes['unselected'],unselected))
+                self.assertTrue(np.array_equal(planes['regions'],regions))
+                self.assertTrue(np.array_equal(rImg.regionSummary(),summary))
+                self.assertEqual(rImg.regionIsPresent(),bool(selected.any()))
+
+                #the decomposition is recomputed for a new matrix, such as a strip of the mask
+                rImg.matrix = m[:10]
+                self.assertTrue(np.array_equal(rImg.planeMasks()['selected'],selected[:10]))
+                self.assertTrue(np.array_equal(rImg.regionSummary() & summary,rImg.regionSummary()))
+
+    def test_region_presence(self):
+        #the checks for a region against the mask summary, and the no-score zones returned at once for masks
+        #without a region to score, should match the full computation
+        def full_boundary(rImg):
+            full = synthetic_refmask(rImg.matrix,rImg.bitplanes)
+            full.regionIsPresent = lambda: True
+            return full.boundaryNoScoreRegion(15,11,'box'),full.bwmat
+
+        def full_unselected(rImg):
+            planes = rImg.planeMasks()
+            eImg = masks.erode_roi(planes['selected'],'box',15,masks.region_boxes(planes['selected']),0)
+            dImg = 1 - masks.dilate_roi(planes['unselected'],'box',11,masks.region_boxes(planes['unselected']),0)
+            return (dImg | eImg).astype(np.uint8)
+
+        empty = np.zeros((50,70,3),dtype=np.uint8)
+        #only bit plane 11 is set
+        single = np.zeros((50,70,3),dtype=np.uint8)
+        single[10:30,20:45,1] = 1 << 2
+        for mat,bitplanes,present in [(empty,0,False),(empty,[11],False),(empty[:,:,0],0,False),
+                                      (single,0,True),(single,[11],True),(single,[3],False),(single,[3,11],True)]:
+            rImg = synthetic_refmask(mat,bitplanes)
+            self.assertEqual(rImg.regionIsPresent(),present)
+            self.assertEqual(rImg.regionIsPresent(),bool(rImg.planeMasks()['selected'].any()))
+
+            nsr = rImg.boundaryNoScoreRegion(15,11,'box')
+            full_nsr,full_bwmat = full_boundary(rImg)
+            for img in ['wimg','eimg','dimg']:
+                self.assertTrue(np.array_equal(nsr[img],full_nsr[img]))
+            self.assertTrue(np.array_equal(rImg.bwmat,full_bwmat))
+            if bitplanes is not 0:
+                self.assertTrue(np.array_equal(rImg.unselectedNoScoreRegion(15,11,'box'),full_unselected(rImg)))
+
+        #a color reference mask is checked against the set of its colors, one color at a time
+        params=[png_compress_const,0]
+        colorimg = 255*np.ones((50,70,3),dtype=np.uint8)
+        colorimg[10:30,20:45] = [0,0,255]
+        cv2.imwrite('testImgRegion.png',colorimg,params)
+        rImg = masks.refmask_color('testImgRegion.png')
+        for aggcolors in [[0],[255],[255*65536],[0,255]]:
+            rImg.aggcolors = aggcolors
+            present = any([(rImg.aggmat == c).sum() > 0 for c in aggcolors])
+            self.assertEqual(rImg.regionIsPresent(),present)
+        os.remove('testImgRegion.png')
+
+    def test_noScoreCache(self):
+        #the stored no-score matrices should come back unchanged, including all-zero ones
+        import shutil
+        import tempfile
+        from noScoreCache import noScoreCache
+        cache_dir = tempfile.mkdtemp()
+        cache = noScoreCache(cache_dir)
+        wimg = np.ones((20,30),dtype=np.uint8)
+        wimg[5:10,5:10] = 0
+        eimg = 255*np.ones((20,30),dtype=np.uint8)
+        zimg = np.zeros((20,30),dtype=np.uint8)
+        self.assertTrue(cache.put('entry',wimg=wimg,eimg=eimg,zimg=zimg))
+        mats = cache.get('entry')
+        for n,m in [('wimg',wimg),('eimg',eimg),('zimg',zimg)]:
+            self.assertEqual(mats[n].dtype,m.dtype)
+            self.assertTrue(np.array_equal(mats[n],m))
+
+        #matrices of more than one nonzero value are not stored
+        self.assertFalse(cache.put('multi',m=np.array([[0,1],[2,0]],dtype=np.uint8)))
+        self.assertTrue(cache.get('multi') is None)
+        shutil.rmtree(cache_dir)
+
+        #a bounded cache should stay within its bound, keep the latest entry, and not scan its directory on every write
+        cache_dir = tempfile.mkdtemp()
+        np.random.seed(1998)
+        mats = [(np.random.uniform(0,1,(100,100)) > 0.5).astype(np.uint8) for i in range(20)]
+        cache = noScoreCache(cache_dir)
+        cache.put('size',wimg=mats[0])
+        entry_size = os.path.getsize(cache.entry_path('size'))
+        os.remove(cache.entry_path('size'))
+        cache = noScoreCache(cache_dir,int(4.5*entry_size))
+        n_scans = [0]
+        list_entries = cache.list_entries
+        def counted_list_entries():
+            n_scans[0] += 1
+            return list_entries()
+        cache.list_entries = counted_list_entries
+        for i,m in enumerate(mats):
+            cache.put('entry%d' % i,wimg=m)
+            self.assertTrue(sum([e[1] for e in list_entries()]) <= cache.max_size)
+            self.assertTrue(np.array_equal(cache.get('entry%d' % i)['wimg'],m))
+        self.assertTrue(0 < n_scans[0] < len(mats)/2)
+        shutil.rmtree(cache_dir)
+
+    def test_roc_plotter(self):
+        #the reused ROC figure should plot each curve as plotROC does, without a display
+        import shutil
+        import tempfile
+        from maskMetricsRender import detPackage,plotROC,getRocPlotter
+        out_dir = tempfile.mkdtemp()
+        np.random.seed(1998)
+        for i in range(5):
+            fpr = np.append(0,np.sort(np.random.uniform(0,1,20)))
+            tpr = np.append(0,np.sort(np.random.uniform(0,1,20)))
+            fpr[-1],tpr[-1] = 1,1
+            mydets = detPackage(tpr,fpr,1,0,0.5 + i/10.,100*i,1000)
+            myroc = plotROC(mydets,'roc_ref_%d' % i,'Probe %d' % i,out_dir)
+            for roc_format in ['pdf','png']:
+                plotter = getRocPlotter(roc_format)
+                path = plotter.plot(fpr,tpr,mydets.auc,mydets.t_num,mydets.nt_num,'Probe %d' % i,out_dir,'roc_%d' % i)
+                self.assertTrue(os.path.isfile(path))
+                ref_ax = myroc.axes[0]
+                ax = plotter.fig.axes[0]
+                self.assertTrue(np.array_equal(ref_ax.lines[0].get_xdata(),ax.lines[0].get_xdata()))
+                self.assertTrue(np.array_equal(ref_ax.lines[0].get_ydata(),ax.lines[0].get_ydata()))
+                self.assertEqual(ref_ax.texts[0].get_text(),ax.texts[0].get_text())
+                self.assertEqual(myroc.texts[0].get_text(),plotter.fig.texts[0].get_text())
+        self.assertTrue(os.path.isfile(os.path.join(out_dir,'roc_ref_0.pdf')))
+        shutil.rmtree(out_dir)
+
 #if __name__ == '__main__':
 #    ut.main()
@@ -23,7 +23,6 @@
  reliability, or any other characteristic."
 """
 import cv2
-import rawpy
 import math
 import copy
 import numpy as np
@@ -31,12 +30,11 @@ import pandas as pd
 import sys
 import os
 import random
-import glymur
-from scipy import misc
 from decimal import Decimal
 lib_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(lib_path)
 from constants import *
+import maskIO
 
 debug_mode=False
 printq = lambda *a:None
@@ -45,9 +43,12 @@ if debug_mode:
         print(string)
 
 #returns a kernel matrix
+#kernels by shape and size. They are shared, and must not be modified
+kern_cache = {}
+
 def getKern(kernopt,size):
     """
-    * Description: gets the kernel to perform erosion and/or dilation
+    * Description: gets the kernel to perform erosion and/or dilation. Kernels are built once per shape and size
     * Input:
     *     kernopt: the shape of the kernel to be generated. Can be one of the following:
                    'box','disc','diamond','gaussian','line'
@@ -61,49 +62,209 @@ def getKern(kernopt,size):
     if (size % 2 == 0):
         print('ERROR: One of your kernel sizes is not an odd integer.')
         exit(1)
-    kern = 0
     kernopt=kernopt.lower()
+    key = (kernopt,size)
+    if key in kern_cache:
+        return kern_cache[key]
+
+    kern = 0
     if kernopt=='box':
         kern=cv2.getStructuringElement(cv2.MORPH_RECT,(size,size))
     elif kernopt=='disc':
         kern=cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(size,size))
     elif kernopt=='diamond':
-        #build own kernel out of numpy ndarray
-        kern=np.ones((size,size),dtype=np.uint8)
-        center=(size-1)/2
-        #TODO: find more efficient implementation
-        for idx,x in np.ndenumerate(kern):
-            if abs(idx[0]-center) + abs(idx[1]-center) > center:
-                kern[idx]=0
+        center=(size-1)//2
+        dist=np.abs(np.arange(size) - center)
+        kern=np.uint8(dist[:,np.newaxis] + dist[np.newaxis,:] <= center)
     elif kernopt=='gaussian':
         sigma=0.3 #as used in the R implementation
-        center=(size-1)/2
-        x=np.asmatrix(np.linspace(-center,center,size))
-        x=np.dot(x.transpose(),np.asmatrix(np.ones(size)))
-        xsq=np.square(x)
-        z=np.exp(-(xsq+xsq.transpose())/(2*sigma**2))
+        center=(size-1)/2.
+        xsq=np.square(np.linspace(-center,center,size))
+        z=np.exp(-(xsq[:,np.newaxis] + xsq[np.newaxis,:])/(2*sigma**2))
         kern=z/np.sum(z) #final normalization
-        kern[kern > 0] = 1
-        kern = np.uint8(kern)
+        kern=np.uint8(kern > 0)
     elif kernopt=='line':
         #45 degree line, or identity matrix
         kern=np.eye(size,dtype=np.uint8)
     else:
         print("The kernel '{}' is not recognized. Please enter a valid kernel from the following: ['box','disc','diamond','gaussian','line'].".format(kernopt))
+        return kern
+    kern_cache[key] = kern
     return kern
 
-#define erode and dilate functions here.
-def erode(matrix,kernel,kernsize):
+#kernels at least this long are decomposed where their shape permits
+decompose_min_size = 9
+
+def segmentKerns(radius,direction):
+    """
+    * Description: decomposes a segment of pixels into 3-pixel kernels. The segment of the given radius
+                   along a direction is the set of pixels reached by successive steps of 1, 2, 4, ... pixels
+                   and a remainder, each taken forward, backward, or not at all
+    * Inputs:
+    *     radius: the number of pixels the segment reaches on either side of its center
+    *     direction: the (row,column) direction of the segment, e.g. (0,1) for a row or (1,1) for a diagonal
+    * Output:
+    *     the list of kernels, each holding the center pixel and the two pixels a step away from it
+    """
+    steps = []
+    s = 1
+    while 2*s - 1 <= radius:
+        steps.append(s)
+        s *= 2
+    if radius > sum(steps):
+        steps.append(radius - sum(steps))
+
+    kerns = []
+    dy,dx = direction
+    for s in steps:
+        kern = np.zeros((2*s*abs(dy) + 1,2*s*abs(dx) + 1),dtype=np.uint8)
+        cy,cx = s*abs(dy),s*abs(dx)
+        kern[cy,cx] = 1
+        kern[cy + s*dy,cx + s*dx] = 1
+        kern[cy - s*dy,cx - s*dx] = 1
+        kerns.append(kern)
+    return kerns
+
+def decomposeKern(kernopt,size):
+    """
+    * Description: decomposes a kernel into sequences of small kernels whose successive erosions (dilations),
+                   the minimum (maximum) taken over the sequences, erode (dilate) by the whole kernel.
+                   Each small kernel holds three pixels, so the cost per pixel grows with the logarithm of the
+                   kernel size rather than its area
+    * Inputs:
+    *     kernopt: the shape of the kernel
+    *     size: the length of the kernel
+    * Output:
+    *     a list of the sequences of kernels, or None if the kernel is not decomposed
+    """
+    kernopt = kernopt.lower()
+    if (size < decompose_min_size) or (kernopt not in ['box','line','diamond']):
+        return None
+    key = ('decomposed',kernopt,size)
+    if key in kern_cache:
+        return kern_cache[key]
+
+    r = size//2
+    if kernopt == 'box':
+        branches = [segmentKerns(r,(0,1)) + segmentKerns(r,(1,0))]
+    elif kernopt == 'line':
+        branches = [segmentKerns(r,(1,1))]
+    elif kernopt == 'diamond':
+        #the two diagonals together reach the pixels of the diamond an even distance away,
+        #and a cross one pixel further reaches the rest
+        cross = cv2.getStructuringElement(cv2.MORPH_CROSS,(3,3))
+        a = r//2
+        if r % 2 == 1:
+            branches = [segmentKerns(a,(1,1)) + segmentKerns(a,(1,-1)) + [cross]]
+        else:
+            branches = [segmentKerns(a,(1,1)) + segmentKerns(a,(1,-1)),
+                        segmentKerns(a - 1,(1,1)) + segmentKerns(a - 1,(1,-1)) + [cross]]
+    kern_cache[key] = branches
+    return branches
+
+def morph(op,matrix,kernel,kernsize):
+    """
+    * Description: erodes or dilates a matrix. Long box, line, and diamond kernels are applied through their
+                   decomposition, on the matrix padded with the value that leaves the result unchanged, so that
+                   the result is identical to that of the whole kernel
+    * Inputs:
+    *     op: 'erode' or 'dilate'
+    *     matrix: the matrix to process
+    *     kernel: the shape of the kernel
+    *     kernsize: the length of the kernel
+    * Output:
+    *     the processed matrix
+    """
     if kernsize == 0:
         return matrix
-    kern=getKern(kernel,kernsize)
-    return cv2.erode(matrix,kern,iterations=1)
+    if kernsize % 2 == 0:
+        print('ERROR: One of your kernel sizes is not an odd integer.')
+        exit(1)
+    cvop = cv2.erode
+    combine = np.minimum
+    if op == 'dilate':
+        cvop = cv2.dilate
+        combine = np.maximum
+
+    branches = decomposeKern(kernel,kernsize)
+    if (branches is None) or not np.issubdtype(matrix.dtype,np.integer):
+        return cvop(matrix,getKern(kernel,kernsize),iterations=1)
+
+    r = kernsize//2
+    neutral = np.iinfo(matrix.dtype).max if op == 'erode' else np.iinfo(matrix.dtype).min
+    padded = cv2.copyMakeBorder(matrix,r,r,r,r,cv2.BORDER_CONSTANT,value=int(neutral))
+    result = None
+    for branch in branches:
+        part = padded
+        for k in branch:
+            part = cvop(part,k,iterations=1)
+        if result is None:
+            result = part
+        else:
+            result = combine(result,part)
+    return result[r:-r,r:-r]
+
+#define erode and dilate functions here.
+def erode(matrix,kernel,kernsize):
+    return morph('erode',matrix,kernel,kernsize)
 
 def dilate(matrix,kernel,kernsize):
+    return morph('dilate',matrix,kernel,kernsize)
+
+def region_boxes(regions):
+    """
+    * Description: gets the bounding boxes of the connected regions of a mask
+    * Input:
+    *     regions: a matrix, nonzero in the regions
+    * Output:
+    *     a list of the (x,y,width,height) bounding boxes of the regions
+    """
+    n,_,stats,_ = cv2.connectedComponentsWithStats(np.uint8(regions != 0),connectivity=8)
+    return [tuple(int(v) for v in stats[i,:4]) for i in range(1,n)]
+
+def morph_roi(op,matrix,kernel,kernsize,boxes,background):
+    """
+    * Description: erodes or dilates a matrix only around its regions. Away from the regions, every pixel
+                   the kernel reaches is background, and so is its result. Each region is processed in its
+                   bounding box padded by twice the kernel radius, and only the part within one radius, whose
+                   neighborhood lies wholly in the padded box, is kept. The result is identical to that of
+                   processing the whole matrix
+    * Inputs:
+    *     op: 'erode' or 'dilate'
+    *     matrix: the matrix to process
+    *     kernel: the shape of the kernel
+    *     kernsize: the length of the kernel
+    *     boxes: the bounding boxes of the regions of the matrix, from region_boxes
+    *     background: the value of the matrix outside of the regions
+    * Output:
+    *     the processed matrix
+    """
     if kernsize == 0:
         return matrix
-    kern=getKern(kernel,kernsize)
-    return cv2.dilate(matrix,kern,iterations=1)
+    r = kernsize//2
+    dims = matrix.shape
+    rois = []
+    roi_area = 0
+    for x,y,w,h in boxes:
+        inner = (max(y - r,0),min(y + h + r,dims[0]),max(x - r,0),min(x + w + r,dims[1]))
+        outer = (max(y - 2*r,0),min(y + h + 2*r,dims[0]),max(x - 2*r,0),min(x + w + 2*r,dims[1]))
+        rois.append((inner,outer))
+        roi_area += (outer[1] - outer[0])*(outer[3] - outer[2])
+    if roi_area >= matrix.size//2:
+        #the regions cover enough of the matrix that processing it whole is cheaper
+        return morph(op,matrix,kernel,kernsize)
+
+    result = np.full_like(matrix,background)
+    for inner,outer in rois:
+        part = morph(op,matrix[outer[0]:outer[1],outer[2]:outer[3]],kernel,kernsize)
+        result[inner[0]:inner[1],inner[2]:inner[3]] = part[inner[0] - outer[0]:inner[1] - outer[0],inner[2] - outer[2]:inner[3] - outer[2]]
+    return result
+
+def erode_roi(matrix,kernel,kernsize,boxes,background):
+    return morph_roi('erode',matrix,kernel,kernsize,boxes,background)
+
+def dilate_roi(matrix,kernel,kernsize,boxes,background):
+    return morph_roi('dilate',matrix,kernel,kernsize,boxes,background)
 
 def count_bits(n):
     """
@@ -141,6 +302,21 @@ def count_bits(n):
 #            c = c + 1
     return c
 
+def layer_bitstack(bitplanes,n_layers):
+    """
+    * Description: packs a list of bit planes into one 8-bit mask per layer of a reference mask
+    * Inputs:
+    *     bitplanes: the bit planes, counted from 1
+    *     n_layers: the number of 8-bit layers in the reference mask
+    * Output:
+    *     stack: an array of n_layers 8-bit masks, the bits of each layer set for the bit planes in it
+    """
+    stack = np.zeros((n_layers,),dtype=np.uint8)
+    bits = np.asarray(bitplanes,dtype=int).ravel() - 1
+    bits = bits[(bits >= 0) & (bits < 8*n_layers)]
+    np.bitwise_or.at(stack,bits//8,np.left_shift(1,bits % 8).astype(np.uint8))
+    return stack
+
 class mask(object):
     """
     This class is used to read in and hold the system mask and its relevant parameters.
@@ -156,23 +332,7 @@ class mask(object):
                    single-channel grayscale
         """
         self.name=n
-        ext = self.name.split('.')[-1].lower()
-#        if (ext == 'arw') or (ext == 'nef') or (ext == 'raf') or (ext == 'dng'):
-        if ext in ['arw','nef','raf','dng','cr2']:
-            self.matrix=rawpy.imread(n).postprocess()
-            #rgb2gray this if readopt==0
-            if readopt == 0:
-                self.matrix=cv2.cvtColor(self.matrix,cv2.COLOR_BGR2GRAY)
-        elif ext == 'bmp':
-            bmpmode='L'
-            if readopt==1:
-                bmpmode='RGB'
-            self.matrix=misc.imread(n,mode=bmpmode)
-        elif ext == 'jp2':
-            jp2 = glymur.Jp2k(n)
-            self.matrix = jp2[:]
-        else: #covers png, jpeg, jpg, JPG, tif, tiff
-            self.matrix=cv2.imread(n,readopt)  #output own error message when catching error
+        self.matrix=maskIO.imread(n,readopt)  #output own error message when catching error
         if self.matrix is None:
             masktype = 'System'
             if isinstance(self,refmask) or isinstance(self,refmask_color):
@@ -190,6 +350,24 @@ class mask(object):
         """
         return [self.matrix.shape[0],self.matrix.shape[1]]
 
+    def strip(self,start,stop):
+        """
+        * Description: gets a shallow copy of this mask restricted to a horizontal strip of rows.
+                       The matrices of the copy are views into the matrices of this mask
+        * Inputs:
+        *     start: the first row of the strip
+        *     stop: the row after the last row of the strip
+        * Output:
+        *     the mask object for the strip
+        """
+        mystrip = copy.copy(self)
+        mystrip.matrix = self.matrix[start:stop]
+        if isinstance(self.bwmat,np.ndarray):
+            mystrip.bwmat = self.bwmat[start:stop]
+        if hasattr(self,'aggmat'):
+            mystrip.aggmat = self.aggmat[start:stop]
+        return mystrip
+
     def get_copy(self):
         """
         * Description: generates a copy of this mask
@@ -312,7 +490,7 @@ class mask(object):
         *     overmat: the overlayed image
         """
         mymat = self.matrix
-        gImg = cv2.imread(imgName,0)
+        gImg = maskIO.imread(imgName,0)
         gImg = np.dstack((gImg,gImg,gImg))
         if not self.is_multi_layer:
             mymat = np.dstack((mymat,mymat,mymat))
@@ -436,6 +614,53 @@ class mask(object):
         cv2.imwrite(fname,outmat,params)
         return 0
 
+class storedmask(mask):
+    """
+    This class holds a reference mask whose binarized matrix and no-score zones were generated
+    beforehand, so that the reference mask file need not be read again.
+    """
+    def __init__(self,n,bwmat,bns,sns):
+        """
+        Constructor
+
+        Attributes:
+        - n: the name of the reference mask file
+        - bwmat: the binarized reference mask
+        - bns: the boundary no-score zone of the reference mask
+        - sns: the unselected no-score zone of the reference mask
+        """
+        self.name = n
+        self.matrix = bwmat
+        self.is_multi_layer = False
+        self.bwmat = bwmat
+        self.bns = bns
+        self.sns = sns
+
+    def regionIsPresent(self):
+        #only masks with a scoreable region are stored
+        return True
+
+class constmask(mask):
+    """
+    This class holds a mask of a single value, such as the white mask standing in for an empty
+    system output mask. No file is read, and no pixels are stored; the matrix is a read-only
+    view of the value broadcast to the dimensions of the mask.
+    """
+    def __init__(self,n,dims,value=255):
+        """
+        Constructor
+
+        Attributes:
+        - n: the name the mask is saved under, if it is saved
+        - dims: the height and width of the mask
+        - value: the value of every pixel in the mask
+        """
+        self.name = n
+        self.value = value
+        self.matrix = np.broadcast_to(np.uint8(value),(int(dims[0]),int(dims[1])))
+        self.is_multi_layer = False
+        self.bwmat = 0
+
 class refmask(mask):
     """
     This class is used to read in and hold the reference mask and its relevant parameters.
@@ -459,6 +684,8 @@ class refmask(mask):
         #default to all regions if it is 0
 #        self.bitlist=0
         self.bitplanes=0
+        self.plane_masks_of = None
+        self.summary_of = None
         self.is_multi_layer = self.matrix.ndim == 3
         if not self.is_multi_layer:
             self.matrix = np.uint8(self.matrix)
@@ -534,45 +761,58 @@ class refmask(mask):
         else:
             self.journalData = 0
 
+    def regionSummary(self):
+        """
+        * Description: summarizes the regions of the reference mask as the OR of all of its pixel values, one per
+                       layer. It is computed in one pass over the matrix and cached for it, so that checking for
+                       selected or unselected regions afterwards takes no further pass over the pixels
+        * Output:
+        *     an array of the bits set anywhere in each layer of the mask
+        """
+        if self.summary_of is not self.matrix:
+            layers = self.matrix
+            if not self.is_multi_layer:
+                layers = layers[:,:,np.newaxis]
+            self.summary = np.bitwise_or.reduce(layers.reshape(-1,layers.shape[2]),axis=0)
+            self.summary_of = self.matrix
+        return self.summary
+
+    def planeMasks(self):
+        """
+        * Description: computes the masks of the regions of the reference mask over all of its layers at once.
+                       They are computed once for the matrix of the mask and shared by regionIsPresent,
+                       boundaryNoScoreRegion, and unselectedNoScoreRegion
+        * Output:
+        *     a dictionary of 0/1 matrices with the following keys:
+        *         selected: the pixels with a selected bit plane set, or with any region if no bit planes were selected
+        *         unselected: the pixels with a bit plane that was not selected
+        *         regions: the pixels with any region at all
+        """
+        if self.plane_masks_of is not self.matrix:
+            layers = self.matrix
+            if not self.is_multi_layer:
+                layers = layers[:,:,np.newaxis]
+            regions = np.any(layers,axis=2).astype(np.uint8)
+            if self.bitplanes is 0:
+                selected = regions
+                unselected = np.zeros_like(regions)
+            else:
+                stack = layer_bitstack(self.bitplanes,layers.shape[2])
+                printq("Full bitstack: {}".format(stack))
+                selected = np.any(layers & stack,axis=2).astype(np.uint8)
+                unselected = np.any(layers & ~stack,axis=2).astype(np.uint8)
+            self.plane_masks = {'selected':selected,'unselected':unselected,'regions':regions}
+            self.plane_masks_of = self.matrix
+        return self.plane_masks
+
     def regionIsPresent(self):
         """
         * Description: return True if a scoreable region is present. Does not account for no-score zones. False if otherwise.
         """
-        presence = 0
-        rmat = self.matrix
-        bps = self.bitplanes
-        full_bitstack = 0
-
-        if self.is_multi_layer:
-            n_layers = self.matrix.shape[2]
-            bitmask = np.zeros((n_layers,),dtype=np.uint8)
-            for b in self.bitplanes:
-                layer = (int(b) - 1)//8
-                bitmask[layer] = bitmask[layer] + (1 << (int(b) - 1 - 8*layer))
-            for i in range(n_layers):
-                presence += (rmat[:,:,i] & bitmask[i]).sum()
-                if presence > 0:
-                    return True
-        else:
-            for b in self.bitplanes:
-                full_bitstack += (1 << (int(b) - 1))
-            full_bitstack = np.uint8(full_bitstack)
-            presence += (rmat & full_bitstack).sum()
-
-        if presence > 0:
-            return True
-
-#        for b in bits:
-#            if len(rmat.shape) == 3:
-#                #multi-channel
-#                bpos = int(math.log(b,2))
-#                layer = bpos//8
-#                presence = presence + (rmat[:,:,layer] & (b >> 8*layer)).sum()
-#            else:
-#                presence = presence + (rmat & b).sum()
-#            if presence > 0:
-#                return True
-        return False
+        present = self.regionSummary()
+        if self.bitplanes is 0:
+            return bool(present.any())
+        return bool((present & layer_bitstack(self.bitplanes,len(present))).any())
 
     def getColor(self,b):
         if count_bits(b) != 1:
@@ -732,72 +972,26 @@ class refmask(mask):
             weight = np.ones(dims,dtype=np.uint8)
             return {'rimg':self.matrix,'wimg':weight,'eimg':weight,'dimg':weight}
 
-        mymat = 0
-#        if (len(self.matrix.shape) == 3) and (self.purposes is not 'all'):
-        selfmat = self.matrix
-
-        if self.bitplanes is not 0:
-            #thorough computation for individual bits 
-            mymat = np.zeros(self.get_dims(),dtype=np.uint8)
-#            full_bitstack = 0
-#            for b in self.bitlist:
-#                full_bitstack += b
-#            full_bitstack = np.uint64(full_bitstack)
-
-            if self.is_multi_layer:
-                n_layers = self.matrix.shape[2]
-                full_bitstack = np.zeros((n_layers,),dtype=np.uint8)
-                for b in self.bitplanes:
-#                    bitlayer = int(math.log(b,2))//8
-                    bitlayer = (int(b)-1)//8
-                    full_bitstack[bitlayer] = full_bitstack[bitlayer] + (1 << (b - 1 - 8*bitlayer))
+        if not self.regionIsPresent():
+            #no region to score, and so no boundary around it
+            dims = self.get_dims()
+            self.bwmat = 255*np.ones(dims,dtype=np.uint8)
+            weight = np.ones(dims,dtype=np.uint8)
+            return {'wimg':weight,'eimg':self.bwmat,'dimg':self.bwmat}
 
-                printq("Full bitstack: {}".format(full_bitstack))
-                for l in range(n_layers):
-#                    p_bitstack = np.uint8(full_bitstack >> l*8) & 255
-                    _,pixels = cv2.threshold(selfmat[:,:,l] & full_bitstack[l],0,1,cv2.THRESH_BINARY)
-                    mymat = mymat | pixels
-            else:
-                full_bitstack = 0
-                for b in self.bitplanes:
-                    full_bitstack += (1 << (int(b) - 1))
-                full_bitstack = np.uint8(full_bitstack)
-                _,pixels = cv2.threshold(selfmat & full_bitstack,0,1,cv2.THRESH_BINARY)
-                mymat = pixels
-                
-#            for b in self.bitlist:
-##                mymat = mymat & (~((selfmat[:,:,0]==c[0]) & (selfmat[:,:,1]==c[1]) & (selfmat[:,:,2]==c[2]))).astype(np.uint8)
-#                if self.is_multi_layer:
-#                    layer = int(math.log(b,2)//8)
-#                    pixels = (self.matrix[:,:,layer] & (b >> layer*8)) > 0
-#                else:
-#                    pixels = cv2.threshold(selfmat & b,0,1,cv2.THRESH_BINARY)
-##                    pixels = (selfmat & b) > 0
-#
-#                mymat = mymat | pixels
-#            mymat = 255*(1-mymat).astype(np.uint8)
-            _,mymat = cv2.threshold(mymat,0,255,cv2.THRESH_BINARY_INV)
-        else:
-            if self.is_multi_layer:
-                mymat_inv=1
-                for l in range(self.matrix.shape[2]):
-                    bin_layer_inv = cv2.threshold(self.matrix[:,:,l],0,1,cv2.THRESH_BINARY_INV)
-                    mymat_inv = mymat_inv & bin_layer_inv
-#                    mymat = mymat | (self.matrix[:,:,l] > 0)
-                mymat = cv2.threshold(mymat_inv,0,255,cv2.THRESH_BINARY)
-#                mymat = 255*(1-(mymat > 0))
-            else:
-                _,bin_selfmat_inv = cv2.threshold(selfmat,0,255,cv2.THRESH_BINARY_INV)
-                mymat = bin_selfmat_inv
-#                mymat = 255*(1-(selfmat > 0))
+        #the scored region is black. It is made of the selected bit planes, or of all of the regions if no journal was given
+        selected = self.planeMasks()['selected']
+        _,mymat = cv2.threshold(selected,0,255,cv2.THRESH_BINARY_INV)
         mymat = np.uint8(mymat)
         self.bwmat = mymat
 
         #note: erodes relative to 0. We have to invert it twice to get the actual effects we want relative to 255.
         kern = kern.lower()
         #NOTE: dilate and erode are "reversed" because dilation and erosion in this context is relative to white, not black.
-        eImg = dilate(mymat,kern,erodeKernSize)
-        dImg = erode(mymat,kern,dilateKernSize)
+        #Both are restricted to the surroundings of the regions, the rest of the mask being white.
+        boxes = region_boxes(selected)
+        eImg = dilate_roi(mymat,kern,erodeKernSize,boxes,255)
+        dImg = erode_roi(mymat,kern,dilateKernSize,boxes,255)
 
 #        bns=1-(eImg-dImg)/255 #note: eImg - dImg because black is treated as 0.
         _,bns=cv2.threshold(eImg-dImg,0,1,cv2.THRESH_BINARY_INV)
@@ -820,97 +1014,28 @@ class refmask(mask):
         *     weights: the weighted matrix computed from the distraction zones
         """
 
-        mymat = self.matrix
         dims = self.get_dims()
-        
-        #take all distinct "colors" in mymat, subtract the colors that are reported, and then iterate
-        notcolors = self.getUniqueValues()
-        printq("Colors to consider: {}".format(notcolors))
-        top_px = max(notcolors)
-
-        printq(self.journalData)
-        if (np.array_equal(mymat,np.zeros(dims))) or (self.bitplanes is 0):
+        if self.bitplanes is 0:
             weights = np.ones(dims,dtype=np.uint8)
             return weights
 
-        #decompose into individual bit channels.
-        #but this won't represent all colors, so max with the max bit in self.bitlist
-        top_bit = max([int(math.floor(math.log(top_px,2))),int(max(self.bitplanes) - 1)]) + 1
-#        top_bit = int(math.floor(math.log(max(self.bitlist),2))) + 1
-        notcolors = range(1,top_bit + 1) #up to and including top_bit
-        notcolors_b = [ 1 << (b - 1) for b in notcolors ]
-        printq("Colors to consider: {}".format(notcolors_b))
-
-#        for c in self.colors:
-        scored = np.zeros((dims[0],dims[1]),dtype=bool)
-
-#        full_bitstack = 0
-#        for c in self.bitlist:
-#            #skip the colors that aren't present, in case they haven't made it to the mask in question
-#            if c in notcolors:
-#                notcolors.remove(c)
-#            full_bitstack += c
-#        full_bitstack = np.uint64(full_bitstack) #type-safety
-
-        if self.is_multi_layer:
-            n_layers = mymat.shape[2]
-            layers = range(n_layers)
-            full_bitstack = np.zeros((n_layers,),dtype=np.uint8)
-            for c in self.bitplanes:
-                if c in notcolors:
-                    notcolors.remove(c)
-                    notcolors_b.remove(1 << (int(c) - 1))
-                layer = (int(c) - 1)//8
-                full_bitstack[layer] = full_bitstack[layer] + (1 << (int(c) - 1 - 8*layer))
-
-            for l in layers:
-#                p_bitstack = np.uint8((full_bitstack >> l*8) & 255)
-                _,pixels = cv2.threshold(mymat[:,:,l] & full_bitstack[l],0,1,cv2.THRESH_BINARY)
-                scored = scored | pixels
-        else:
-            full_bitstack = 0
-            for c in self.bitplanes:
-                #skip the colors that aren't present, in case they haven't made it to the mask in question
-                c_bit = 1 << (c-1)
-                if c in notcolors:
-                    notcolors.remove(c)
-                    notcolors_b.remove(c_bit)
-                full_bitstack += c_bit
-            full_bitstack = np.uint8(full_bitstack)
-            _,pixels = cv2.threshold(mymat & full_bitstack,0,1,cv2.THRESH_BINARY)
-            scored = pixels
-        scored = scored.astype(np.uint8)
-
-        printq("Excluded colors: {}".format(notcolors_b))
-        if len(notcolors)==0:
+        #every bit set in the mask that is not among the selected bit planes is an unselected region
+        present = self.regionSummary()
+        if not (present & ~layer_bitstack(self.bitplanes,len(present))).any():
             weights = np.ones(dims,dtype=np.uint8)
             return weights
 
-        #edit for bit masks
-        mybin = np.zeros((dims[0],dims[1]),dtype=bool)
+        planes = self.planeMasks()
+        scored = planes['selected']
+        mybin = planes['unselected']
+        scored_boxes = region_boxes(scored)
+        unselected_boxes = region_boxes(mybin)
 
-        if self.is_multi_layer:
-            full_notstack = np.zeros((n_layers,),dtype=np.uint8)
-            for c in notcolors:
-                layer = (int(c) - 1)//8
-                full_notstack[layer] = full_notstack[layer] + (1 << (int(c) - 1 - 8*layer))
-            for l in layers:
-#                p_notstack = np.uint8((full_notstack >> np.uint64(l*8)) & 255)
-                _,pixels = cv2.threshold(mymat[:,:,l] & full_notstack[l],0,1,cv2.THRESH_BINARY)
-                mybin = mybin | pixels
-        else:
-            full_notstack = 0
-            for c in notcolors:
-                full_notstack += (1 << (int(c) - 1))
-            _,pixels = cv2.threshold(mymat & full_notstack,0,1,cv2.THRESH_BINARY)
-            mybin = pixels
-
-        mybin = mybin.astype(np.uint8)
         #note: erodes relative to 0. We have to invert it twice to get the actual effects we want relative to 255.
         #eroded region must be set to 1 and must not be overrideen by the unselected NSR
         kern = kern.lower()
-        eImg = erode(scored,kern,erodeKernSize)
-        dImg = 1-dilate(mybin,kern,dilateKernSize)
+        eImg = erode_roi(scored,kern,erodeKernSize,scored_boxes,0)
+        dImg = 1-dilate_roi(mybin,kern,dilateKernSize,unselected_boxes,0)
 
         dImg = dImg | eImg
         weights=dImg.astype(np.uint8)
@@ -945,6 +1070,7 @@ class refmask_color(mask):
             self.aggmat = 65536*rmat[:,:,0] + 256*rmat[:,:,1] + rmat[:,:,2]
         else:
             self.aggmat = self.matrix
+        self.present_colors_of = None
         if jData is 0:
             self.colors = [[0,0,0]]
             self.aggcolors = [0]
@@ -967,14 +1093,21 @@ class refmask_color(mask):
                 self.aggcolors = [65536*c[0] + 256*c[1] + c[2] for c in self.colors]
                 self.purposes = purposes
 
+    def presentColors(self):
+        """
+        * Description: gets the set of the aggregate colors present in the reference mask. It is computed once
+                       for the aggregate matrix and cached, so that presence checks are set lookups
+        """
+        if self.present_colors_of is not self.aggmat:
+            self.present_colors = set(np.unique(self.aggmat).tolist())
+            self.present_colors_of = self.aggmat
+        return self.present_colors
+
     def regionIsPresent(self):
         #return True if a scoreable region is present. False if otherwise.
-        presence = 0
-#        rmat = self.matrix
-#        aggmat = 65536*rmat[:,:,0] + 256*rmat[:,:,1] + rmat[:,:,2]
+        present = self.presentColors()
         for c in self.aggcolors:
-#            presence = ((rmat[:,:,0] == c[0]) & (rmat[:,:,1] == c[1]) & (rmat[:,:,2] == c[2])).sum()
-            if (self.aggmat == c).sum() > 0:
+            if c in present:
                 return True
         return False
 
@@ -1029,8 +1162,9 @@ class refmask_color(mask):
 
         #note: erodes relative to 0. We have to invert it twice to get the actual effects we want relative to 255.
         kern = kern.lower()
-        eImg = dilate(mymat,kern,erodeKernSize)
-        dImg = erode(mymat,kern,dilateKernSize)
+        boxes = region_boxes(mymat == 0)
+        eImg = dilate_roi(mymat,kern,erodeKernSize,boxes,255)
+        dImg = erode_roi(mymat,kern,dilateKernSize,boxes,255)
 
         _,bns=cv2.threshold(eImg-dImg,0,1,cv2.THRESH_BINARY_INV)
 #        bns=1-(eImg-dImg)/255 #note: eImg - dImg because black is treated as 0.
@@ -1058,7 +1192,9 @@ class refmask_color(mask):
         scoredregion = np.zeros((dims[0],dims[1]),dtype=np.uint8)
         
         #take all distinct 3-channel colors in mymat, subtract the colors that are reported, and then iterate
-        notcolors,mymat1L = mask.getColors(mymat,aggregate=True)
+        white = 16777215 #256^3 - 1
+        notcolors = [c for c in sorted(self.presentColors()) if c != white]
+        mymat1L = self.aggmat
 #        notcolors = mask.getColors(mymat)
 
         #set erode region to all 1's. Must be in erode region at all times.
@@ -1084,9 +1220,9 @@ class refmask_color(mask):
         #note: erodes relative to 0. We have to invert it twice to get the actual effects we want relative to 255.
         kern = kern.lower()
         printq(erodeKernSize)
-        eImg = erode(scoredregion,kern,erodeKernSize)
+        eImg = erode_roi(scoredregion,kern,erodeKernSize,region_boxes(scoredregion),0)
         printq(dilateKernSize)
-        dImg = erode(mybin,kern,dilateKernSize)
+        dImg = erode_roi(mybin,kern,dilateKernSize,region_boxes(mybin == 0),1)
         dImg=dImg | eImg
         weights=dImg.astype(np.uint8)
 
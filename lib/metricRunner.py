@@ -22,7 +22,6 @@
  reliability, or any other characteristic."
 """
 import cv2
-import glymur
 import math
 import copy
 import numpy as np
@@ -32,92 +31,39 @@ import sys
 import random
 import multiprocessing
 from decimal import Decimal
-from numpngw import write_apng
-from string import Template
 lib_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(lib_path)
 import masks
-import Render as p
-from collections import OrderedDict
 from detMetrics import Metrics as dmets
 from maskMetrics import maskMetrics as maskMetrics1
 from maskMetrics_old import maskMetrics as maskMetrics2
 from myround import myround
+from noScoreCache import noScoreCache
+from scoreStore import scoreStore
+from refMaskStore import refMaskStore
+from scheduler import imap_largest_first
+from maskMetricsRender import detPackage,plotROC,renderParams,saveRenderData,colorMaskNames,render_data_name
+import fileOps
 from constants import *
 
 debug_off = False
 
-def scoreMask(args):
-    return maskMetricRunner.scoreMoreMasks(*args)
+#the runner used by the worker processes. It is set before each pool is created so that the
+#workers inherit it when forked, rather than having it pickled along with every task.
+shared_runner = None
 
-#for use with detection metrics plotter
-class detPackage:
-    def __init__(self,
-                 tpr,
-                 fpr,
-                 fpr_stop,
-                 ci_tpr,
-                 auc,
-                 nTarget,
-                 nNonTarget):
-        """
-        This class is a wrapper for a collection of metrics for rendering the ROC curve
-        of the detection metrics.
-        """
-        self.tpr = tpr
-        self.fpr = fpr
-        self.fpr_stop = fpr_stop
-        self.ci_tpr = ci_tpr
-        self.auc = auc
-        self.t_num = nTarget
-        self.nt_num = nNonTarget
-        self.d = None #TODO: possibility of computing d in the future
-        
-def plotROC(mydets,plotname,plot_title,outdir):
-    #initialize plot options for ROC
-#    dict_plot_options_path_name = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../tools/MaskScorer/plotJsonFiles/plot_options.json")
-#    dict_plot_options_path_name = os.path.join(os.path.dirname(os.path.abspath(__file__)),"../tools/DetectionScorer/plotJsonFiles/plot_options.json")
-#    p.gen_default_plot_options(dict_plot_options_path_name,plot_title=plot_title,plot_type='ROC')
-#    plot_opts = p.load_plot_options(dict_plot_options_path_name)
-    plot_opts = OrderedDict([
-            ('title', plot_title),
-            ('subtitle', ''),
-            ('plot_type', 'ROC'),
-            ('title_fontsize', 13),  # 15
-            ('subtitle_fontsize', 11),
-            ('xticks_size', 'medium'),
-            ('yticks_size', 'medium'),
-            ('xlabel', "False Alarm Rate [%]"),
-            ('xlabel_fontsize', 11),
-            ('ylabel', "Miss Detection Rate [%]"),
-            ('ylabel_fontsize', 11)])
-    
-    opts_list = [OrderedDict([('color', 'red'),
-                              ('linestyle', 'solid'),
-                              ('marker', '.'),
-                              ('markersize', 6),
-                              ('markerfacecolor', 'red'),
-                              ('label',None),
-                              ('antialiased', 'False')])]
-
-    #compute AUC and EER with detection metrics and store in 
-    #add ci_tpr to rocvalues
-#            rocvalues['ci_tpr'] = 0
-
-    configRender = p.setRender([mydets],opts_list,plot_opts)
-    myRender = p.Render(configRender)
-    myroc = myRender.plot_curve()
-
-    #save roc curve in the output. Automatically closes the plot.
-    #TODO: error with savefig. RuntimeError involving plots. Hack around it more elegantly.
-    while True:
-        try:
-            myroc.savefig(os.path.join(outdir,'.'.join([plotname,'pdf'])), bbox_inches='tight')
-            break
-        except RuntimeError:
-            pass
+def scoreMask(maskData):
+    #collect this task's threshold tables, printout, errors, and filesystem operations to return with the scored rows
+    shared_runner.thresscores = {}
+    shared_runner.threstables = {}
+    shared_runner.msgs = []
+    shared_runner.errlist = []
+    fs_counts = fileOps.get_counts()
+    maskData = shared_runner.scoreMoreMasks(maskData)
+    return maskData,shared_runner.thresscores,shared_runner.threstables,shared_runner.msgs,shared_runner.errlist,fileOps.count_diff(fileOps.get_counts(),fs_counts)
 
-    return myroc
+def stageRefMask(args):
+    return shared_runner.stage_ref_mask(*args)
 
 class maskMetricRunner:
     """
@@ -134,6 +80,7 @@ class maskMetricRunner:
                  joindf,
                  index,
                  speedup=False,
+                 engine='bincount',
                  color=False,
                  colordict={'red':[0,0,255],'blue':[255,51,51],'yellow':[0,255,255],'green':[0,207,0],'pink':[193,182,255],'purple':[211,0,148],'white':[255,255,255],'gray':[127,127,127]}):
         """
@@ -157,6 +104,8 @@ class maskMetricRunner:
         - colordict: the dictionary of colors to use for the HTML output, in BGR array format,
                      to be used as reference
         - speedup: determines the mask metric computation method to be used
+        - engine: the method used by the sped-up evaluator to count the confusion measures
+                  over all thresholds. Either 'bincount' (default) or 'unique'
         - color: whether to use 3-channel color assessment (dated to the NC17 evaluation)
         """
         self.maskData = mergedf
@@ -168,12 +117,13 @@ class maskMetricRunner:
         self.joinData = joindf
         self.index = index
         self.speedup=speedup
+        self.engine=engine
         self.usejpeg2000=color
         self.colordict=colordict
        
-    def getSubOutRoot(self,outputRoot,task,mymode,row):
+    def getSubOutRootName(self,outputRoot,task,mymode,row):
         """
-        * Description: generates subdirectories in the output root where relevant
+        * Description: gets the name of the subdirectory in the output root for the files of a row
         * Inputs:
         *     outputRoot: the directory where the output of the scorer is saved
         *     task: the task in question, "manipulation" or "splice"
@@ -192,33 +142,67 @@ class maskMetricRunner:
             subdir_name = "_".join([row['ProbeFileID'],row['DonorFileID']])
         #save in subdirectory
         subOutRoot = os.path.join(outputRoot,subdir_name)
-        if not os.path.isdir(subOutRoot):
-            os.system(' '.join(['mkdir',subOutRoot]))
         #further subdirectories for the splice task
         if self.mode == 1:
             subOutRoot = os.path.join(subOutRoot,'probe')
         elif self.mode == 2:
             subOutRoot = os.path.join(subOutRoot,'donor')
-        if not os.path.isdir(subOutRoot):
-            os.system(' '.join(['mkdir',subOutRoot]))
         return subOutRoot
 
+    def getSubOutRoot(self,outputRoot,task,mymode,row):
+        """
+        * Description: generates subdirectories in the output root where relevant, i.e. where per-probe files are saved
+        * Inputs:
+        *     outputRoot: the directory where the output of the scorer is saved
+        *     task: the task in question, "manipulation" or "splice"
+        *     mymode: the kind of masks being evaluated as "probe" or "donor"
+        *     row: the row of data from which the dataframe is iterated over
+        * Outputs:
+        *     subOutRoot: the directory for files to be saved on this iteration of getting the metrics
+        """
+        subOutRoot = self.getSubOutRootName(outputRoot,task,mymode,row)
+        if self.save_sub_out:
+            fileOps.mkdir(subOutRoot)
+        return subOutRoot
+
+    def makeSubOutRoots(self,maskData):
+        """
+        * Description: makes the subdirectories in the output root for all of the rows to be scored up front,
+                       rather than one at a time as each row is scored
+        * Inputs:
+        *     maskData: the dataframe of masks to be scored
+        """
+        if not self.save_sub_out:
+            return
+        fileOps.mkdirs([self.getSubOutRootName(self.outputRoot,self.task,self.mymode,row) for _,row in maskData.iterrows() if not self.isOptedOut(row)])
+
+    def get_journal_rows(self,probeID,mymode):
+        """
+        * Description: selects the journal rows used to pick out the scored regions of the reference mask
+        * Inputs:
+        *     probeID: the ProbeFileID or DonorFileID corresponding to the reference mask
+        *     mymode: the kind of mask being evaluated, 'Probe' or 'Donor'
+        * Outputs:
+        *     the journal rows for the reference mask, or 0 if the reference mask is read without them
+        """
+        if (self.rbin != -1) or (self.mode == 2): #NOTE: temporary measure until we get splice sorted out.
+            return 0
+        if (self.mode == 1) and not self.usejpeg2000:
+            #NOTE: temporary measure for splice task
+            return 0
+        return self.journalData.query("{}FileID=='{}'".format(mymode,probeID))
+
     def read_ref_mask(self,refMaskName,probeID,mymode,myprintbuffer):
         #read in the reference mask
         rImg = 0
-        color_purpose = 0 
         if self.rbin >= 0:
             rImg = masks.refmask_color(refMaskName)
             rImg.binarize(self.rbin)
         elif self.rbin == -1:
             #only need colors if selectively scoring
             myprintbuffer.append("Fetching {}FileID {} from mask data...".format(mymode,probeID))
-            if self.mode != 2: #NOTE: temporary measure until we get splice sorted out.
-		color_purpose = self.journalData.query("{}FileID=='{}'".format(mymode,probeID))
+            color_purpose = self.get_journal_rows(probeID,mymode)
             if not self.usejpeg2000:
-                #NOTE: temporary measure for splice task
-                if self.mode == 1:
-                    color_purpose = 0
                 rImg = masks.refmask_color(refMaskName,jData=color_purpose,mode=self.mode)
             else:
                 rImg = masks.refmask(refMaskName,jData=color_purpose,mode=self.mode)
@@ -226,7 +210,7 @@ class maskMetricRunner:
             myprintbuffer.append("Initializing reference mask {}.".format(refMaskName))
         return rImg
 
-    def readMasks(self,refMaskFName,sysMaskFName,probeID,outRoot,myprintbuffer):
+    def readMasks(self,refMaskFName,sysMaskFName,probeID,outRoot,myprintbuffer,dims=0):
         """
         * Description: reads both the reference and system output masks and caches the binarized image
                        into the reference mask. If the journal dataframe is provided, the color and purpose
@@ -237,18 +221,23 @@ class maskMetricRunner:
         *     probeID: the ProbeFileID corresponding to the reference mask
         *     outRoot: the directory where files are saved. Only relevant where sysMaskFName is blank
         *     myprintbuffer: buffer to append printout for atomic printout
+        *     dims: the height and width of the probe, for the white mask standing in for a blank sysMaskFName
         * Outputs:
         *     rImg: the reference mask object
         *     sImg: the system output mask object
         """
         myprintbuffer.append("Reference Mask: {}, System Mask: {}".format(refMaskFName,sysMaskFName))
 
+        #an empty reference mask is entirely white, and so has no region to score
+        if refMaskFName in [None,'',np.nan]:
+            myprintbuffer.append("The region you are looking for is not in the empty reference mask. Scoring neglected.")
+            return 0,0
+
         refMaskName = os.path.join(self.refDir,refMaskFName)
         if sysMaskFName in [None,'',np.nan]:
-            sysMaskName = os.path.join(outRoot,'whitemask.png')
+            sImg = masks.constmask(os.path.abspath(os.path.join(outRoot,'whitemask.png')),dims)
         else:
-            sysMaskName = os.path.join(self.sysDir,sysMaskFName)
-        sImg = masks.mask(sysMaskName)
+            sImg = masks.mask(os.path.join(self.sysDir,sysMaskFName))
  
         if (self.journalData is 0) and (self.rbin == -1): #no journal saved and rbin not set
             self.rbin = 254 #automatically set binary threshold if no journalData provided.
@@ -260,8 +249,19 @@ class maskMetricRunner:
         if self.mode==2:
             mymode = 'Donor'
  
+        #read from the shared reference mask store if relevant
+        if self.ref_store is not 0:
+            stored = self.ref_store.get(self.stored_ref_key(refMaskName,probeID),['bwmat','bns','sns'])
+            if stored is not None:
+                myprintbuffer.append("Reading reference mask {} from the shared store.".format(refMaskName))
+                rImg = masks.storedmask(refMaskName,stored['bwmat'],stored['bns'],stored['sns'])
+                return rImg,sImg
+
         #read from cache if relevant
         rImg = self.read_ref_mask(refMaskName,probeID,mymode,myprintbuffer)
+        if not rImg.regionIsPresent():
+            myprintbuffer.append("The region you are looking for is not in reference mask {}. Scoring neglected.".format(refMaskFName))
+            return 0,0
         rImg.binarize(254)
         #alternative to direct binarization
 #        if self.cache_dir:
@@ -275,51 +275,279 @@ class maskMetricRunner:
 #        else:
 #            rImg.binarize(254)
 
-        if not rImg.regionIsPresent():
-            myprintbuffer.append("The region you are looking for is not in reference mask {}. Scoring neglected.".format(refMaskFName))
-            return 0,0
-
         return rImg,sImg 
 
-    def get_ref_no_scores(self,rImg,probeID,erodeKernSize,dilateKernSize,distractionKernSize,kern):
-        wts,bns,sns = 0,0,0
-
-        if self.cache_dir: 
-            bns_dir = os.path.join(self.cache_dir,'%s_bns.npy' % probeID)
-            sns_dir = os.path.join(self.cache_dir,'%s_sns.npy' % probeID)
-            #if it's found in the cache, read it in
-            if os.path.isfile(bns_dir) and os.path.isfile(sns_dir):
-#                 bns = cv2.imread(bns_dir,0)
-#                 sns = cv2.imread(sns_dir,0)
-                 bns = np.load(bns_dir)
-                 sns = np.load(sns_dir)
-                 wts = bns & sns
-                 return wts,bns,sns
-     
+    def get_ref_no_scores(self,rImg,probeID,mymode,erodeKernSize,dilateKernSize,distractionKernSize,kern):
+        """
+        * Description: generates the no-score zones of the reference mask. If a cache directory is set,
+                       the zones are read from the no-score cache where present and saved into it otherwise.
+                       The cache is keyed by the contents of the reference mask file, the journal rows used to
+                       select its regions, and the no-score parameters, so stale entries are never read
+        * Inputs:
+        *     rImg: the reference mask object
+        *     probeID: the ProbeFileID or DonorFileID corresponding to the reference mask
+        *     mymode: the kind of mask being evaluated, 'Probe' or 'Donor'
+        *     erodeKernSize: length of the erosion kernel matrix
+        *     dilateKernSize: length of the dilation kernel matrix
+        *     distractionKernSize: length of the dilation kernel matrix for the unselected no-score zones
+        *     kern: kernel shape to be used
+        * Outputs:
+        *     wts: the aggregate no-score zone
+        *     bns: the boundary no-score zone
+        *     sns: the unselected no-score zone
+        *     cache_status: 'hit' or 'miss' if the cache was used, '' otherwise
+        """
+        if isinstance(rImg,masks.storedmask):
+            return cv2.bitwise_and(rImg.bns,rImg.sns),rImg.bns,rImg.sns,''
+
+        if self.ns_cache is 0:
+            wts,bns,sns = rImg.aggregateNoScore(erodeKernSize,dilateKernSize,distractionKernSize,kern)
+            return wts,bns,sns,''
+
+        key = self.ns_cache.make_key(rImg.name,self.get_journal_rows(probeID,mymode),
+                                     eks=erodeKernSize,dks=dilateKernSize,ntdks=distractionKernSize,kernel=kern.lower(),
+                                     jpeg2000=self.usejpeg2000,mode=self.mode,rbin=self.rbin)
+        entry = self.ns_cache.get(key)
+        if entry is not None:
+            #generating the no-score zones also sets the binarized reference mask
+            rImg.bwmat = entry['bwmat']
+            bns = entry['bns']
+            sns = entry['sns']
+            wts = cv2.bitwise_and(bns,sns)
+            return wts,bns,sns,'hit'
+
         wts,bns,sns = rImg.aggregateNoScore(erodeKernSize,dilateKernSize,distractionKernSize,kern)
-        if self.cache_dir:
-            #save the files in the cache
-#            save_params = [16,0]
-#            cv2.imwrite(bns_dir,bns,save_params)
-#            cv2.imwrite(sns_dir,sns,save_params)
-            np.save(bns_dir,bns)
-            np.save(sns_dir,sns)
+        self.ns_cache.put(key,bns=bns,sns=sns,bwmat=rImg.bwmat)
+        return wts,bns,sns,'miss'
+
+    def stored_ref_key(self,refMaskName,probeID):
+        return '{}|{}'.format(refMaskName,probeID)
+
+    def stage_ref_mask(self,refMaskFName,probeID):
+        """
+        * Description: reads a reference mask, generates its binarized matrix and no-score zones, and saves
+                       them in the shared reference mask store. Masks that cannot be read or have no scoreable
+                       region are not stored, and are left to be handled when each row is scored
+        * Inputs:
+        *     refMaskFName: the name of the reference mask file, relative to the reference directory
+        *     probeID: the ProbeFileID or DonorFileID corresponding to the reference mask
+        * Outputs:
+        *     the no-score cache status of the reference mask, or '' if not stored
+        *     the message explaining why the reference mask was not stored, or '' if there is none
+        """
+        refMaskName = os.path.join(self.refDir,refMaskFName)
+        try:
+            rImg = self.read_ref_mask(refMaskName,probeID,self.mymode,[])
+            if (rImg is 0) or (rImg.matrix is None):
+                return '',''
+            if not rImg.regionIsPresent():
+                return '',''
+            rImg.binarize(254)
+            wts,bns,sns,cache_status = self.get_ref_no_scores(rImg,probeID,self.mymode,self.erodeKernSize,self.dilateKernSize,self.distractionKernSize,self.kern)
+            self.ref_store.put(self.stored_ref_key(refMaskName,probeID),bwmat=rImg.bwmat,bns=bns,sns=sns)
+        except (IOError,OSError,ValueError,cv2.error) as e:
+            return '',"Warning: reference mask {} for {}FileID {} could not be staged ({}). It will be read for each row instead.".format(refMaskName,self.mymode,probeID,e)
+        return cache_status,''
+
+    def stageRefMasks(self,maskData,processors):
+        """
+        * Description: generates the binarized matrix and no-score zones once for each reference mask used
+                       by more than one row of the data (e.g. a probe spliced with several donors), and saves
+                       them in a store that the processes scoring the masks map in read-only
+        * Inputs:
+        *     maskData: the dataframe of masks to be scored
+        *     processors: the number of processors to use
+        * Outputs:
+        *     the no-score cache statuses of the staged reference masks
+        """
+        global shared_runner
+        if self.usejpeg2000:
+            refcol = '{}BitPlaneMaskFileName'.format(self.mymode)
+        else:
+            refcol = '{}{}MaskFileName'.format(self.binpfx,self.mymode)
+        refs = maskData[[refcol,self.manip_file_id_col]]
+        refs = refs[refs[refcol].notnull() & (refs[refcol] != '')]
+        ref_counts = refs.groupby([refcol,self.manip_file_id_col]).size()
+        staged_refs = ref_counts[ref_counts > 1].index.tolist()
+        if len(staged_refs) == 0:
+            return []
+
+        if (self.journalData is 0) and (self.rbin == -1):
+            self.rbin = 254 #as in readMasks
+
+        self.ref_store = refMaskStore()
+        if self.verbose:
+            print("Staging {} reference masks used by more than one row in {}...".format(len(staged_refs),self.ref_store.store_dir))
+        processors = min(processors,len(staged_refs))
+        if processors <= 1:
+            results = [self.stage_ref_mask(*r) for r in staged_refs]
+        else:
+            shared_runner = self
+            results = imap_largest_first(stageRefMask,staged_refs,self.get_mask_sizes([r[1] for r in staged_refs]),processors)
+        self.msgs.extend([msg for _,msg in results if msg != ''])
+        return [cache_status for cache_status,_ in results]
 
-        return wts,bns,sns
+    def get_mask_sizes(self,fileIDs):
+        """
+        * Description: looks up the number of pixels in each mask from the widths and heights in the index file
+        * Inputs:
+        *     fileIDs: a list of the ProbeFileIDs or DonorFileIDs of the masks
+        * Outputs:
+        *     a list of the number of pixels in each mask, 0 where not found in the index file
+        """
+        idcol = self.manip_file_id_col
+        wcol = '%sWidth' % self.mymode
+        hcol = '%sHeight' % self.mymode
+        if not set([idcol,wcol,hcol]).issubset(list(self.index)):
+            return [0]*len(fileIDs)
+        dims = self.index[[idcol,wcol,hcol]].drop_duplicates(idcol).set_index(idcol)
+        npx = dims[wcol].astype(np.int64)*dims[hcol].astype(np.int64)
+        return [int(npx.get(i,0)) for i in fileIDs]
+
+    def scoreStrips(self,rImg,sImg,metricRunner,pppnspx,erodeKernSize,dilateKernSize,distractionKernSize,kern):
+        """
+        * Description: accumulates the histograms of the system output mask values over horizontal strips
+                       of the reference and system output masks, so that the no-score zones and the other
+                       intermediate matrices are never generated for the whole mask at once. Each strip is
+                       padded with a halo of rows on either side so that the erosions and dilations of the
+                       no-score zones match the ones computed over the whole mask. The masks themselves are
+                       still read, binarized, and checked for a region in their entirety beforehand
+        * Inputs:
+        *     rImg: the reference mask object
+        *     sImg: the system output mask object
+        *     metricRunner: the mask metrics object used to count the histograms
+        *     pppnspx: the pixel value in the system output mask to treat as a no-score zone
+        *     erodeKernSize: length of the erosion kernel matrix
+        *     dilateKernSize: length of the dilation kernel matrix
+        *     distractionKernSize: length of the dilation kernel matrix for the unselected no-score zones
+        *     kern: kernel shape to be used
+        * Outputs:
+        *     hists: the 4 x 256 histograms of the system output mask values over the whole mask
+        *     totals: dictionary of the BNS, SNS, and PNS pixel totals and the GWL1 over the whole mask
+        """
+        halo = max(erodeKernSize,dilateKernSize,distractionKernSize)//2
+        nrows = rImg.get_dims()[0]
+        hists = 0
+        totals = {'BNS':0,'SNS':0,'PNS':0}
+        gwL1 = 0.
+        for start in range(0,nrows,self.strip_rows):
+            stop = min(start + self.strip_rows,nrows)
+            hstart = max(start - halo,0)
+            hstop = min(stop + halo,nrows)
+            rStrip = rImg.strip(hstart,hstop)
+            wts,bns,sns = rStrip.aggregateNoScore(erodeKernSize,dilateKernSize,distractionKernSize,kern)
+
+            #trim the halo off of everything computed for the strip
+            rStrip = rStrip.strip(start - hstart,stop - hstart)
+            wts = wts[start - hstart:stop - hstart]
+            bns = bns[start - hstart:stop - hstart]
+            sns = sns[start - hstart:stop - hstart]
+            sStrip = sImg.strip(start,stop)
+            pns = sStrip.pixelNoScore(pppnspx)
+            wts = cv2.bitwise_and(wts,pns)
+
+            hists = hists + metricRunner.confusion_histograms(rStrip,sStrip,wts)
+            totals['BNS'] += ((bns == 0) & (sns == 1)).sum()
+            totals['SNS'] += (sns == 0).sum()
+            totals['PNS'] += (pns == 0).sum()
+            gwL1 += np.multiply(wts,abs(rStrip.bwmat.astype(float) - sStrip.matrix)/255).sum()
+
+        n = hists[1:].sum()
+        totals['GWL1'] = gwL1/n if n > 0 else np.nan
+        return hists,totals
 
     #for apply
-    def scoreOneMask(self,maskRow):
-        #optout and return a set of preset null metrics if opting out
+    def isOptedOut(self,maskRow):
+        """
+        * Description: checks whether the row is opted out of localization, and so is not scored
+        * Inputs:
+        *     maskRow: the row of data to check
+        * Outputs:
+        *     True if the row is opted out, False otherwise
+        """
         if self.optout_mode == 1:
-            if maskRow['IsOptOut'] in ['Y','Localization']:
-                return maskRow
+            return maskRow['IsOptOut'] in ['Y','Localization']
         elif self.optout_mode == 2:
             if self.mode == 2:
-                if maskRow['DonorStatus'] == 'OptOutLocalization':
-                    return maskRow
-            else:
-                if maskRow['ProbeStatus'] in ['OptOutLocalization','OptOutAll']:
-                    return maskRow
+                return maskRow['DonorStatus'] == 'OptOutLocalization'
+            return maskRow['ProbeStatus'] in ['OptOutLocalization','OptOutAll']
+        return False
+
+    def score_store_key(self,maskRow):
+        """
+        * Description: generates the key of the probe's entry in the score store from the masks, journal rows,
+                       input row, and scoring parameters that its scores depend on
+        * Inputs:
+        *     maskRow: the row of the probe to be scored
+        * Outputs:
+        *     the key of the probe's entry
+        """
+        mymode = self.mymode
+        if not self.usejpeg2000:
+            refMaskFName = maskRow['{}{}MaskFileName'.format(self.binpfx,mymode)]
+        else:
+            refMaskFName = maskRow['{}BitPlaneMaskFileName'.format(mymode)]
+        sysMaskFName = maskRow['Output{}MaskFileName'.format(mymode)]
+        refMaskName = '' if refMaskFName in [None,'',np.nan] else os.path.join(self.refDir,refMaskFName)
+        sysMaskName = '' if sysMaskFName in [None,'',np.nan] else os.path.join(self.sysDir,sysMaskFName)
+        probeID = maskRow[self.manip_file_id_col]
+        #the reference threshold is set to 254 on reading the first mask if there is no journal to select regions with
+        rbin = self.rbin
+        journal_rows = 0
+        if self.journalData is 0:
+            if rbin == -1:
+                rbin = 254
+        else:
+            journal_rows = self.get_journal_rows(probeID,mymode)
+        return self.score_store.make_key(refMaskName,sysMaskName,journal_rows,
+                                         dict([(c,maskRow[c]) for c in self.input_cols]),
+                                         mode=self.mode,eks=self.erodeKernSize,dks=self.dilateKernSize,ntdks=self.distractionKernSize,
+                                         nspx=self.noScorePixel,pppns=self.perProbePixelNoScore,kernel=self.kern,
+                                         rbin=rbin,sbin=self.sbin,sbin_list=self.sbin_list,speedup=self.speedup,
+                                         usejpeg2000=self.usejpeg2000,precision=self.precision,truncate=self.truncate,
+                                         strip_rows=self.strip_rows,optout_mode=self.optout_mode,artifacts=self.artifacts)
+
+    def scoreOneMask(self,maskRow):
+        """
+        * Description: scores the probe in maskRow, reusing its stored scores where the score store is in use and
+                       nothing its scores depend on has changed since they were stored
+        * Inputs:
+        *     maskRow: the row of the probe to be scored
+        * Outputs:
+        *     the scored row
+        """
+        if (self.score_store is 0) or self.isOptedOut(maskRow):
+            return self.scoreMaskRow(maskRow)
+
+        key = self.score_store_key(maskRow)
+        entry = self.score_store.get(key)
+        if entry is not None:
+            for c,v in entry['row'].items():
+                maskRow[c] = v
+            manipFileID = maskRow[self.manip_file_id_col]
+            if entry['thresscores'] is not None:
+                self.thresscores[manipFileID] = entry['thresscores']
+            if entry['threstable'] is not None:
+                self.threstables[maskRow.name] = entry['threstable']
+            maskRow['NoScoreCache'] = ''
+            maskRow['ScoreStore'] = 'reused'
+            self.msgs.append("Reusing the stored scores of {}FileID {}.".format(self.mymode,manipFileID))
+            return maskRow
+
+        n_errs = len(self.errlist)
+        maskRow = self.scoreMaskRow(maskRow)
+        if len(self.errlist) == n_errs:
+            manipFileID = maskRow[self.manip_file_id_col]
+            self.score_store.put(key,row=maskRow.to_dict(),
+                                 thresscores=self.thresscores.get(manipFileID),
+                                 threstable=self.threstables.get(maskRow.name))
+        maskRow['ScoreStore'] = 'scored'
+        return maskRow
+
+    def scoreMaskRow(self,maskRow):
+        #optout and return a set of preset null metrics if opting out
+        if self.isOptedOut(maskRow):
+            return maskRow
         
         #parameter control
         binpfx = self.binpfx
@@ -378,52 +606,33 @@ class maskMetricRunner:
             index_row = self.index.query("{}=='{}'".format(probe_id_name,manipFileID))
             if len(index_row) == 0:
                 myprintbuffer.append("The probe '{}' is not in the index file. Skipping.".format(manipFileID))
-                self.msg_queue.put("\n".join(myprintbuffer))
+                self.msgs.append("\n".join(myprintbuffer))
                 return maskRow
             index_row = index_row.iloc[0]
 
             iswhiteref = refMaskName in [None,'',np.nan]
             if iswhiteref:
                 myprintbuffer.append("Empty reference {} mask file.".format(mymode.lower()))
-                #save white matrix as mask in question. Dependent on index file dimensions?
-                if not self.usejpeg2000:
-                    refMaskName = os.path.abspath(os.path.join(subOutRoot,'whitemask_ref.png'))
-                    whitemask = 255*np.ones((index_row[probe_height_name],index_row[probe_width_name]),dtype=np.uint8)
-                    cv2.imwrite(refMaskName,whitemask)
-                else:
-                    refMaskName = os.path.abspath(os.path.join(subOutRoot,'whitemask_ref.jp2'))
-                    whitemask = np.zeros((index_row[probe_height_name],index_row[probe_width_name]),dtype=np.uint8)
-                    glymur.Jp2k(refMaskName,whitemask)
-#                continue
 
             iswhitesys = sysMaskName in [None,'',np.nan]
             if iswhitesys:
                 myprintbuffer.append("Empty system {} mask file.".format(mymode.lower()))
-                #save white matrix as mask in question. Dependent on index file dimensions?
-                whitemask = 255*np.ones((index_row[probe_height_name],index_row[probe_width_name]),dtype=np.uint8)
-                sysMaskName = os.path.abspath(os.path.join(subOutRoot,'whitemask.png'))
-                cv2.imwrite(sysMaskName,whitemask)
-#                continue
 
-            rImg,sImg = self.readMasks(refMaskName,sysMaskName,manipFileID,subOutRoot,myprintbuffer)
-
-            #clean up if not html
-            if iswhiteref and not self.html:
-                os.system('rm {}'.format(refMaskName))
-            if iswhitesys and not self.html:
-                os.system('rm {}'.format(sysMaskName))
+            #empty masks are stood in for by white masks of the probe's dimensions, which are not written out
+            rImg,sImg = self.readMasks(refMaskName,sysMaskName,manipFileID,subOutRoot,myprintbuffer,
+                                       dims=(index_row[probe_height_name],index_row[probe_width_name]))
 
             if (rImg is 0) and (sImg is 0):
                 #no masks detected with score-able regions, so set to not scored. Use first if need to modify here.
                 maskRow['Scored'] = 'N'
                 maskRow['OptimumMCC'] = -2 #for reference to filter later
-                self.msg_queue.put("\n".join(myprintbuffer))
+                self.msgs.append("\n".join(myprintbuffer))
                 return maskRow
 
             if (rImg.matrix is None) or (sImg.matrix is None):
                 #Likely this could be FP or FN. Set scores as usual.
                 myprintbuffer.append("The index is at {}.".format(maskRow.name))
-                self.msg_queue.put("\n".join(myprintbuffer))
+                self.msgs.append("\n".join(myprintbuffer))
                 return maskRow
 
             rdims = rImg.get_dims()
@@ -435,54 +644,75 @@ class maskMetricRunner:
 
             #threshold before scoring if sbin >= 0. Otherwise threshold after scoring.
             sbin_name = ''
-            if self.sbin >= -1:
+            if (self.sbin >= -1) and self.save_sub_out:
                 sbin_name = os.path.join(subOutRoot,sImg.name.split('/')[-1][:-4] + '-actual_bin.png')
                 sImg.save(sbin_name,th=self.sbin)
 
-            #save the image separately for html and further review. Use that in the html report
-            myprintbuffer.append("Generating no-score zones...")
-            wts,bns,sns = self.get_ref_no_scores(rImg,manipFileID,erodeKernSize,dilateKernSize,distractionKernSize,kern)
-#            wts,bns,sns = rImg.aggregateNoScore(erodeKernSize,dilateKernSize,distractionKernSize,kern)
-
-            myprintbuffer.append("Generating reference mask with no-score zones...")
-            #do a 3-channel combine with bns and sns for their colors before saving
-            myprintbuffer.append("Setting system optOut no-score zone...")
             pppnspx = self.noScorePixel #TODO: have this be separate from pppns?
             if self.perProbePixelNoScore:
                 pppnspx = maskRow['%sOptOutPixelValue' % mymode]
-            pns=sImg.pixelNoScore(pppnspx)
-            if pns is 1:
-                myprintbuffer.append("Error: {}OptOutPixelValue {} is not recognized.".format(mymode,pppnspx))
-                self.msg_queue.put("\n".join(myprintbuffer))
-                exit(1)
-            wts = cv2.bitwise_and(wts,pns)
+
+            if self.strip_rows > 0:
+                #tiled scoring. The no-score zones are generated strip by strip, and only the histograms are kept.
+                myprintbuffer.append("Generating no-score zones and metrics in strips of {} rows...".format(self.strip_rows))
+                if sImg.strip(0,1).pixelNoScore(pppnspx) is 1:
+                    myprintbuffer.append("Error: {}OptOutPixelValue {} is not recognized.".format(mymode,pppnspx))
+                    self.msgs.append("\n".join(myprintbuffer))
+                    exit(1)
+                wts,bns,sns,pns = 0,0,0,0
+                metricRunner = maskMetrics1(rImg,sImg,wts,self.sbin,engine=self.engine)
+                hists,strip_totals = self.scoreStrips(rImg,sImg,metricRunner,pppnspx,erodeKernSize,dilateKernSize,distractionKernSize,kern)
+                n_scored = hists[1:].sum()
+                n_scored_white = hists[2:].sum()
+            else:
+                #save the image separately for html and further review. Use that in the html report
+                myprintbuffer.append("Generating no-score zones...")
+                wts,bns,sns,maskRow['NoScoreCache'] = self.get_ref_no_scores(rImg,manipFileID,mymode,erodeKernSize,dilateKernSize,distractionKernSize,kern)
+#                wts,bns,sns = rImg.aggregateNoScore(erodeKernSize,dilateKernSize,distractionKernSize,kern)
+
+                myprintbuffer.append("Generating reference mask with no-score zones...")
+                #do a 3-channel combine with bns and sns for their colors before saving
+                myprintbuffer.append("Setting system optOut no-score zone...")
+                pns=sImg.pixelNoScore(pppnspx)
+                if pns is 1:
+                    myprintbuffer.append("Error: {}OptOutPixelValue {} is not recognized.".format(mymode,pppnspx))
+                    self.msgs.append("\n".join(myprintbuffer))
+                    exit(1)
+                wts = cv2.bitwise_and(wts,pns)
+                n_scored = wts.sum()
+                n_scored_white = (cv2.bitwise_and(wts,rImg.bwmat)).sum()
+
             rbin_name = os.path.join(subOutRoot,'-'.join([rImg.name.split('/')[-1][:-4],'bin.png']))
-            if self.html:
-                rImg.save_color_ns(rbin_name,bns,sns,pns)
 
             #if wts allows for nothing to be scored, (i.e. no GT pos), print warning message, but score as usual
-            if (cv2.bitwise_and(wts,rImg.bwmat)).sum() == 0:
+            if n_scored_white == 0:
                 myprintbuffer.append("Warning: No region in the mask {} is score-able.".format(rImg.name))
 
             #if wts covers entire mask, skip it
-            if wts.sum() == 0:
+            if n_scored == 0:
                 myprintbuffer.append("Warning: No-score region covers all of {} {}. Skipping the {}.".format(mymode,manipFileID,mymode))
                 maskRow['Scored'] = 'Y'
                 maskRow['OptimumThreshold'] = np.nan
                 maskRow['AUC'] = np.nan
                 maskRow['EER'] = np.nan
-                self.msg_queue.put("\n".join(myprintbuffer))
+                self.msgs.append("\n".join(myprintbuffer))
 
             #computes differently depending on choice to binarize system output mask
             mets = 0
             mymeas = 0
             threshold = 0
             myprintbuffer.append("Generating metrics...")
-            metricRunner = maskMetrics(rImg,sImg,wts,self.sbin)
-            #not something that needs to be calculated for every iteration of threshold; only needs to be calculated once
-            myprintbuffer.append("Metrics generated. Getting metrics...")
+            if self.strip_rows > 0:
+                thresMets,threshold = metricRunner.runningThresholdsHistograms(hists,rImg.name,sImg.name,strip_totals['BNS'],strip_totals['SNS'],strip_totals['PNS'],myprintbuffer)
+            else:
+                if self.speedup:
+                    metricRunner = maskMetrics(rImg,sImg,wts,self.sbin,engine=self.engine)
+                else:
+                    metricRunner = maskMetrics(rImg,sImg,wts,self.sbin)
+                #not something that needs to be calculated for every iteration of threshold; only needs to be calculated once
+                myprintbuffer.append("Metrics generated. Getting metrics...")
 
-            thresMets,threshold = metricRunner.runningThresholds(rImg,sImg,bns,sns,pns,erodeKernSize,dilateKernSize,distractionKernSize,kern,myprintbuffer)
+                thresMets,threshold = metricRunner.runningThresholds(rImg,sImg,bns,sns,pns,erodeKernSize,dilateKernSize,distractionKernSize,kern,myprintbuffer)
             #thresMets.to_csv(os.path.join(path_or_buf=outputRoot,'{}-thresholds.csv'.format(sImg.name)),index=False) #save to a CSV for reference
             maskRow['OptimumThreshold'] = threshold
             thresMets['TPR'] = 0.
@@ -507,12 +737,12 @@ class maskMetricRunner:
             #and pass to HTML accordingly
             amets = 0
             myameas = 0
+            roc = None
             #TODO: throw this into maskMetrics for nice grouping?
             if np.isnan(threshold):
                 sImg.bwmat = 255*np.ones(sImg.get_dims(),dtype=np.uint8)
                 optbin_name = os.path.join(subOutRoot,'whitemask2.png')
-                if self.html:
-                    sImg.save(optbin_name)
+                optbin = sImg.matrix
                 metrics = thresMets.iloc[0]
                 mets = metrics[['NMM','MCC','BWL1']].to_dict()
                 mets['GWL1'] = np.nan
@@ -538,18 +768,17 @@ class maskMetricRunner:
                 myameas['N'] = mymeas['N']
     
             else:
-                sImg.binarize(threshold) 
-                optbin_name = os.path.join(subOutRoot,sImg.name.split('/')[-1][:-4] + '-bin.png')
+                optbin = 0
                 if self.html:
-                    sImg.save(optbin_name,th=threshold)
+                    optbin = sImg.binarize(threshold)
+                optbin_name = os.path.join(subOutRoot,sImg.name.split('/')[-1][:-4] + '-bin.png')
     
                 metrics = thresMets.query('Threshold=={}'.format(threshold)).iloc[0]
                 mets = metrics[['NMM','MCC','BWL1']].to_dict()
                 mymeas = metrics[['TP','TN','FP','FN','N','BNS','SNS','PNS']].to_dict()
                 rocvalues = thresMets[['TPR','FPR']]
     
-                #insert the ProbeFileID into the manager dict
-                self.thresholds.extend(thresMets['Threshold'].tolist())
+                #keep the threshold table for the maximum metrics
                 self.thresscores[manipFileID] = thresMets
     
                 #append 0 and 1 to beginning and end of tpr and fpr respectively
@@ -568,15 +797,13 @@ class maskMetricRunner:
                 maskRow['EER'] = myeer
         
                 if genROC and self.html:
-                    mydets = detPackage(tpr,
-                                        fpr,
-                                        1,
-                                        0,
-                                        myauc,
-                                        mymeas['TP'] + mymeas['FN'],
-                                        mymeas['FP'] + mymeas['TN'])
-                
-                    myroc = plotROC(mydets,'roc',' '.join(['ROC of',maskRow['ProbeFileID']]),subOutRoot)
+                    #the ROC curve is plotted with the rest of the report
+                    roc = {'tpr':tpr,
+                           'fpr':fpr,
+                           'auc':myauc,
+                           'nTarget':mymeas['TP'] + mymeas['FN'],
+                           'nNonTarget':mymeas['FP'] + mymeas['TN'],
+                           'title':' '.join(['ROC of',maskRow['ProbeFileID']])}
     #            if len(thresMets) == 1:
     #                thresMets='' #to minimize redundancy
     
@@ -584,10 +811,23 @@ class maskMetricRunner:
                     myprintbuffer.append("Setting value for {}...".format(mes))
                     maskRow[''.join(['Pixel',mes])] = mymeas[mes]
     
+                #the Actual metrics are looked up in the threshold table where the evaluator has one
+                tableRunner = metricRunner
+                if not self.speedup:
+                    tableRunner = maskMetrics1(rImg,sImg,wts,self.sbin,engine=self.engine)
+
                 if self.sbin >= -1:
                     #just get scores in one run if threshold is chosen
-                    sImg.binarize(self.sbin)
-                    amets = metricRunner.getMetrics(rImg,sImg,wts,self.sbin,myprintbuffer)
+                    if self.strip_rows > 0:
+                        amets = metricRunner.getMetricsHistograms(hists,self.sbin,myprintbuffer)
+                    elif self.speedup:
+                        amets = metricRunner.getMetricsTable(thresMets,self.sbin,myprintbuffer)
+                        if self.html:
+                            #the binarized mask is still needed for the color mask
+                            sImg.binarize(self.sbin)
+                    else:
+                        sImg.binarize(self.sbin)
+                        amets = metricRunner.getMetrics(rImg,sImg,wts,self.sbin,myprintbuffer)
                     myameas = amets
     #                totalpx = idxW*idxH
     #                weighted_weights = 3 - bns - 2*sns
@@ -607,7 +847,10 @@ class maskMetricRunner:
     #                sbin_name = os.path.join(subOutRoot,sImg.name.split('/')[-1][:-4] + '-bin.png')
     #                sImg.save(sbin_name,th=threshold)
      
-                mets['GWL1'] = maskMetrics.grayscaleWeightedL1(rImg,sImg,wts)
+                if self.strip_rows > 0:
+                    mets['GWL1'] = strip_totals['GWL1']
+                else:
+                    mets['GWL1'] = maskMetrics.grayscaleWeightedL1(rImg,sImg,wts)
                 maskRow['GWL1'] = myround(mets['GWL1'],precision,round_modes)
                 for met in ['NMM','MCC','BWL1']:
                     myprintbuffer.append("Setting value for {}...".format(met))
@@ -623,22 +866,29 @@ class maskMetricRunner:
                     maskRow[''.join(['OptimumPixel',mes])] = mymeas[mes]
                     if self.sbin >= -1:
                         maskRow[''.join(['ActualPixel',mes])] = myameas[mes]
-            #save the thresmets information in the image directory for recordkeeping.
-            thresMets.to_csv(os.path.join(subOutRoot,'thresMets.csv'),sep="|",index=False)
+
+                #Actual metrics at the additional thresholds
+                for th in self.sbin_list:
+                    myprintbuffer.append("Setting Actual metrics at threshold {}...".format(th))
+                    if self.strip_rows > 0:
+                        thmets = metricRunner.getMetricsHistograms(hists,th)
+                    else:
+                        thmets = tableRunner.getMetricsTable(thresMets,th)
+                    for met in ['NMM','MCC','BWL1']:
+                        maskRow['Actual%s_%d' % (met,th)] = myround(thmets[met],precision,round_modes)
+                    for mes in ['TP','TN','FP','FN']:
+                        maskRow['ActualPixel%s_%d' % (mes,th)] = thmets[mes]
+            #keep the thresmets information for recordkeeping. It is saved with that of the other rows in saveThresholdTables
+            if self.artifacts != 'none':
+                self.threstables[maskRow.name] = thresMets
             manipFileName = maskRow['%sFileName' % mymode]
-            maniImgName = os.path.join(self.refDir,manipFileName)
 
             myprintbuffer.append("Metrics computed.")
             maskRow['Scored'] = 'Y'
 
-            #generate the HTML report
-            #TODO: ideally want the HTML report to be in a separate module
+            #save the data for the HTML report. The report itself is rendered apart from scoring, by maskMetricsRender
             if self.html:
-                colordirs = self.aggregateColorMask(rImg,sImg,bns,sns,pns,kern,erodeKernSize,manipFileID,maniImgName,subOutRoot,self.colordict)
-                baseFileName = maskRow['BaseFileName']
-                myprintbuffer.append("Generating aggregate color mask for HTML report...")
-                colMaskName=colordirs['mask']
-                aggImgName=colordirs['agg']
+                colMaskName,aggImgName = colorMaskNames(sImg.name,subOutRoot,self.usejpeg2000)
                 maskRow['ColMaskFileName'] = colMaskName
                 maskRow['AggMaskFileName'] = aggImgName
 
@@ -656,20 +906,19 @@ class maskMetricRunner:
                 mymeas['PixelBNS'] = mymeas.pop('BNS')
                 mymeas['PixelSNS'] = mymeas.pop('SNS')
                 mymeas['PixelPNS'] = mymeas.pop('PNS')
-    
-                myprintbuffer.append("Generating HTML report...")
-                #TODO: trim the arguments here? Just use threshold and thresMets, at min len 1? Remove mets and mymeas since we have threshold to index.
-                self.manipReport(task,subOutRoot,manipFileID,manipFileName,baseFileName,rImg,sImg,rbin_name,sbinmaskname,smask_threshold,thresMets,bns,sns,pns,mets,mymeas,colMaskName,aggImgName,myprintbuffer)
-            self.msg_queue.put("\n".join(myprintbuffer))
+
+                myprintbuffer.append("Saving data for the HTML report...")
+                maskRow['RenderData'] = os.path.join(subOutRoot,render_data_name)
+                self.saveReportData(maskRow,rImg,sImg,iswhitesys,bns,sns,pns,optbin,rbin_name,optbin_name,sbinmaskname,smask_threshold,thresMets,mets,mymeas,roc)
+            self.msgs.append("\n".join(myprintbuffer))
             return maskRow
         except:
             exc_type,exc_obj,exc_tb = sys.exc_info()
             print("{}FileName {} for {}FileID {} encountered exception {} at line {}.".format(mymode,refMaskName,mymode,manipFileID,exc_type,exc_tb.tb_lineno))
             self.errlist.append(exc_type)
             if not debug_off:
-                self.msg_queue.put("\n".join(myprintbuffer))
-                while not self.msg_queue.empty():
-                    msg = self.msg_queue.get()
+                self.msgs.append("\n".join(myprintbuffer))
+                for msg in self.msgs:
                     print("*"*30) #TODO: tentative
                     print(msg)
                 for e in self.errlist:
@@ -695,17 +944,22 @@ class maskMetricRunner:
             #case for one processor for efficient debugging and to eliminate overhead when running
             maskData = maskData.apply(self.scoreOneMask,axis=1,reduce=False)
         else:
-            #split maskData into array of dataframes based on number of processors (and rows in the file)
-            chunksize = nrow//processors
-            maskDataS = [[self,maskData[i:(i+chunksize)]] for i in range(0,nrow,chunksize)]
+            #score each row as its own task, handing out the largest masks first to whichever processor is free
+            maskDataS = [maskData.iloc[[i]] for i in range(nrow)]
+            mask_sizes = self.get_mask_sizes(maskData[self.manip_file_id_col].tolist())
     
-            p = multiprocessing.Pool(processes=processors)
-            maskDataS = p.map(scoreMask,maskDataS)
-            p.close()
-            p.join()
+            global shared_runner
+            shared_runner = self
+            results = imap_largest_first(scoreMask,maskDataS,mask_sizes,processors)
+            for _,thresscores,threstables,msgs,errs,fs_counts in results:
+                self.thresscores.update(thresscores)
+                self.threstables.update(threstables)
+                self.msgs.extend(msgs)
+                self.errlist.extend(errs)
+                fileOps.add_counts(fs_counts)
     
             #re-merge in the order found and return
-            maskData = pd.concat(maskDataS)
+            maskData = pd.concat([r[0] for r in results])
 
         if isinstance(maskData,pd.Series):
             maskData = maskData.to_frame().transpose()
@@ -716,43 +970,57 @@ class maskMetricRunner:
         return maskData
 
     def preprocess_threshold_metrics(self):
-        probe_thres_mets = self.thresscores
-        probe_thres_mets_new = {}
+        """
+        * Description: lays out the threshold tables of the probes as dense arrays, one row per probe and one column
+                       per threshold found across all probes (at most 257 for 8-bit system masks, counting -1).
+                       A probe's metrics at a threshold absent from its own table are those of the largest threshold
+                       below it in the table; thresholds below all of them take the values of an all-black mask
+        * Output:
+        *     probes: the list of probes in the order of the rows
+        *     mets: a dictionary of the (number of probes) x (number of thresholds) array of each metric
+        """
+        probes = [p for p in self.probelist if self.thresscores[p].shape[0] > 0] #a safeguard
+        if len(probes) == 0:
+            return probes,{}
         all_thresholds = np.array(self.thresholds)
-#        ['Threshold','NMM','MCC','BWL1','TP','TN','FP','FN','BNS','SNS','PNS','N']
-        for p in self.probelist:
-            thres_mets_df = probe_thres_mets[p]
-            if thres_mets_df.shape[0] == 0: #a safeguard
-                continue
-            partial_thresholds = thres_mets_df['Threshold']
-            sample_row = thres_mets_df.iloc[0]
-            filled_index = np.digitize(all_thresholds,partial_thresholds,right=False) - 1
-            black_rows = filled_index == -1
-            black_thresholds = all_thresholds[black_rows]
-
-            gt_pos = sample_row['TP'] + sample_row['FN']
-            gt_neg = sample_row['FP'] + sample_row['TN']
-
-            thres_mets_new_df = thres_mets_df.iloc[filled_index]
-            thres_mets_new_df.at[black_thresholds,['TP','FP','TN','FN']] = gt_pos,gt_neg,0,0
-            if sample_row['N'] == 0:
-                thres_mets_new_df.at[:,['NMM','MCC','BWL1']] = np.nan
-            else:
-                if gt_pos == 0:
-                    thres_mets_new_df.at[black_thresholds,['NMM','MCC','BWL1']] = np.nan,0,float(gt_neg)/sample_row['N']
-                else:
-                    thres_mets_new_df.at[black_thresholds,['NMM','MCC','BWL1']] = max([float(gt_pos - gt_neg)/gt_pos,-1]),0,float(gt_neg)/sample_row['N']
-            
-            if gt_pos == 0:
-                thres_mets_new_df['TPR'] = np.nan
-            if gt_neg == 0:
-                thres_mets_new_df['FPR'] = np.nan
-
-            #reassign the thresholds and index to all_thresholds
-            thres_mets_new_df.index = all_thresholds
-            probe_thres_mets_new[p] = thres_mets_new_df
-
-        return probe_thres_mets_new
+        tables = [self.thresscores[p] for p in probes]
+        n_rows = np.array([t.shape[0] for t in tables])
+        first_rows = np.cumsum(n_rows) - n_rows
+        thres_mets = pd.concat(tables,ignore_index=True)
+
+        #mark the row of each probe at each of its own thresholds, and carry it forward to the thresholds that follow
+        row_index = -np.ones((len(probes),len(all_thresholds)),dtype=np.int64)
+        row_index[np.repeat(np.arange(len(probes)),n_rows),np.searchsorted(all_thresholds,thres_mets['Threshold'].values)] = np.arange(thres_mets.shape[0])
+        row_index = np.maximum.accumulate(row_index,axis=1)
+        black_rows = row_index == -1
+        row_index[black_rows] = np.repeat(first_rows,len(all_thresholds)).reshape(row_index.shape)[black_rows]
+
+        mets = {}
+        for met in ['TP','TN','FP','FN','N','NMM','MCC','BWL1','TPR','FPR']:
+            mets[met] = thres_mets[met].values[row_index]
+        gt_pos = (mets['TP'][:,0] + mets['FN'][:,0])[:,np.newaxis]
+        gt_neg = (mets['FP'][:,0] + mets['TN'][:,0])[:,np.newaxis]
+        N = mets['N'][:,0][:,np.newaxis]
+
+        if black_rows.any():
+            mets['TP'] = np.where(black_rows,gt_pos,mets['TP'])
+            mets['FP'] = np.where(black_rows,gt_neg,mets['FP'])
+            mets['TN'] = np.where(black_rows,0,mets['TN'])
+            mets['FN'] = np.where(black_rows,0,mets['FN'])
+            with np.errstate(divide='ignore',invalid='ignore'):
+                black_nmm = np.where(gt_pos == 0,np.nan,np.maximum((gt_pos - gt_neg).astype(float)/gt_pos,-1))
+                black_bwl1 = gt_neg.astype(float)/N
+            mets['NMM'] = np.where(black_rows,black_nmm,mets['NMM'])
+            mets['MCC'] = np.where(black_rows,0,mets['MCC'])
+            mets['BWL1'] = np.where(black_rows,black_bwl1,mets['BWL1'])
+
+        no_score = np.broadcast_to(N == 0,row_index.shape)
+        for met in ['NMM','MCC','BWL1']:
+            mets[met] = np.where(no_score,np.nan,mets[met])
+        mets['TPR'] = np.where(np.broadcast_to(gt_pos == 0,row_index.shape),np.nan,mets['TPR'])
+        mets['FPR'] = np.where(np.broadcast_to(gt_neg == 0,row_index.shape),np.nan,mets['FPR'])
+
+        return probes,mets
 
     def compute_pixel_probe_ROC(self,roc_values):
         aucs = {}
@@ -834,20 +1102,31 @@ class maskMetricRunner:
         self.probelist = self.thresscores.keys()
         
         #preprocess and then proceed to compute 
-        probe_thres_mets_preprocess = self.preprocess_threshold_metrics()
+        probes,probe_thres_mets = self.preprocess_threshold_metrics()
         #if nothing in here, cease further computation
-        if len(probe_thres_mets_preprocess) == 0:
+        if len(probes) == 0:
             for col in max_cols:
                 scoredf[col] = np.nan
             for pfx in ['Pixel','Mask']:
                 auc_name = ''.join([pfx,'AverageAUC'])
                 scoredf[auc_name] = np.nan
             return scoredf
-        probe_thres_mets_agg = pd.concat(probe_thres_mets_preprocess.values(),keys=probe_thres_mets_preprocess.keys(),names=[probe_id_field,'Threshold'])
-        thres_mets_sum = probe_thres_mets_agg.sum(level=[1])
+        #sum across the probes in probe order, skipping the probes without a value. All missing sums to nan
+        def sum_probes(mets):
+            if mets.dtype.kind != 'f':
+                return mets.sum(axis=0)
+            mets_sum = np.nansum(mets,axis=0)
+            mets_sum[np.isnan(mets).all(axis=0)] = np.nan
+            return mets_sum
+        def mean_probes(mets):
+            with np.errstate(invalid='ignore'):
+                return sum_probes(mets)/(~np.isnan(mets)).sum(axis=0)
+
+        thres_mets_sum = pd.DataFrame(dict([(met,sum_probes(probe_thres_mets[met])) for met in ['TP','TN','FP','FN','MCC']]),index=self.thresholds)
         thres_mets_sum['PixelTPR'] = thres_mets_sum['TP']/(thres_mets_sum['TP'] + thres_mets_sum['FN'])
         thres_mets_sum['PixelFPR'] = thres_mets_sum['FP']/(thres_mets_sum['FP'] + thres_mets_sum['TN'])
-        thres_mets_sum[['ProbeTPR','ProbeFPR']] = probe_thres_mets_agg[['TPR','FPR']].mean(level=[1])
+        thres_mets_sum['ProbeTPR'] = mean_probes(probe_thres_mets['TPR'])
+        thres_mets_sum['ProbeFPR'] = mean_probes(probe_thres_mets['FPR'])
         maxThreshold = thres_mets_sum['MCC'].idxmax()
 
 #        roc_values = self.parallelize(roc_values,self.runROCvals,scoreAvgROCPerProc,1,top_procs=top_procs,top_procs_apply=top_procs_apply)
@@ -862,18 +1141,15 @@ class maskMetricRunner:
         if (self.sbin >= -1) and (maxThreshold > -10):
             #with the maxThreshold, set MaximumMCC for everything. Join that dataframe with this one
             scoredf['MaximumThreshold'] = maxThreshold
-            #access the probe_thres_mets_agg for the threshold
-            maxMCCdf = probe_thres_mets_agg.xs(maxThreshold,level=1)
-            maxMCCdf[probe_id_field] = maxMCCdf.index
-            maxMCCdf.drop_duplicates(inplace=True)
+            #access the column of the probe threshold metrics for the threshold
+            t_index = self.thresholds.index(maxThreshold)
+            maxMCCdf = pd.DataFrame({probe_id_field:probes})
 #            maxMCCdf = self.maxmets[maxThreshold]
-            maxMCCdf.rename(columns={'NMM':'MaximumNMM',
-                                     'MCC':'MaximumMCC',
-                                     'BWL1':'MaximumBWL1',
-                                     'TP':'MaximumPixelTP',
-                                     'TN':'MaximumPixelTN',
-                                     'FP':'MaximumPixelFP',
-                                     'FN':'MaximumPixelFN'},inplace=True)
+            for met in ['NMM','MCC','BWL1']:
+                maxMCCdf[''.join(['Maximum',met])] = probe_thres_mets[met][:,t_index]
+            for mes in ['TP','TN','FP','FN']:
+                maxMCCdf[''.join(['MaximumPixel',mes])] = probe_thres_mets[mes][:,t_index]
+            maxMCCdf.drop_duplicates(inplace=True)
             scoredf = scoredf.merge(maxMCCdf[[probe_id_field,'MaximumNMM','MaximumMCC','MaximumBWL1','MaximumPixelTP','MaximumPixelTN','MaximumPixelFP','MaximumPixelFN']],on=[probe_id_field],how='left')
         else:
             for col in max_cols:
@@ -881,6 +1157,111 @@ class maskMetricRunner:
 
         return scoredf
 
+    def saveThresholdTables(self,path):
+        """
+        * Description: saves the threshold tables of all of the scored rows in a single compressed file of columns,
+                       in place of a file for each row. Each row of each table is labeled with the IDs of the row
+                       it was scored for, so that a probe's table is made up of the entries with its ProbeFileID
+        * Inputs:
+        *     path: the name of the file to save the tables in, ending in .npz
+        """
+        id_cols = ['ProbeFileID']
+        if self.mode != 0:
+            id_cols.append('DonorFileID')
+        cols = ['Threshold','TP','TN','FP','FN','N']
+        rows = [i for i in self.maskData.index if i in self.threstables]
+        if self.artifacts == 'full' and (len(rows) > 0):
+            cols = list(self.threstables[rows[0]])
+
+        tables = [self.threstables[i] for i in rows]
+        columns = {}
+        for c in id_cols:
+            columns[c] = np.array([self.maskData.at[i,c] for i,t in zip(rows,tables) for _ in range(t.shape[0])],dtype=str)
+        for c in cols:
+            if len(tables) == 0:
+                columns[c] = np.array([])
+                continue
+            columns[c] = np.concatenate([t[c].values for t in tables])
+            if columns[c].dtype == object:
+                #mask names. Saved as strings so that the file can be loaded without unpickling
+                columns[c] = columns[c].astype(str)
+        np.savez_compressed(path,**columns)
+
+    def saveReportData(self,maskRow,rImg,sImg,iswhitesys,bns,sns,pns,optbin,rbin_name,optbin_name,sbin_name,sys_threshold,thresMets,mets,confmeasures,roc):
+        """
+        * Description: saves what the HTML report of a probe is rendered from in the file named in maskRow['RenderData'],
+                       in place of rendering the report while scoring. The reports are rendered by maskMetricsRender
+        * Inputs:
+        *     maskRow: the scored row
+        *     rImg: the reference mask object, binarized
+        *     sImg: the system output mask object, binarized for the aggregate mask
+        *     iswhitesys: whether the system output mask is empty, and stood in for by a white mask
+        *     bns: the boundary no-score zone
+        *     sns: the unselected no-score zone
+        *     pns: the pixel no-score zone, or 0 if there is none
+        *     optbin: the system output mask binarized at the optimum threshold
+        *     rbin_name: the name of the reference mask image with its no-score zones
+        *     optbin_name: the name of the system output mask image binarized at the optimum threshold
+        *     sbin_name: the name of the binarized system output mask image displayed in the report
+        *     sys_threshold: the threshold the displayed system output mask is binarized at
+        *     thresMets: the table of thresholds for the image and the scores they yielded for that threshold
+        *     mets: the dictionary of mask scores
+        *     confmeasures: truth table measures evaluated between the reference and system output masks
+        *     roc: a dictionary of the TPR, FPR, AUC, and title of the ROC curve of the probe, or None if there is none
+        """
+        mymode = self.mymode
+        manipFileID = maskRow['%sFileID' % mymode]
+        cache_dir = self.cache_dir
+        if cache_dir:
+            cache_dir = os.path.abspath(cache_dir)
+        params = renderParams(task=self.task,
+                              mode=self.mode,
+                              refDir=os.path.abspath(self.refDir),
+                              rbin=self.rbin,
+                              sbin=self.sbin,
+                              usejpeg2000=self.usejpeg2000,
+                              cache_dir=cache_dir,
+                              kern=self.kern,
+                              erodeKernSize=self.erodeKernSize,
+                              colordict=self.colordict)
+
+        #the journal table of the report
+        journal = 0
+        if (self.mode == 0) and (self.journalData is not 0):
+            journal = self.journalData.query("ProbeFileID=='{}'".format(manipFileID))
+
+        #the white mask standing in for an empty system output mask is written with the report
+        sysMaskName = os.path.abspath(sImg.name)
+        if iswhitesys:
+            sysMaskName = ''
+
+        meta = {'params':params,
+                'row':maskRow.to_dict(),
+                'dims':rImg.get_dims(),
+                'probeFileID':manipFileID,
+                'probeFileName':maskRow['%sFileName' % mymode],
+                'baseFileName':maskRow['BaseFileName'],
+                'refMaskName':os.path.abspath(rImg.name),
+                'refJournal':self.get_journal_rows(manipFileID,mymode),
+                'journal':journal,
+                'sysMaskName':sysMaskName,
+                'rbinName':os.path.basename(rbin_name),
+                'optbinName':os.path.basename(optbin_name),
+                'sbinName':os.path.basename(sbin_name),
+                'sysThreshold':sys_threshold,
+                'thresMets':thresMets,
+                'mets':mets,
+                'confMeasures':confmeasures,
+                'roc':roc}
+        mats = {'refBW':rImg.bwmat,
+                'bns':bns,
+                'sns':sns,
+                'optBin':optbin,
+                'sysBW':sImg.bwmat}
+        if pns is not 0:
+            mats['pns'] = pns
+        saveRenderData(maskRow['RenderData'],meta,**mats)
+
     def getMetricList(self,
                       outputRoot,
                       params):
@@ -900,9 +1281,24 @@ class maskMetricRunner:
                          (DonorOptOutPixelValue for splice)
         *         kernel: kernel shape to be used
         *         verbose: permit printout from metrics
-        *         html: whether or not to generate an HTML report
+        *         html: whether or not to save the data for the HTML reports. The files saved are listed in self.render_data
+                        afterwards, for maskMetricsRender.renderReports to render the reports from
         *         precision: the number of digits to round the computed metrics to.
         *         processors: the number of processors to use to score the maskss.
+        *         strip_rows: the number of rows in each horizontal strip when scoring the masks in strips.
+                              0 scores each mask in its entirety
+        *         sbin_list: a list of additional thresholds to compute the Actual metrics at, looked up from the
+                             table of all thresholds. Each threshold T adds the columns ActualNMM_T, ActualMCC_T,
+                             ActualBWL1_T, and ActualPixelTP_T through ActualPixelFN_T
+        *         artifacts: the per-probe output kept besides the scores. 'none' keeps nothing; 'summary' keeps the
+                             confusion measures at each threshold of each probe; 'full' keeps the whole threshold
+                             tables, and saves the system output masks binarized at sbin in per-probe subdirectories.
+                             The threshold tables are saved with saveThresholdTables. The HTML report makes its own
+                             per-probe subdirectories regardless
+        *         cache_dir: the directory to cache reference mask data in, including the no-score zones. None to not cache
+        *         cache_size: the maximum size in megabytes of the cached no-score zones. 0 for no limit
+        *         incremental: store the scores of each probe in cache_dir, and reuse them for the probes whose masks, input row,
+                                   and scoring parameters are unchanged. Not done where per-probe files are saved
         * Output:
         *     df: a dataframe of the computed metrics
         """
@@ -921,6 +1317,18 @@ class maskMetricRunner:
         global debug_off
         debug_off = params.debug_off
         self.cache_dir = params.cache_dir
+        self.ns_cache = 0
+        if self.cache_dir:
+            self.ns_cache = noScoreCache(os.path.join(self.cache_dir,'noscore'),params.cache_size*(1 << 20))
+        self.strip_rows = params.strip_rows
+        self.sbin_list = params.sbin_list
+        self.artifacts = params.artifacts
+        self.save_sub_out = params.html or ((self.artifacts == 'full') and (self.sbin >= -1))
+        #the files saved per probe are only written for the probes scored again, so scores are only reused without them
+        self.score_store = 0
+        if params.incremental and self.cache_dir and not self.save_sub_out:
+            self.score_store = scoreStore(os.path.join(self.cache_dir,'scores'),params.cache_size*(1 << 20))
+        self.input_cols = self.maskData.columns.values.tolist()
 
         df_cols = self.maskData.columns.values.tolist()        
         self.optout_mode = 0
@@ -975,6 +1383,9 @@ class maskMetricRunner:
                     'OptimumPixelTP','OptimumPixelTN','OptimumPixelFP','OptimumPixelFN','OptimumThreshold',
                     'ActualPixelTP','ActualPixelTN','ActualPixelFP','ActualPixelFN','ActualThreshold',
                     'PixelN','PixelBNS','PixelSNS','PixelPNS']
+        for th in self.sbin_list:
+            met_cols.extend(['Actual%s_%d' % (met,th) for met in ['NMM','MCC','BWL1']])
+            met_cols.extend(['ActualPixel%s_%d' % (mes,th) for mes in ['TP','TN','FP','FN']])
         
 #        met_mat = np.zeros((nrow,len(met_cols)))
 #        met_mat[:,[0,14]] = -1.
@@ -987,6 +1398,9 @@ class maskMetricRunner:
         
         df['ColMaskFileName'] = ''
         df['AggMaskFileName'] = ''
+        df['NoScoreCache'] = ''
+        df['RenderData'] = ''
+        df['ScoreStore'] = ''
 
         task = self.maskData['TaskID'].iloc[0] #should all be the same for one file
 #        ilog = open('index_log.txt','w+')
@@ -1007,14 +1421,24 @@ class maskMetricRunner:
         self.truncate = params.truncate
         self.outputRoot = outputRoot
 
-        #shared object with multiprocessing manager
-        manager = multiprocessing.Manager()
-        self.thresscores = manager.dict()
-        self.thresholds = manager.list()
-        self.msg_queue = manager.Queue()
+        #per-probe threshold tables and printout. Worker processes return theirs along with the scored rows
+        self.thresscores = {}
+        self.threstables = {}
+        self.msgs = []
 
         #************ Scoring begins here ************
-        df = self.scoreMasks(df,processors)
+        #reference masks shared by several rows are read once, up front, where the full no-score zones are not needed otherwise
+        self.ref_store = 0
+        staged_statuses = []
+        try:
+            self.makeSubOutRoots(df)
+            if not html and (self.strip_rows == 0):
+                staged_statuses = self.stageRefMasks(df,processors)
+            df = self.scoreMasks(df,processors)
+        finally:
+            if self.ref_store is not 0:
+                self.ref_store.close()
+                self.ref_store = 0
 #        for i,row in self.maskData.iterrows():
 #            if verbose: print("Scoring {} mask {} out of {}...".format(mymode.lower(),i+1,nrow))
 #            scoreMask(row)
@@ -1024,8 +1448,21 @@ class maskMetricRunner:
             exit(1)
 #        ilog.close()
 
-        templist = self.thresholds
-        self.thresholds = list(sorted(set(templist)))
+        #each process only evicts for its own entries, so bring the caches back within their bounds once all are written
+        if self.ns_cache is not 0:
+            self.ns_cache.evict(1)
+            cache_statuses = df['NoScoreCache'].tolist() + staged_statuses
+            if verbose: print("No-score cache {}: {} hits, {} misses.".format(self.ns_cache.cache_dir,cache_statuses.count('hit'),cache_statuses.count('miss')))
+        if self.score_store is not 0:
+            self.score_store.evict(1)
+            store_statuses = df['ScoreStore'].tolist()
+            if verbose: print("Score store {}: {} reused, {} scored.".format(self.score_store.cache_dir,store_statuses.count('reused'),store_statuses.count('scored')))
+        elif params.incremental and self.save_sub_out:
+            print("Warning: stored scores are not reused when the per-probe files are saved. All probes were scored.")
+
+        self.render_data = df.loc[df['RenderData'] != '','RenderData'].tolist()
+
+        self.thresholds = list(sorted(set([t for thresMets in self.thresscores.values() for t in thresMets['Threshold'].tolist()])))
         df = self.scoreMaxMetrics(df)
 
         last_cols = [self.manip_file_id_col,'%sFileName' % mymode,'Scored',
@@ -1061,634 +1498,15 @@ class maskMetricRunner:
                      'PixelN',
                      'PixelBNS',
                      'PixelSNS',
-                     'PixelPNS',
-                     'ColMaskFileName','AggMaskFileName']
+                     'PixelPNS']
+        for th in self.sbin_list:
+            last_cols.extend(['Actual%s_%d' % (met,th) for met in ['NMM','MCC','BWL1']])
+            last_cols.extend(['ActualPixel%s_%d' % (mes,th) for mes in ['TP','TN','FP','FN']])
+        last_cols.extend(['ColMaskFileName','AggMaskFileName'])
 
         if self.verbose:
-            while not self.msg_queue.empty():
-                msg = self.msg_queue.get()
+            for msg in self.msgs:
                 print("="*30)
                 print(msg)
 
         return df[last_cols].drop('%sFileName' % mymode,1)
-
-    #TODO: drop this into a maskMetricsRender.py object later with renderParams object. Ideally would like to generate reports in a separate loop at the end of computations.
-    def num2hex(self,color):
-        """
-        * Description: this function converts one BGR color to a hex string at a time
-        * Inputs:
-        *     color: a list of three integers from 0 to 255 denoting a color code
-        * Outputs:
-        *     hexcolor: the hexadecimal color code corresponding to that color
-        """
-
-        myb = hex(color[0])[2:]
-        myg = hex(color[1])[2:]
-        myr = hex(color[2])[2:]
-        if len(myb)==1:
-            myb = '0' + myb 
-        if len(myg)==1:
-            myg = '0' + myg 
-        if len(myr)==1:
-            myr = '0' + myr
-        hexcolor = (''.join([myr,myg,myb])).upper()
-        return hexcolor
-
-    def nums2hex(self,colors):
-        """
-        * Description: this function outputs the hexadecimal strings for a dictionary of colors for the HTML report
-        * Inputs:
-        *     colors: list of strings corresponding to the colors in self.colordict
-        * Outputs:
-        *     hexcolors: dictionary of hexadecimal color codes
-        """
-        hexcolors = {}
-        for c in colors:
-            mybgr = self.colordict[c]
-            hexcolors[c] = self.num2hex(mybgr)
-        return hexcolors
-    
-    def manipReport(self,task,outputRoot,probeFileID,maniImageFName,baseImageFName,rImg,sImg,rbin_name,sbin_name,sys_threshold,thresMets,b_weights,s_weights,p_weights,metrics,confmeasures,colMaskName,aggImgName,myprintbuffer):
-        """
-        * Description: this function assembles the HTML report for the manipulated image and is meant to be used solely by getMetricList
-        * Inputs:
-        *     task: the task over which the scorer is run
-        *     outputRoot: the directory to deposit the weight image and the HTML file
-        *     probeFileID: the ID of the image to be considered
-        *     maniImageFName: the manipulated probe file name, relative to the reference directory (self.refDir) 
-        *     baseImageFName: the base file name of the probe, relative to the reference directory (self.refDir) 
-        *     rImg: the unmodified reference image used for the mask evaluation
-        *     sImg: the unmodified system output image used for the mask evaluation
-        *     rbin_name: the name of the binarized reference image used for the mask evaluation
-        *     sbin_name: the name of the binarized system output image used for the mask evaluation
-        *     sys_threshold: the threshold used to binarize the system output mask
-        *     thresMets: the table of thresholds for the image and the scores they yielded for that threshold
-        *     b_weights: the weighted matrix of the no-score zones of the targeted regions
-        *     s_weights: the weighted matrix of the no-score zones generated from the non-target regions
-        *     p_weights: the weighted matrix of the no-score zones generated from pixels of a select value in the original mask
-        *     metrics: the dictionary of mask scores
-        *     confmeasures: truth table measures evaluated between the reference and system output masks
-        *     colMaskName: the aggregate mask image of the ground truth, system output, and no-score regions
-                           for the HTML report
-        *     aggImgName: the above colored mask superimposed on a grayscale of the reference image
-        *     myprintbuffer: buffer to append printout for atomic printout
-        """
-        if not os.path.isdir(outputRoot):
-            os.system('mkdir ' + outputRoot)
-
-        #compute the weights
-        bwts = np.uint8(b_weights)
-        swts = np.uint8(s_weights)
-
-        rImg_name = rImg.name
-        sImg_name = sImg.name
-        sysBase = os.path.basename(sImg_name)[:-4]
-        weightFName = '-'.join([sysBase,'weights.png'])
-        weightpath = os.path.join(outputRoot,weightFName)
-
-        myprintbuffer.append("Generating weights image...")
-        mywts = cv2.bitwise_and(b_weights,s_weights)
-
-        dims = bwts.shape
-        colwts = 255*np.ones((dims[0],dims[1],3),dtype=np.uint8)
-        #combine the colors for bwts and swts to colwts
-        colwts[bwts==0] = self.colordict['yellow']
-        colwts[swts==0] = self.colordict['pink']
-
-        totalpns = 0
-        if p_weights is not 0:
-            colwts[p_weights==0] = self.colordict['purple']
-            totalpns = int(np.sum(p_weights==0))
-            mywts = cv2.bitwise_and(p_weights,mywts)
-
-        totalns = (mywts == 0).sum()
-
-        myprintbuffer.append("Saving weights image...")
-        cv2.imwrite(weightpath,colwts)
-
-        mPath = os.path.join(self.refDir,maniImageFName)
-        allshapes=min(dims[1],640) #limit on width for readability of the report
-
-        # generate HTML files
-        myprintbuffer.append("Reading HTML template...")
-        #TODO: save as variable in some other file that we can reformat with .format()?
-        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),"../tools/MaskScorer/html_template.txt"), 'r') as f:
-            htmlstr = Template(f.read())
-
-        #dictionary of colors corresponding to confusion measures
-        cols = {'tpcol':'green','fpcol':'red','tncol':'white','fncol':'blue','bnscol':'yellow','snscol':'pink','pnscol':'purple'}
-        hexs = self.nums2hex(cols.values()) #get hex strings from the BGR cols
-
-        jtable = ''
-        mymode = 'Probe'
-        if self.mode == 2:
-            mymode = 'Donor'
-        elif self.mode == 0: #TODO: temporary measure until we get splice sorted out, originally self.mode != 2
-            evalcol='Evaluated'
-            if self.mode == 1:
-                evalcol='ProbeEvaluated'
-
-            myprintbuffer.append("Composing journal table...")
-#            journalID = self.joinData.query("{}FileID=='{}'".format(mymode,probeFileID))['JournalName'].iloc[0]
-            journalHeaders = list(self.journalData)
-            toSequence = 'Sequence' in journalHeaders
-
-            journalkeys = ['Operation','Purpose','Color',evalcol]
-            if self.usejpeg2000:
-                journalkeys.insert(0,'BitPlane')
-            if toSequence:
-                journalkeys.insert(0,'Sequence')
-
-            jdata = self.journalData.query("ProbeFileID=='{}' & Color!=''".format(probeFileID))[journalkeys] #("JournalName=='{}'".format(journalID))[['Operation','Purpose','Color',evalcol]] #NOTE: as long as Purpose is in there. It is otherwise dispensible.
-            if toSequence:
-                jdata = jdata.sort_values("Sequence",ascending=False)
-            #jdata.loc[pd.isnull(jdata['Purpose']),'Purpose'] = '' #make NaN Purposes empty string
-
-            #make those color cells empty with only the color as demonstration
-            jDataColors = list(jdata['Color'])
-            jDataColArrays = [x[::-1] for x in [c.split(' ') for c in jDataColors]]
-            jDataColArrays = [[int(x) for x in c] for c in jDataColArrays]
-            jDataHex = pd.Series([self.num2hex(c) for c in jDataColArrays],index=jdata.index) #match the indices
-            jdata['Color'] = 'td bgcolor="#' + jDataHex + '"btd'
-            jtable = jdata.to_html(index=False)
-            jtable = jtable.replace('<td>td','<td').replace('btd','>')
-        
-        #generate the HTML for the metrics table here. Instead of reading in a template. Use a prebuilt variable of strings instead in a separate package.
-        met_table = self.gen_metrics_table(metrics)
-                
-        optidx = thresMets['MCC'].idxmax()
-
-        if not np.isnan(optidx):
-            optT = int(thresMets.loc[optidx]['Threshold'])
-    
-            met_table_prefix = 'Optimum Threshold: {}<br>'.format(optT)
-            if self.sbin >= -1:
-                met_table_prefix = "<ul><li><b>Optimum Threshold</b>: {}</li><li><b>Actual Threshold</b>: {}</li></ul><br>".format(optT,self.sbin)
-            met_table = ''.join([met_table_prefix,met_table])
-
-        myprintbuffer.append("Computing pixel count...") 
-        totalpx = np.sum(mywts==1)
-        allpx = dims[0]*dims[1]
-        totalbns = confmeasures['PixelBNS'] #np.sum(bwts==0)
-        totalsns = confmeasures['PixelSNS'] #np.sum(swts==0)
-
-        perctp="nan"
-        percfp="nan"
-        perctn="nan"
-        percfn="nan"
-        percbns="nan"
-        percsns="nan"
-        percpns="nan"
-        perctns="nan"
-
-        if totalpx > 0:
-            perctp='{0:.3f}'.format(float(confmeasures['OptimumPixelTP'])/totalpx)
-            percfp='{0:.3f}'.format(float(confmeasures['OptimumPixelFP'])/totalpx)
-            perctn='{0:.3f}'.format(float(confmeasures['OptimumPixelTN'])/totalpx)
-            percfn='{0:.3f}'.format(float(confmeasures['OptimumPixelFN'])/totalpx)
-
-        if allpx > 0: #standard protection
-            percbns='{0:.3f}'.format(float(totalbns)/allpx)
-            percsns='{0:.3f}'.format(float(totalsns)/allpx)
-            percpns='{0:.3f}'.format(float(totalpns)/allpx)
-            perctns='{0:.3f}'.format(float(totalns)/allpx)
-
-        #generate table for confusion measures
-        conf_measures = {}
-        for m in ['TP','FP','TN','FN']:
-            m_name = 'OptimumPixel%s' % m 
-            conf_measures[m_name] = int(confmeasures[m_name])
-            if self.sbin >= -1:
-                am_name = 'ActualPixel%s' % m
-                conf_measures[am_name] = int(confmeasures[am_name])
-        conf_measures['TotalPixels'] = totalpx
-
-        conf_table = self.gen_confusion_table(conf_measures)
-        
-        #recolor the conf_table measures
-        conf_table = (conf_table.replace("TP: green",'<font style="color:#{}">TP: green</font>'.format(hexs[cols['tpcol']]))
-                                .replace("FP: red",'<font style="color:#{}">FP: red</font>'.format(hexs[cols['fpcol']]))
-                                .replace("TN: white",'<font style="color:#{}">TN: white</font>'.format(hexs[cols['tncol']]))
-                                .replace("FN: blue",'<font style="color:#{}">FN: blue</font>'.format(hexs[cols['fncol']])))
-
-        thresString = ''
-        plt_width = 540 #NOTE: custom value for plot sizes
-
-        if len(thresMets.dropna()) > 1:
-            myprintbuffer.append("Generating MCC per threshold graph...")
-            #plot MCC
-            try:
-                import matplotlib
-                matplotlib.use('Agg')
-                import matplotlib.pyplot as plt
-                plt.plot(thresMets['Threshold'],thresMets['MCC'],'bo',thresMets['Threshold'],thresMets['MCC'],'k')
-                #plot cyan point for supremum, red point for actual if sbin >= 0, and legend with two or three as appropriate
-                optidx = thresMets['MCC'].idxmax()
-                optT = thresMets.loc[optidx]['Threshold']
-                optMCC = thresMets.loc[optidx]['MCC']
-                optpt, = plt.plot([optT],[optMCC],'co',markersize=12)
-                handles = [optpt]
-                labels = ['Optimal MCC']
-                if self.sbin >= -1:
-                    tlist = thresMets['Threshold'].tolist()
-                    actT = sys_threshold
-                    if sys_threshold in tlist:
-                        actMCC = thresMets.query("Threshold=={}".format(sys_threshold)).iloc[0]['MCC']
-                    else:
-                        #get max threshold less than or equal to threshold
-                        actT = max([t for t in tlist if t <= sys_threshold])
-                        actMCC = thresMets.query("Threshold=={}".format(actT)).iloc[0]['MCC']
-                    actpt, = plt.plot([actT],[actMCC],'ro',markersize=8)
-                    handles.append(actpt)
-                    labels.append('Actual MCC')
-                plt.legend(handles,labels,loc='upper right', borderaxespad=0, prop={'size':8}, shadow=True, fontsize='small',numpoints=1)
-                plt.suptitle('MCC per Threshold',fontsize=14)
-                plt.xlabel("Binarization threshold value")
-                plt.ylabel("Matthews Correlation Coefficient (MCC)")
-                thresString = os.path.join(outputRoot,'thresMets.png')
-                plt.savefig(thresString,bbox_inches='tight') #save the graph
-                plt.close()
-                thresString = "<img src=\"{}\" alt=\"thresholds graph\" style=\"width:{}px;\">".format('thresMets.png',plt_width)
-            except:
-                raise
-                e = sys.exc_info()[0]
-#                print("The plotter encountered error {}. Defaulting to table display for the HTML report.".format(e))
-                print("Warning: The plotter encountered an issue. Defaulting to table display for the HTML report.")
-                thresMets = thresMets.round({'NMM':3,'MCC':3,'BWL1':3,'GWL1':3})
-                thresString = '<h4>Measures for Each Threshold</h4><br/>' + thresMets.to_html(index=False).replace("text-align: right;","text-align: center;")
-        else:
-            thresString = 'Threshold graph not applicable<br>'
-
-        #build soft links for mPath, rImg_name, sImg_name, use compact relative links for all
-        mBase = os.path.basename(mPath)
-        rBase = os.path.basename(rImg_name)
-        sBase = os.path.basename(sImg_name)
-
-        #change to donor depending on mode
-        basehtml = ''
-        mpfx = 'probe'
-        if self.mode==2:
-            mpfx = 'donor'
-        else:
-            bPath = os.path.join(self.refDir,baseImageFName)
-            bBase = os.path.basename(bPath)
-            bPathNew = os.path.join(outputRoot,''.join(['baseFile',baseImageFName[-4:]]))
-            try:
-                os.remove(bPathNew)
-            except OSError:
-                None
-            myprintbuffer.append(" ".join(["Creating link for base image",baseImageFName]))
-            os.symlink(os.path.abspath(bPath),bPathNew)
-            basehtml="<img src={} alt='base image' style='width:{}px;'>".format(''.join(['baseFile',baseImageFName[-4:]]),allshapes)
-
-        rPathNew = os.path.join(outputRoot,'refMask.png') #os.path.join(outputRoot,rBase)
-        mPathNew = os.path.join(outputRoot,''.join([mpfx,'File',maniImageFName[-4:]])) #os.path.join(outputRoot,mBase)
-        sPathNew = os.path.join(outputRoot,'sysMask.png') #os.path.join(outputRoot,sBase)
-
-        for mypath in [rPathNew,mPathNew,sPathNew]:
-            try:
-                os.remove(mypath)
-            except OSError:
-                None
-
-        #if color, create a symbolic link. Otherwise, create and save the refMask.png
-        if not self.usejpeg2000:
-            myprintbuffer.append(" ".join(["Creating link for reference mask", rImg_name]))
-            os.symlink(os.path.abspath(rImg_name),rPathNew)
-        else:
-            #create and save refMask.png.
-            if self.cache_dir: 
-                cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolor.png' % probeFileID))
-                acolor_in_cache = os.path.isfile(cache_acolor_path)
-                if acolor_in_cache:
-                    #generate sym link
-                    os.symlink(os.path.abspath(cache_acolor_path),rPathNew)
-                else:
-                    refMask = rImg.getAnimatedMask()
-                    write_apng(rPathNew,refMask,delay=600,use_palette=False)
-            else:
-                refMask = rImg.getAnimatedMask()
-                write_apng(rPathNew,refMask,delay=600,use_palette=False)
-            if self.cache_dir:
-                cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolor.png' % probeFileID))
-                if not acolor_in_cache:
-                    write_apng(cache_acolor_path,refMask,delay=600,use_palette=False)
-            
-        myprintbuffer.append(" ".join(["Creating link for manipulated image", maniImageFName]))
-        os.symlink(os.path.abspath(mPath),mPathNew)
-        myprintbuffer.append(" ".join(["Creating link for system output mask", sImg_name]))
-        os.symlink(os.path.abspath(sImg_name),sPathNew)
-
-        syspfx = ''
-        if self.sbin >= -1:
-            syspfx = 'Actual '
-
-        myprintbuffer.append("Writing HTML...")
-        htmlstr = htmlstr.substitute({'probeName': maniImageFName,
-                                      'probeFname': "".join([mpfx,'File',maniImageFName[-4:]]),#mBase,
-                                      'width': allshapes,
-                                      'baseName': baseImageFName,
-                                      'basehtml': basehtml,#mBase,
-                                      'aggMask' : os.path.basename(aggImgName),
-                                      'refMask' : 'refMask.png',#rBase,
-                                      'sysMask' : 'sysMask.png',#sBase,
-                                      'binRefMask' : os.path.basename(rbin_name),
-                                      'binSysMask' : os.path.basename(sbin_name),
-                                      'systh' : sys_threshold,
-                                      'noScoreZone' : os.path.basename(weightFName),
-                                      'colorMask' : os.path.basename(colMaskName),
-                                      'met_table' : met_table,
-#  				      'nmm' : round(metrics['NMM'],3),
-#  				      'mcc' : round(metrics['MCC'],3),
-#  				      'bwL1' : round(metrics['BWL1'],3),
-#  				      'gwL1' : round(metrics['GWL1'],3),
-                                      'syspfx' : syspfx,
-                                      'totalPixels' : totalpx,
-                                      'conftable':conf_table,
-                                      'bns' : int(totalbns),
-                                      'sns' : int(totalsns),
-                                      'pns' : int(totalpns),
-                                      'tns' : int(totalns),
-                                      'bnscol':cols['bnscol'],
-                                      'snscol':cols['snscol'],
-                                      'pnscol':cols['pnscol'],
-                                      'bnshex':hexs[cols['bnscol']],
-                                      'snshex':hexs[cols['snscol']],
-                                      'pnshex':hexs[cols['pnscol']],
-                                      'percbns':percbns,
-                                      'percsns':percsns,
-                                      'percpns':percpns,
-                                      'perctns':perctns,
-                                      'jtable':jtable,
-                                      'th_table':thresString,
-                                      'roc_curve':'<embed src=\"roc.pdf\" alt=\"roc curve\" width=\"{}\" height=\"{}\" type=\'application/pdf\'>'.format(plt_width,plt_width)}) #add journal operations and set bg color to the html
-
-        #print htmlstr
-        fprefix=os.path.basename(maniImageFName)
-        fprefix=fprefix.split('.')[0]
-        fname=os.path.join(outputRoot,'.'.join([fprefix,'html']))
-        myhtml=open(fname,'w')
-        myhtml.write(htmlstr)
-        myprintbuffer.append("HTML page written.")
-        myhtml.close()
-
-    def gen_metrics_table(self,metrics,mets_for_some=['NMM','MCC','BWL1'],mets_for_all=['GWL1'],
-                          rename_dict={'NMM':'Nimble Mask Metric (NMM)',
-                                       'MCC':'Matthews Correlation Coefficient (MCC)',
-                                       'BWL1':'Binary Weighted L1 Loss (BWL1)',
-                                       'GWL1':'Grayscale Weighted L1 Loss (GWL1)'}):
-        """
-        *Description: this function generates the HTML string for the table of metrics and is not meant
-                      to be used otherwise
-
-        * Inputs:
-        *    metrics: values of the metrics to be scored
-        *    mets_for_some: list of metrics to evaluated that differ for different thresholds
-        *    mets_for_all: list of metrics that do not differ for different thresholds
-        *    rename_dict: dictionary of new names for metrics 
-
-        * Output
-        *    tablestring: the html string for the generated table
-        """
-        met_table = pd.DataFrame(index=mets_for_some,columns=['Optimum'])
-        
-        for met in mets_for_some:
-            metstr = "nan"
-            #round if numeric
-            if (not isinstance(metrics[met],str)) and not np.isnan(metrics[met]):
-                metstr = "{0:.3f}".format(metrics[met])
-
-            met_table.at[met,'Optimum'] = metstr
-            if self.sbin >= -1:
-                ametstr = "nan"
-                amet = 'Actual%s' % met
-                if not isinstance(metrics[amet],str):
-                    ametstr = "{0:.3f}".format(metrics[amet])
-                met_table.at[met,'Actual'] = ametstr
-
-        #rename indices
-        rename_keys = rename_dict.keys()
-        sub_rename_dict = {m:rename_dict[m] for m in mets_for_some if m in rename_keys}
-        met_table.rename(index=sub_rename_dict,inplace=True)
-
-        tablestring = met_table.to_html(index=True).replace("text-align: right;","text-align: center;")
-        otherrows = ''
-        colspan = 1
-        #make column span the row
-        if self.sbin >= -1:
-            colspan = 2
-        for met in mets_for_all:
-            #add into each row
-            if not isinstance(metrics[met],str) and not np.isnan(metrics[met]):
-                metstr = "{0:.3f}".format(metrics[met])
-            otherrows = '\n'.join([otherrows,"<tr><th>{}</th><td colspan={}>{}</td></tr>".format(rename_dict[met],colspan,metstr)])
-        #tack onto end of met_table.rename
-        tablestring = (tablestring.replace("</tbody>","".join([otherrows,"</tbody>"]))
-                                  .replace("<th></th>","<th>Localization Metrics</th>")
-                                  .replace("<th>","<th align='left'>")
-                                  .replace("<tr>","<tr align='right'>"))
-        
-        
-        return tablestring
-
-    def gen_confusion_table(self,conf_metrics,mets_for_some=['TP','FP','TN','FN'],mets_for_all=[],
-                          rename_dict={'TP':'True Postives (TP: green)',
-                                       'FP':'False Postives (FP: red)',
-                                       'TN':'True Negatives (TN: white)',
-                                       'FN':'False Negatives (FN: blue)'}):
-        """
-        *Description: this function generates the HTML string for the table of confusion measures (TP, TN, FP, and FN)
-                      and is not meant to be used otherwise
-        """
-        met_table = pd.DataFrame(index=mets_for_some,columns=['OptimumPixelCount','OptimumProportion'])
-        totalpx = conf_metrics['TotalPixels']
-        for met in mets_for_some:
-            metstr = "nan"
-            #generate Pixel count and Proportion separation
-            optcol = 'OptimumPixel%s' % met
-            met_table.at[met,'OptimumPixelCount'] = conf_metrics[optcol]
-
-            #round if numeric
-            if totalpx > 0:
-                metstr = "{0:.3f}".format(float(conf_metrics[optcol])/totalpx)
-            met_table.at[met,'OptimumProportion'] = metstr
-
-            #do the same for Actual metrics
-            if self.sbin >= -1:
-                ametstr = "nan"
-                optcol = 'ActualPixel%s' % met
-                met_table.at[met,'ActualPixelCount'] = conf_metrics[optcol]
-
-                if totalpx > 0:
-                    ametstr = "{0:.3f}".format(float(conf_metrics[optcol])/totalpx)
-                met_table.at[met,'ActualProportion'] = ametstr
-
-        #rename indices
-        rename_keys = rename_dict.keys()
-        sub_rename_dict = {m:rename_dict[m] for m in mets_for_some if m in rename_keys}
-        met_table.rename(index=sub_rename_dict,inplace=True)
-        cols = ['OptimumPixelCount','OptimumProportion']
-        met_table.OptimumPixelCount = met_table.OptimumPixelCount.astype(int)
-        if self.sbin >= -1:
-            cols.extend(['ActualPixelCount','ActualProportion'])
-            met_table.ActualPixelCount = met_table.ActualPixelCount.astype(int)
-
-        met_table = met_table[cols]
-
-        tablestring = met_table.to_html(index=True).replace("text-align: right;","text-align: center;")
-        otherrows = ''
-        for met in mets_for_all:
-            #add into each row
-            if not isinstance(conf_metrics[met],str):
-                metstr = "{0:.3f}".format(metrics[met])
-            otherrows = '\n'.join([otherrows,"<tr><th>{}</th><td>{}</td></tr>".format(rename_dict[met],metstr)])
-        #tack onto end of met_table.rename
-        tablestring = (tablestring.replace("</tbody>","".join([otherrows,"</tbody>"]))
-                                  .replace("<th></th>","<th>Confuson Measures</th>")
-                                  .replace("<th>","<th align='left'>")
-                                  .replace("<tr>","<tr align='right'>")
-                                  .replace('<table border="1" class="dataframe">','<table border="1" class="dataframe" bgcolor="#C8C8C8">'))
-
-        return tablestring
-
-    #prints out the aggregate mask, reference and other data
-    def aggregateColorMask(self,ref,sysmask,bns,sns,pns,kern,erodeKernSize,probeFileID,maniImgName,outputMaskPath,colordict):
-        """
-        *Description: this function produces the aggregate mask image of the ground truth, system output,
-                      and no-score regions for the HTML report, and a composite of the same image superimposed
-                      on a grayscale of the reference image
-
-        * Inputs:
-        *     ref: the reference mask file
-        *     sysmask: the system output mask file to be evaluated
-        *     bns: the boundary no-score weighted matrix
-        *     sns: the selected no-score weighted matrix
-        *     kern: kernel shape to be used
-        *     erodeKernSize: length of the erosion kernel matrix
-        *     probeFileID: the ID of the image to be considered
-        *     maniImgName: a list of reference probe images (not masks) for superimposition
-        *     outputMaskPath: the directory in which to output the composite images
-        *     colordict: the dictionary of colors to pass in. (e.g. {'red':[0 0 255],'green':[0 255 0]})
-       
-        * Output
-        *     a dictionary containing the colored mask path and the aggregate mask path
-        """
-
-        #set new image as some RGB
-        mydims = ref.get_dims()
-        mycolor = 255*np.ones([mydims[0],mydims[1],3],dtype=np.uint8)
-
-        if erodeKernSize > 0:
-            eKern = masks.getKern(kern,erodeKernSize)
-            eData = cv2.dilate(ref.bwmat,eKern,iterations=1)
-        else:
-            eData = ref.bwmat
-
-        #flip all because black is 0 by default. Use the regions to determine where to color.
-#        b_sImg = 1-sysmask.bwmat/255
-#        b_eImg = 1-eData/255 #erosion of black/white reference mask
-#        b_bnsImg = 1-bns
-#        b_snsImg = 1-sns
-#        b_pnsImg = 1-pns
-        _,b_sImg = cv2.threshold(sysmask.bwmat,0,1,cv2.THRESH_BINARY_INV)
-        _,b_eImg = cv2.threshold(eData,0,2,cv2.THRESH_BINARY_INV)
-        _,b_bnsImg = cv2.threshold(bns,0,4,cv2.THRESH_BINARY_INV)
-        _,b_snsImg = cv2.threshold(sns,0,8,cv2.THRESH_BINARY_INV)
-        mImg = b_sImg + b_eImg + b_bnsImg + b_snsImg
-        if pns is not 0:
-            b_pnsImg = 0
-        else:
-            _,b_pnsImg = cv2.threshold(pns,0,16,cv2.THRESH_BINARY_INV)
-            mImg = mImg + b_pnsImg
-            
-#        b_sImg[b_sImg != 0] = 1
-#        b_eImg[b_eImg != 0] = 2
-#        b_bnsImg[b_bnsImg != 0] = 4
-#        b_snsImg[b_snsImg != 0] = 8
-#        if b_pnsImg is not 1:
-#            b_pnsImg[b_pnsImg != 0] = 16
-#        else:
-#            b_pnsImg = 0
-
-
-        #set pixels equal to some value:
-        #red to false accept and false reject
-        #blue to no-score zone
-        #pink to no-score zone that intersects with system mask
-        #yellow to system mask intersect with GT
-        #black to true negatives
-
-        #get colors through colordict
-        mycolor[mImg==1] = colordict['red'] #only system (FP)
-        mycolor[mImg==2] = colordict['blue'] #only erode image (FN) (the part that is scored)
-        mycolor[mImg==3] = colordict['green'] #system and erode image coincide (TP)
-        mycolor[(mImg>=4) & (mImg <=7)] = colordict['yellow'] #boundary no-score zone
-        mycolor[(mImg>=8) & (mImg <=15)] = colordict['pink'] #selection no-score zone
-        mycolor[mImg>=16] = colordict['purple'] #system opt out
-
-        #return path to mask
-        outputMaskName = sysmask.name.split('/')[-1]
-        outputMaskBase = outputMaskName.split('.')[0]
-        finalMaskName = "_".join([outputMaskBase,"colored.jpg"])
-        path=os.path.join(outputMaskPath,finalMaskName)
-        #write the aggregate mask to file
-        cv2.imwrite(path,mycolor)
-
-        #also aggregate over the grayscale maniImgName for direct comparison
-        #save as animated png if not using color.
-        maniImg = masks.mask(maniImgName)
-        mData = maniImg.matrix
-#        myagg = np.zeros((mydims[0],mydims[1],3),dtype=np.uint8)
-        m3chan = np.stack((mData,mData,mData),axis=2)
-        #np.reshape(np.kron(mData,np.uint8([1,1,1])),(mData.shape[0],mData.shape[1],3))
-        refbw = ref.bwmat
-#        myagg[refbw==255]=m3chan[refbw==255]
-        myagg = np.copy(m3chan)
-
-        #for modified images, weighted sum the colored mask with the grayscale
-        #np.kron(mData,np.uint8([1,1,1]))
-        #mData.shape=(mydims[0],mydims[1],3)
-        #things change here for pixel overlay
-        #NOTE: try/catch the overlay error. Print out the shapes of all involved items.
-        alpha=0.7
-        try:
-            refmat = ref.matrix
-            if not self.usejpeg2000:
-                modified = cv2.addWeighted(refmat,alpha,m3chan,1-alpha,0)
-                myagg[refbw==0] = modified[refbw==0]
-                compositeMaskName = "_".join([outputMaskBase,"composite.jpg"])
-                compositePath = os.path.join(outputMaskPath,compositeMaskName)
-                cv2.imwrite(compositePath,myagg)
-            else:
-                if self.cache_dir:
-                    cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolorpart.npy' % probeFileID))
-                    if os.path.isfile(cache_acolor_path):
-                        #get this animated mask saved in and read from the cache
-                        aseq = np.load(cache_acolor_path)
-                    else:
-                        aseq = ref.getAnimatedMask('partial')
-                else:
-                    aseq = ref.getAnimatedMask('partial')
-                seq = []
-                for frame in aseq:
-                    #join the frame with the grayscale manipulated image
-                    refmat = frame
-                    modified = cv2.addWeighted(frame,alpha,m3chan,1-alpha,0)
-                    layermask = (frame[:,:,0] != 255) | (frame[:,:,1] != 255) | (frame[:,:,2] != 255)
-                    aggfr = np.copy(m3chan)
-                    #overlay colors with particular manipulated regions
-                    aggfr[layermask] = modified[layermask]
-                    seq.append(aggfr)
-                compositeMaskName = "_".join([outputMaskBase,"composite.png"])
-                compositePath = os.path.join(outputMaskPath,compositeMaskName)
-                write_apng(compositePath,seq,delay=600,use_palette=False)
-                if self.cache_dir:
-                    cache_acolor_path = os.path.join(os.path.join(self.cache_dir,'%s_acolorpart.npy' % probeFileID))
-                    if not os.path.isfile(cache_acolor_path):
-                        np.save(cache_acolor_path,aseq)
-        except:
-            exc_type,exc_obj,exc_tb = sys.exc_info()
-            print("Exception {} encountered at line {} during mask overlay. Reference mask shape: {}. Probe image shape: {}".format(exc_type,exc_tb.tb_lineno,refmat.shape,m3chan.shape))
-            return {'mask':path,'agg':''}
-
-        return {'mask':path,'agg':compositePath}
@@ -0,0 +1,222 @@
+"""
+ *File: noScoreCache.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the on-disk cache of the reference mask no-score zones. Entries are
+               addressed by a hash of everything the no-score zones depend on, so that they can be reused
+               safely across runs scoring different system outputs against the same reference set.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import os
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+
+#bump whenever the generation of the no-score zones or the entry layout changes
+noscore_cache_version = 1
+
+def to_bytes(s):
+    if isinstance(s,bytes):
+        return s
+    return s.encode('utf-8')
+
+class noScoreCache:
+    """
+    This class stores binary matrices generated from the reference masks (e.g. the no-score zones)
+    as packed bits, one compressed file per key, with the least recently used entries evicted once
+    the total size of the cache exceeds its bound.
+    """
+    def __init__(self,cache_dir,max_size=0):
+        """
+        Constructor
+
+        Attributes:
+        - cache_dir: the directory where the entries are stored. Created if absent
+        - max_size: the maximum total size of the entries in bytes. 0 for no limit
+        - size: the running total size of the entries, as last scanned plus the entries written since
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                #another process may have created it in the meantime
+                if not os.path.isdir(cache_dir):
+                    raise
+        self.size = 0
+        if self.max_size > 0:
+            self.size = sum([e[1] for e in self.list_entries()])
+
+    def file_digest(self,path,blocksize=1 << 20):
+        """
+        * Description: hashes the contents of a file
+        * Inputs:
+        *     path: the file to hash
+        *     blocksize: the number of bytes to read at a time
+        * Output:
+        *     the hex digest of the file contents
+        """
+        h = hashlib.sha1()
+        with open(path,'rb') as f:
+            block = f.read(blocksize)
+            while block:
+                h.update(block)
+                block = f.read(blocksize)
+        return h.hexdigest()
+
+    def make_key(self,refMaskName,journal_rows,**params):
+        """
+        * Description: generates the key of a reference mask's entry
+        * Inputs:
+        *     refMaskName: the reference mask file. Its contents, not its name, are hashed
+        *     journal_rows: the journal dataframe rows used to select the regions of the reference mask,
+                            or 0 if none were used
+        *     params: the remaining parameters the entry depends on, e.g. kernel sizes and shapes
+        * Output:
+        *     the hex key of the entry
+        """
+        h = hashlib.sha1()
+        h.update(to_bytes('v{}|{}'.format(noscore_cache_version,self.file_digest(refMaskName))))
+        if isinstance(journal_rows,pd.DataFrame):
+            h.update(to_bytes('|journal='))
+            h.update(to_bytes(journal_rows.to_csv(sep='|',index=False)))
+        else:
+            h.update(to_bytes('|journal=0'))
+        for p in sorted(params):
+            h.update(to_bytes('|{}={}'.format(p,params[p])))
+        return h.hexdigest()
+
+    def entry_path(self,key):
+        return os.path.join(self.cache_dir,'%s.npz' % key)
+
+    def get(self,key):
+        """
+        * Description: reads the matrices stored under the key and marks the entry as recently used
+        * Inputs:
+        *     key: the key generated by make_key
+        * Output:
+        *     a dictionary of the stored matrices, or None if the entry is absent or unreadable
+        """
+        path = self.entry_path(key)
+        try:
+            with np.load(path) as entry:
+                names = [n[:-5] for n in entry.files if n.endswith('_bits')]
+                mats = {}
+                for n in names:
+                    shape = tuple(entry['%s_shape' % n])
+                    size = int(np.prod(shape))
+                    bits = np.unpackbits(entry['%s_bits' % n])[:size].reshape(shape)
+                    mats[n] = bits*entry['%s_on' % n][0]
+            os.utime(path,None)
+        except (IOError,OSError,KeyError,ValueError,zipfile.BadZipfile):
+            #absent, or removed or truncated by another process
+            return None
+        return mats
+
+    def put(self,key,**mats):
+        """
+        * Description: stores the matrices under the key, then evicts the least recently used entries
+                       if the cache is over its bound. The entry is written to a temporary file and renamed
+                       into place, so that concurrent readers never see a partial entry
+        * Inputs:
+        *     key: the key generated by make_key
+        *     mats: the matrices to store. Each must take at most one nonzero value
+        * Output:
+        *     True if the entry was stored, False otherwise
+        """
+        payload = {}
+        for n,m in mats.items():
+            on = m.max() if m.size > 0 else 1
+            if on == 0:
+                #an all-zero matrix is an empty bitmap, whatever its nonzero value
+                on = 1
+            bits = m != 0
+            if np.count_nonzero(m == on) != np.count_nonzero(bits):
+                return False
+            payload['%s_bits' % n] = np.packbits(bits)
+            payload['%s_shape' % n] = np.array(m.shape,dtype=np.int64)
+            payload['%s_on' % n] = np.array([on],dtype=m.dtype)
+
+        fd,tmp_path = tempfile.mkstemp(suffix='.tmp',dir=self.cache_dir)
+        try:
+            with os.fdopen(fd,'wb') as f:
+                np.savez_compressed(f,**payload)
+            os.rename(tmp_path,self.entry_path(key))
+        except:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.track(key)
+        return True
+
+    def list_entries(self):
+        """
+        * Description: lists the entries in the cache directory
+        * Output:
+        *     a list of the (last use time, size, path) of each entry
+        """
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if not f.endswith('.npz'):
+                continue
+            path = os.path.join(self.cache_dir,f)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime,st.st_size,path))
+        return entries
+
+    def track(self,key):
+        """
+        * Description: adds the size of a newly written entry to the running total, and evicts entries
+                       once the total exceeds the bound. The directory is only scanned then, and not on every write
+        * Inputs:
+        *     key: the key of the entry written
+        """
+        if self.max_size <= 0:
+            return
+        try:
+            self.size += os.path.getsize(self.entry_path(key))
+        except OSError:
+            return
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self,fill=0.75):
+        """
+        * Description: removes the least recently used entries until the total size of the cache is within
+                       a fraction of its bound, leaving room for further entries before the next scan. Entries
+                       written by other processes are only counted here, so the cache should also be evicted
+                       once at the end of a run
+        * Inputs:
+        *     fill: the fraction of the bound to reduce the total size to
+        """
+        if self.max_size <= 0:
+            return
+        entries = self.list_entries()
+        total = sum([e[1] for e in entries])
+        for mtime,size,path in sorted(entries):
+            if total <= fill*self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self.size = total
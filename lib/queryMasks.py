@@ -0,0 +1,162 @@
+"""
+ *File: queryMasks.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the evaluation of the queries applied to a dataframe, e.g. the -q, -qp, and -qm
+               queries of the scorers. Each query is split into the conditions joined by '&' or 'and' at its top
+               level, and each condition is evaluated once into a boolean mask over the rows of the dataframe.
+               The mask of a query is the AND of the masks of its conditions, so that queries sharing conditions,
+               e.g. the partitions of a factor grid, take one pass over the dataframe per distinct condition.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import re
+import numpy as np
+
+brackets = {'(':')','[':']','{':'}'}
+word_ops = re.compile(r'(?<![\w.])(and|or|not)(?![\w.])')
+
+def split_conditions(query):
+    """
+    * Description: splits a query into the conditions joined by '&' or 'and' outside of any
+                   parentheses, brackets, or quotes. A query with '|', 'or', or 'not' at its top level
+                   is not split, since its conditions cannot be evaluated apart
+    * Inputs:
+    *     query: the query string, in the syntax of pandas.DataFrame.query
+    * Output:
+    *     the list of conditions, stripped of surrounding whitespace
+    """
+    #blank out what is nested or quoted, keeping the positions of the characters
+    top = []
+    closers = []
+    quote = None
+    for ch in query:
+        if quote is not None:
+            top.append(' ')
+            if ch == quote:
+                quote = None
+        elif ch in '\'"':
+            quote = ch
+            top.append(' ')
+        elif ch in brackets:
+            closers.append(brackets[ch])
+            top.append(' ')
+        elif closers and (ch == closers[-1]):
+            closers.pop()
+            top.append(' ')
+        else:
+            top.append(' ' if closers else ch)
+    top = ''.join(top)
+
+    if ('|' in top) or ('~' in top) or any(m.group(1) in ['or','not'] for m in word_ops.finditer(top)):
+        return [query.strip()]
+
+    cuts = [(m.start(),m.end()) for m in re.finditer(r'&',top)]
+    cuts.extend([m.span() for m in word_ops.finditer(top) if m.group(1) == 'and'])
+    conditions = []
+    start = 0
+    for s,e in sorted(cuts):
+        conditions.append(query[start:s].strip())
+        start = e
+    conditions.append(query[start:].strip())
+    return [c for c in conditions if c != '']
+
+def query_key(query):
+    """
+    * Description: generates the key of a query or condition in the caches. The whitespace outside of
+                   quotes is dropped, except for a single space between two words, so that queries
+                   differing only in their spacing share their masks
+    * Inputs:
+    *     query: the query string, in the syntax of pandas.DataFrame.query
+    * Output:
+    *     the key
+    """
+    key = []
+    quote = None
+    space = False
+    for ch in query.strip():
+        if quote is not None:
+            key.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch.isspace():
+            space = True
+        else:
+            if space and (key[-1].isalnum() or key[-1] in '_.') and (ch.isalnum() or ch in '_.'):
+                key.append(' ')
+            space = False
+            if ch in '\'"`':
+                quote = ch
+            key.append(ch)
+    return ''.join(key)
+
+class queryMasks:
+    """
+    This class evaluates queries over one dataframe, caching the boolean mask of each condition.
+    """
+    def __init__(self,df):
+        """
+        Constructor
+
+        Attributes:
+        - df: the dataframe to be queried. It should not be modified while the masks are in use
+        """
+        self.df = df
+        self.condition_masks = {}
+        self.query_masks = {}
+
+    def condition_mask(self,condition):
+        """
+        * Description: evaluates a single condition, or reads it from the cache
+        * Inputs:
+        *     condition: the condition, in the syntax of pandas.DataFrame.query
+        * Output:
+        *     the boolean array of the rows satisfying the condition
+        """
+        key = query_key(condition)
+        mask = self.condition_masks.get(key)
+        if mask is None:
+            mask = np.asarray(self.df.eval(condition),dtype=bool)
+            if mask.shape != (self.df.shape[0],):
+                #a condition not referring to any column
+                mask = np.repeat(mask.all(),self.df.shape[0])
+            self.condition_masks[key] = mask
+        return mask
+
+    def mask(self,query):
+        """
+        * Description: evaluates a query as the AND of the masks of its conditions
+        * Inputs:
+        *     query: the query string, in the syntax of pandas.DataFrame.query. '' selects every row
+        * Output:
+        *     the boolean array of the rows satisfying the query
+        """
+        key = query_key(query)
+        mask = self.query_masks.get(key)
+        if mask is None:
+            mask = np.ones(self.df.shape[0],dtype=bool)
+            for condition in split_conditions(query):
+                mask = mask & self.condition_mask(condition)
+            self.query_masks[key] = mask
+        return mask
+
+    def select(self,query):
+        """
+        * Description: selects the rows satisfying a query, as pandas.DataFrame.query does
+        * Inputs:
+        *     query: the query string, in the syntax of pandas.DataFrame.query
+        * Output:
+        *     the dataframe of the rows satisfying the query
+        """
+        return self.df[self.mask(query)]
@@ -0,0 +1,85 @@
+"""
+ *File: refMaskStore.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains a store of reference mask matrices shared between the processes
+               of a scoring run. Matrices are saved uncompressed to a scratch directory (in memory
+               where /dev/shm is available) and memory-mapped read-only by the processes that read
+               them, so that every process shares one copy of each matrix.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+class refMaskStore:
+    """
+    This class saves named matrices under a key in a scratch directory and maps them back in read-only.
+    """
+    def __init__(self,root=None):
+        """
+        Constructor
+
+        Attributes:
+        - root: the directory to create the scratch directory in. Defaults to /dev/shm if present,
+                and the system temporary directory otherwise
+        """
+        if (root is None) and os.path.isdir('/dev/shm') and os.access('/dev/shm',os.W_OK):
+            root = '/dev/shm'
+        self.store_dir = tempfile.mkdtemp(prefix='refmaskstore_',dir=root)
+
+    def entry_prefix(self,key):
+        return os.path.join(self.store_dir,hashlib.sha1(key if isinstance(key,bytes) else key.encode('utf-8')).hexdigest())
+
+    def put(self,key,**mats):
+        """
+        * Description: saves the matrices under the key. Each matrix is written to a temporary file and
+                       renamed into place, so that a reader never maps a partial file
+        * Inputs:
+        *     key: a string identifying the entry
+        *     mats: the matrices to save
+        """
+        prefix = self.entry_prefix(key)
+        for n,m in mats.items():
+            fd,tmp_path = tempfile.mkstemp(suffix='.tmp',dir=self.store_dir)
+            with os.fdopen(fd,'wb') as f:
+                np.save(f,np.ascontiguousarray(m))
+            os.rename(tmp_path,'%s_%s.npy' % (prefix,n))
+
+    def get(self,key,names):
+        """
+        * Description: maps in the matrices saved under the key
+        * Inputs:
+        *     key: a string identifying the entry
+        *     names: the names of the matrices to map in
+        * Output:
+        *     a dictionary of read-only matrices, or None if any of them is absent
+        """
+        prefix = self.entry_prefix(key)
+        mats = {}
+        for n in names:
+            path = '%s_%s.npy' % (prefix,n)
+            if not os.path.isfile(path):
+                return None
+            mats[n] = np.asarray(np.load(path,mmap_mode='r'))
+        return mats
+
+    def close(self):
+        """
+        * Description: removes the scratch directory and everything in it
+        """
+        shutil.rmtree(self.store_dir,ignore_errors=True)
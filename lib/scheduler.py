@@ -0,0 +1,93 @@
+"""
+ *File: scheduler.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the scheduler used to spread per-probe work over a pool of processes.
+               Tasks are handed out one at a time, largest first, to whichever process is free, so that
+               a few large masks do not hold up a run while the other processes sit idle.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import multiprocessing
+
+def run_indexed(args):
+    func,i,task = args
+    return i,func(task)
+
+def largest_first_order(sizes):
+    """
+    * Description: orders the tasks from largest to smallest, keeping the original order among tasks of equal size
+    * Inputs:
+    *     sizes: a list of the sizes of the tasks, e.g. the number of pixels in each mask
+    * Output:
+    *     a list of the positions of the tasks in the order they should be run
+    """
+    return sorted(range(len(sizes)),key=lambda i: -sizes[i])
+
+def imap_largest_first(func,tasks,sizes,processors):
+    """
+    * Description: runs func over each of the tasks on a pool of processes. Tasks are dispatched one at a
+                   time in largest_first_order to the next free process, and the results are put back in
+                   the original order of the tasks
+    * Inputs:
+    *     func: a module-level function taking a single task
+    *     tasks: a list of the tasks
+    *     sizes: a list of the sizes of the tasks
+    *     processors: the number of processes in the pool
+    * Output:
+    *     a list of the results, one per task, in the order of the tasks
+    """
+    results = [None]*len(tasks)
+    p = multiprocessing.Pool(processes=processors)
+    try:
+        for i,r in p.imap_unordered(run_indexed,[(func,i,tasks[i]) for i in largest_first_order(sizes)]):
+            results[i] = r
+        p.close()
+    except:
+        p.terminate()
+        raise
+    finally:
+        p.join()
+    return results
+
+def batch_largest_first(sizes,n_batches):
+    """
+    * Description: groups the tasks into batches of about equal total size, taken in largest_first_order, so that
+                   the small tasks are handed out several at a time while the largest ones are still run first.
+                   Tasks are counted as equal in size if none of the sizes are known
+    * Inputs:
+    *     sizes: a list of the sizes of the tasks
+    *     n_batches: the number of batches to aim for
+    * Output:
+    *     batches: a list of the batches, each a list of the positions of its tasks
+    *     batch_sizes: a list of the total size of each batch
+    """
+    weights = sizes if sum(sizes) > 0 else [1]*len(sizes)
+    target = float(sum(weights))/max(n_batches,1)
+    batches = []
+    batch_sizes = []
+    batch = []
+    total = 0
+    for i in largest_first_order(sizes):
+        batch.append(i)
+        total += weights[i]
+        if total >= target:
+            batches.append(batch)
+            batch_sizes.append(total)
+            batch = []
+            total = 0
+    if len(batch) > 0:
+        batches.append(batch)
+        batch_sizes.append(total)
+    return batches,batch_sizes
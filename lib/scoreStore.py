@@ -0,0 +1,117 @@
+"""
+ *File: scoreStore.py
+ *Date: 10/18/2026
+ *Status: Complete
+
+ *Description: this code contains the on-disk store of the scores of each probe, for incremental rescoring.
+               Entries are addressed by a hash of the reference and system output mask files, the probe's
+               row of input data, and the scoring parameters, so that a probe is only scored again when
+               something its scores depend on has changed.
+
+
+ *Disclaimer:
+ This software was developed at the National Institute of Standards
+ and Technology (NIST) by employees of the Federal Government in the
+ course of their official duties. Pursuant to Title 17 Section 105
+ of the United States Code, this software is not subject to copyright
+ protection and is in the public domain. NIST assumes no responsibility
+ whatsoever for use by other parties of its source code or open source
+ server, and makes no guarantees, expressed or implied, about its quality,
+ reliability, or any other characteristic."
+"""
+
+import os
+import sys
+import hashlib
+import pickle
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+from noScoreCache import noScoreCache,to_bytes
+
+#bump whenever the computation of the scores or the entry layout changes
+score_store_version = 1
+
+#the entries are pickled dataframes and numpy values, which are only guaranteed to load under the versions that wrote them
+score_store_libs = 'python{}|numpy{}|pandas{}'.format(sys.version_info[0],np.__version__,pd.__version__)
+
+class scoreStore(noScoreCache):
+    """
+    This class stores the scored row of each probe along with its threshold tables, one compressed file
+    per key, with the least recently used entries evicted once the total size exceeds its bound. The keys
+    include the versions of python, numpy, and pandas, so that entries pickled under other versions are
+    scored again rather than loaded.
+    """
+    def make_key(self,refMaskName,sysMaskName,journal_rows,row,**params):
+        """
+        * Description: generates the key of a probe's entry
+        * Inputs:
+        *     refMaskName: the reference mask file, or '' if there is none. Its contents are hashed
+        *     sysMaskName: the system output mask file, or '' if there is none. Its contents are hashed
+        *     journal_rows: the journal dataframe rows used to select the regions of the reference mask,
+                            or 0 if none were used
+        *     row: the probe's row of input data, as a dictionary
+        *     params: the scoring parameters, e.g. kernel sizes and thresholds
+        * Output:
+        *     the hex key of the entry
+        """
+        h = hashlib.sha1()
+        h.update(to_bytes('v{}|{}'.format(score_store_version,score_store_libs)))
+        for name in [refMaskName,sysMaskName]:
+            digest = ''
+            if name and os.path.isfile(name):
+                digest = self.file_digest(name)
+            h.update(to_bytes('|{}'.format(digest)))
+        if isinstance(journal_rows,pd.DataFrame):
+            h.update(to_bytes('|journal='))
+            h.update(to_bytes(journal_rows.to_csv(sep='|',index=False)))
+        else:
+            h.update(to_bytes('|journal=0'))
+        for c in sorted(row):
+            h.update(to_bytes('|{}={!r}'.format(c,row[c])))
+        for p in sorted(params):
+            h.update(to_bytes('|{}={!r}'.format(p,params[p])))
+        return h.hexdigest()
+
+    def get(self,key):
+        """
+        * Description: reads the scores stored under the key and marks the entry as recently used
+        * Inputs:
+        *     key: the key generated by make_key
+        * Output:
+        *     a dictionary of the stored scores, or None if the entry is absent or unreadable
+        """
+        path = self.entry_path(key)
+        try:
+            with np.load(path) as entry:
+                scores = pickle.loads(entry['scores'].tostring())
+            os.utime(path,None)
+        except (IOError,OSError,KeyError,ValueError,EOFError,pickle.UnpicklingError,zipfile.BadZipfile):
+            #absent, or removed or truncated by another process
+            return None
+        return scores
+
+    def put(self,key,**scores):
+        """
+        * Description: stores the scores under the key, then evicts the least recently used entries if the
+                       store is over its bound. The entry is written to a temporary file and renamed into place,
+                       so that concurrent readers never see a partial entry
+        * Inputs:
+        *     key: the key generated by make_key
+        *     scores: the scored row and threshold tables of the probe
+        * Output:
+        *     True if the entry was stored
+        """
+        payload = np.frombuffer(pickle.dumps(scores,2),dtype=np.uint8)
+        fd,tmp_path = tempfile.mkstemp(suffix='.tmp',dir=self.cache_dir)
+        try:
+            with os.fdopen(fd,'wb') as f:
+                np.savez_compressed(f,scores=payload)
+            os.rename(tmp_path,self.entry_path(key))
+        except:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.track(key)
+        return True
@@ -31,10 +31,15 @@ sys.path.append(lib_path)
 import Render as p
 import detMetrics as dm
 import Partition as f
+import csvCache
 
 
-def load_csv(fname, mysep='|', mydtype=None):
+def load_csv(fname, mysep='|', mydtype=None, cached=False):
+    """ cached: read the file through csvCache, for the reference files that are read for every system scored
+    """
     try:
+        if cached:
+            return csvCache.read_csv(fname, sep=mysep, dtype=mydtype, low_memory=False)
         df = pd.read_csv(fname, sep=mysep, dtype=mydtype, low_memory=False)
         return df
     except IOError:
@@ -74,8 +79,8 @@ def JT_merge(ref_dir, ref_fname, mainDF):
     join_fname = define_file_name(ref_dir, ref_fname, '-probejournaljoin.csv')
     mask_fname = define_file_name(ref_dir, ref_fname, '-journalmask.csv')
     if os.path.isfile(join_fname) and os.path.isfile(mask_fname):
-        joinDF = pd.read_csv(join_fname, sep='|', low_memory=False)
-        maskDF = pd.read_csv(mask_fname, sep='|', low_memory=False)
+        joinDF = csvCache.read_csv(join_fname, sep='|', low_memory=False)
+        maskDF = csvCache.read_csv(mask_fname, sep='|', low_memory=False)
         jt_no_overlap, jt_overlap = overlap_cols(joinDF, maskDF)
         v_print("JT overlap columns: {}".format(jt_overlap))
         v_print("Merging (left join) the JournalJoin and JournalMask csv files with the reference file ...\n")
@@ -95,10 +100,10 @@ def input_ref_idx_sys(refDir, inRef, inIndex, sysDir, inSys, outRoot, outSubMeta
     # Loading the reference file
     v_print("Ref file name: {}".format(os.path.join(refDir, inRef)))
     myRefDir = os.path.dirname(os.path.join(refDir, inRef))
-    myRef = load_csv(os.path.join(refDir, inRef))
+    myRef = load_csv(os.path.join(refDir, inRef), cached=True)
     # Loading the index file
     v_print("Index file name: {}".format(os.path.join(refDir, inIndex)))
-    myIndex = load_csv(os.path.join(refDir, inIndex))
+    myIndex = load_csv(os.path.join(refDir, inIndex), cached=True)
     # Loading system output
     v_print("Sys file name: {}".format(os.path.join(sysDir, inSys)))
     mySys = load_csv(os.path.join(sysDir, inSys), mydtype=sys_dtype)
@@ -132,7 +137,7 @@ def input_ref_idx_sys(refDir, inRef, inIndex, sysDir, inSys, outRoot, outSubMeta
     return index_m_df, sys_ref_overlap
 
 
-def yes_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, ci, ciLevel, dLevel, total_num, sys_response, query_str, query_mode, sys_ref_overlap):
+def yes_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, ci, ciLevel, dLevel, total_num, sys_response, query_str, query_mode, sys_ref_overlap, pool=None):
 
     m_df = df.copy()
     # if the files exist, merge the JTJoin and JTMask csv files with the reference and index file
@@ -142,7 +147,7 @@ def yes_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, c
 
     v_print("Creating partitions for queries ...\n")
     selection = f.Partition(m_df, query_str, query_mode, fpr_stop=farStop, isCI=ci,
-                            ciLevel=ciLevel, total_num=total_num, sys_res=sys_response, overlap_cols=sys_ref_overlap)
+                            ciLevel=ciLevel, total_num=total_num, sys_res=sys_response, overlap_cols=sys_ref_overlap, pool=pool)
     DM_List = selection.part_dm_list
     v_print("Number of partitions generated = {}\n".format(len(DM_List)))
 
@@ -159,7 +164,7 @@ def yes_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, c
     return DM_List, table_df, selection
 
 
-def no_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, ci, ciLevel, dLevel, total_num, sys_response):
+def no_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, ci, ciLevel, dLevel, total_num, sys_response, pool=None):
 
     m_df = df.copy()
 
@@ -171,7 +176,7 @@ def no_query_mode(df, task, refDir, inRef, outRoot, optOut, outMeta, farStop, ci
         m_df.to_csv(outRoot + '_meta_scored.csv', index=False, sep='|')
 
     DM = dm.detMetrics(m_df['ConfidenceScore'], m_df['IsTarget'], fpr_stop=farStop,
-                       isCI=ci, ciLevel=ciLevel, dLevel=dLevel, total_num=total_num, sys_res=sys_response)
+                       isCI=ci, ciLevel=ciLevel, dLevel=dLevel, total_num=total_num, sys_res=sys_response, pool=pool)
     DM_List = [DM]
     table_df = DM.render_table()
 
@@ -319,9 +324,11 @@ def command_interface():
                         help='Specify the stop point of FAR for calculating partial AUC, range [0,1] (default: %(default) FAR 10%)', metavar='float')
     # TODO: relation between ci and ciLevel
     parser.add_argument('--ci', action='store_true',
-                        help="Calculate the lower and upper confidence interval for AUC if this option is specified. The option will slowdown the speed due to the bootstrapping method.")
+                        help="Calculate the lower and upper confidence intervals for AUC@FAR, CDR@FAR, and EER if this option is specified. The option will slowdown the speed due to the bootstrapping method.")
     parser.add_argument('--ciLevel', type=restricted_ci_value, default=0.9,
                         help="Calculate the lower and upper confidence interval with the specified confidence level, The option will slowdown the speed due to the bootstrapping method.", metavar='float')
+    parser.add_argument('-p', '--processors', type=int, default=1,
+                        help="Specify the number of processors to spread the bootstrap of --ci over (default: %(default)s)", metavar='integer')
     parser.add_argument('--dLevel', type=restricted_dprime_level, default=0.0,
                         help="Define the lower and upper exclusions for d-prime calculation", metavar='float')
     # Output Options
@@ -401,6 +408,7 @@ if __name__ == '__main__':
                 self.farStop = 0.05
                 self.ci = False
                 self.ciLevel = 0.9
+                self.processors = 1
                 self.dLevel = 0.0
                 # Outputs
                 self.outRoot = "./testcase/test"
@@ -475,6 +483,12 @@ if __name__ == '__main__':
         sys_response = 'tr'
         index_m_df = is_optout(index_m_df, sys_response)
 
+    # one pool of processes for the bootstrap of every partition's confidence intervals
+    pool = None
+    if args.ci and (args.processors > 1):
+        import multiprocessing
+        pool = multiprocessing.Pool(args.processors)
+
     # TSV input mode
     if args.tsv:
         print("Place TSV metrics here ...")
@@ -496,7 +510,8 @@ if __name__ == '__main__':
 
         v_print("Query_mode: {}, Query_str: {}".format(query_mode,query_str))
         DM_List, table_df, selection = yes_query_mode(index_m_df, args.task, args.refDir, args.inRef, args.outRoot,
-                                                      args.optOut, args.outMeta, args.farStop, args.ci, args.ciLevel, args.dLevel, total_num, sys_response, query_str, query_mode, sys_ref_overlap)
+                                                      args.optOut, args.outMeta, args.farStop, args.ci, args.ciLevel, args.dLevel, total_num, sys_response, query_str, query_mode, sys_ref_overlap,
+                                                      pool=pool)
         # Render plots with the options
         q_opts_list, q_plot_opts = plot_options(DM_List, args.configPlot, args.plotType,
                                                 args.plotTitle, args.plotSubtitle, args.optOut)
@@ -507,11 +522,16 @@ if __name__ == '__main__':
     else:
         #print(index_m_df.columns)
         DM_List, table_df = no_query_mode(index_m_df, args.task, args.refDir, args.inRef, args.outRoot,
-                                          args.optOut, args.outMeta, args.farStop, args.ci, args.ciLevel, args.dLevel, total_num, sys_response)
+                                          args.optOut, args.outMeta, args.farStop, args.ci, args.ciLevel, args.dLevel, total_num, sys_response,
+                                          pool=pool)
         # Render plots with the options
         opts_list, plot_opts = plot_options(DM_List, args.configPlot, args.plotType,
                                             args.plotTitle, args.plotSubtitle, args.optOut)
 
+    if pool is not None:
+        pool.close()
+        pool.join()
+
     v_print("Rendering/saving csv tables...\n")
     if isinstance(table_df, list):
         print("\nReport tables:\n")
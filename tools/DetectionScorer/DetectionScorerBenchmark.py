@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Micro-benchmarks of the ROC summary metrics in detMetrics.Metrics against
+# the list-based implementations they replaced.
+import sys
+import os
+import timeit
+import argparse
+import numpy as np
+
+lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib")
+sys.path.append(lib_path)
+import detMetrics as dm
+
+
+# the list-based implementations, kept here for comparison
+def list_compute_auc(fpr, tpr, fpr_stop=1):
+    width = [x - fpr[i] for i, x in enumerate(fpr[1:]) if fpr[i + 1] <= fpr_stop]
+    height = [(x + tpr[i]) / 2 for i, x in enumerate(tpr[1:])]
+    p_height = height[0:len(width)]
+    auc = sum([width[i] * p_height[i] for i in range(0, len(width))])
+    return auc
+
+
+def list_compute_eer(fpr, fnr):
+    errdif = [abs(fpr[j] - fnr[j]) for j in range(0, len(fpr))]
+    idx = errdif.index(min(errdif))
+    eer = np.mean([fpr[idx], fnr[idx]])
+    return eer
+
+
+def list_linear_interpolated_point(x, y, x0):
+    xy = list(zip(x, y))
+    xy.sort(key=lambda x: x[0])
+    tuples = [p for p in xy if p[0] == x0]
+    if len(tuples) > 0:
+        return tuples
+    smaller = [p for p in xy if p[0] < x0]
+    ix_x01 = len(smaller) - 1
+    if ix_x01 == -1:
+        x01, y01 = 0, 0
+        x02, y02 = xy[0]
+    else:
+        x01, y01 = xy[ix_x01]
+        try:
+            x02, y02 = xy[ix_x01 + 1]
+        except IndexError:
+            x02, y02 = 1, 1
+    if x02 != x01:
+        y0 = y01 + (y02 - y01) / (x02 - x01) * (x0 - x01)
+    else:
+        y0 = (y02 + y01) / 2
+    return [(x0, y0)]
+
+
+def make_roc(n_points, seed=0):
+    """ a random ROC curve of n_points points from (0,0) to (1,1)
+    """
+    rng = np.random.RandomState(seed)
+    fpr = np.sort(rng.uniform(size=n_points))
+    tpr = np.sort(rng.uniform(size=n_points)) ** 0.25
+    fpr[0], tpr[0] = 0, 0
+    fpr[-1], tpr[-1] = 1, 1
+    return fpr, tpr
+
+
+def best_time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def benchmark(sizes, max_list_size, fpr_stop, repeat):
+    print("{:>10} {:>24} {:>12} {:>12} {:>10}".format('points', 'function', 'list (s)', 'numpy (s)', 'speedup'))
+    for n in sizes:
+        fpr, tpr = make_roc(n)
+        fnr = 1 - tpr
+        cases = [('compute_auc', lambda: list_compute_auc(fpr, tpr, fpr_stop), lambda: dm.Metrics.compute_auc(fpr, tpr, fpr_stop)),
+                 ('compute_eer', lambda: list_compute_eer(fpr, fnr), lambda: dm.Metrics.compute_eer(fpr, fnr)),
+                 ('linear_interpolated_point', lambda: list_linear_interpolated_point(fpr, tpr, fpr_stop),
+                  lambda: dm.Metrics.linear_interpolated_point(fpr, tpr, fpr_stop))]
+        for name, list_func, np_func in cases:
+            np_time = best_time(np_func, repeat)
+            if n > max_list_size:
+                print("{:>10} {:>24} {:>12} {:>12.6f} {:>10}".format(n, name, '-', np_time, '-'))
+                continue
+            np.testing.assert_allclose(np.ravel(np_func()), np.ravel(list_func()))
+            list_time = best_time(list_func, repeat)
+            print("{:>10} {:>24} {:>12.6f} {:>12.6f} {:>9.1f}x".format(n, name, list_time, np_time, list_time / np_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the ROC summary metrics of detMetrics against the list-based implementations.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10**3, 10**4, 10**5, 10**6, 10**7],
+                        help='The numbers of ROC points to time the metrics at (default: %(default)s)', metavar='integer')
+    parser.add_argument('--maxListSize', type=int, default=10**6,
+                        help='The largest number of ROC points to time the list-based implementations at, which are slow (default: %(default)s)', metavar='integer')
+    parser.add_argument('--farStop', type=float, default=0.1,
+                        help='The FAR to compute the partial AUC and CDR at (default: %(default)s)', metavar='float')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='The number of timings to take the best of (default: %(default)s)', metavar='integer')
+    args = parser.parse_args()
+    benchmark(args.sizes, args.maxListSize, args.farStop, args.repeat)
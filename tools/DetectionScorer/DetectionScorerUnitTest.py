@@ -81,6 +81,17 @@ def unittestMetrics():
     df2fnr = [1 - df2tpr[i] for i in range(0, len(df2tpr))]
     np.testing.assert_allclose(dm.Metrics.compute_eer(df2fpr, df2fnr), df2eer)
 
+    # check the partial AUC extended up to fpr_stop, and the EER where fpr == fnr
+    fpr_stop_list3 = [0.25, 0.5, 0.75, 1]
+    clipped_aucs1 = [1. / 8, 1. / 4, 1. / 2, 3. / 4]
+    for k in range(0, len(fpr_stop_list3)):
+        np.testing.assert_allclose(dm.Metrics.compute_auc(
+            df1fpr, df1tpr, fpr_stop_list3[k], clip=True), clipped_aucs1[k])
+    np.testing.assert_allclose(dm.Metrics.compute_auc(df2fpr, df2tpr, 0.6, clip=True), 16. / 75)
+    # a point on fpr == fnr is the EER itself
+    np.testing.assert_allclose(dm.Metrics.compute_eer(df1fpr, df1fnr, interpolate=True), df1eer)
+    np.testing.assert_allclose(dm.Metrics.compute_eer(df2fpr, df2fnr, interpolate=True), 6. / 11)
+
     # check CD@FAR
     DM3 = dm.detMetrics(df1['score'], df1['gt'], fpr_stop=0.5)
     np.testing.assert_almost_equal(DM3.tpr_at_fpr, 0.5)
@@ -91,6 +102,45 @@ def unittestMetrics():
     np.testing.assert_almost_equal(
         dm.Metrics.linear_interpolated_point(df4fpr, df4tpr, 0.5)[0], (0.5, 0.5))
 
+    # check the bootstrap statistics against the point estimates on the trials themselves.
+    # The levels 1 to 3 are collinear points, and level 4 has no trials
+    t_counts5 = np.array([[1, 1, 1, 1, 0, 0, 1]])
+    nt_counts5 = np.array([[0, 1, 1, 1, 0, 2, 1]])
+    score5 = np.repeat(np.arange(7, 0, -1), t_counts5[0] + nt_counts5[0])
+    gt5 = np.concatenate([['Y'] * t + ['N'] * nt for t, nt in zip(t_counts5[0], nt_counts5[0])])
+    for fpr_stop in [0.1, 0.3, 0.5, 1]:
+        DM5 = dm.detMetrics(score5, gt5, fpr_stop=fpr_stop)
+        auc5, eer5, cdr5 = dm.Metrics.weighted_roc_stats(t_counts5, nt_counts5, fpr_stop)
+        np.testing.assert_allclose(auc5, [DM5.auc_at_fpr])
+        np.testing.assert_allclose(eer5, [DM5.eer])
+        np.testing.assert_allclose(cdr5, [DM5.tpr_at_fpr])
+
+    # check the ROC points computed for several groups at once against those of each group.
+    # Group 0 has ties across targets and non-targets, group 1 has only targets, group 2
+    # has no trials, and group 3 starts with a tie of a target and a non-target
+    score6 = np.array([0.9, 0.8, 0.8, 0.7, 0.7, 0.7, 0.2, 0.6, 0.6, 0.3, 0.5, 0.5, 0.4, 0.4, 0.1])
+    gt6 = np.array(['Y', 'N', 'Y', 'Y', 'N', 'N', 'Y', 'Y', 'Y', 'Y', 'Y', 'N', 'N', 'Y', 'N'])
+    group6 = np.array([0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 3, 3, 3, 3, 3])
+    points6 = dm.Metrics.compute_points_grouped(score6, gt6 == 'Y', group6, 4)
+    np.testing.assert_equal(points6[2], None)
+    for g in [0, 1, 3]:
+        expected6 = dm.Metrics.compute_points_sk(score6[group6 == g], gt6[group6 == g])
+        for x, y in zip(points6[g], expected6):
+            np.testing.assert_allclose(x, y)
+
+    # check that the confidence intervals do not depend on how many trials of the
+    # bootstrap resamples are drawn and counted at once
+    rs7 = np.random.RandomState(7)
+    score7 = np.round(rs7.normal(size=1000), 2)
+    gt7 = np.where(rs7.uniform(size=1000) < 0.3, 'Y', 'N')
+    ci_chunk_elements = dm.ci_chunk_elements
+    for fpr_stop in [0.1, 1]:
+        ci7 = dm.Metrics.compute_ci(score7, gt7, 0.9, fpr_stop)
+        for elements in [1, 3 * score7.size + 1]:
+            dm.ci_chunk_elements = elements
+            np.testing.assert_equal(dm.Metrics.compute_ci(score7, gt7, 0.9, fpr_stop), ci7)
+        dm.ci_chunk_elements = ci_chunk_elements
+
     print("All detection scorer unit test successfully complete.\n")
 
 
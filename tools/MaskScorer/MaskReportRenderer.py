@@ -0,0 +1,89 @@
+#!/usr/bin/env python2
+"""
+* File: MaskReportRenderer.py
+* Date: 10/18/2026
+* Status: Complete
+
+* Description: This renders the per-probe HTML reports of the mask scorer from the data saved by
+               MaskScorer.py -html --deferRender, for all of the probes scored or for a selection
+               of them, on a pool of processes.
+
+* Requirements: This code requires the following packages:
+
+    - opencv
+    - pandas
+    - matplotlib
+
+  The rest are available on your system
+
+* Disclaimer:
+This software was developed at the National Institute of Standards
+and Technology (NIST) by employees of the Federal Government in the
+course of their official duties. Pursuant to Title 17 Section 105
+of the United States Code, this software is not subject to copyright
+protection and is in the public domain. NIST assumes no responsibility
+whatsoever for use by other parties of its source code or open source
+server, and makes no guarantees, expressed or implied, about its quality,
+reliability, or any other characteristic."
+"""
+
+import sys
+import argparse
+import os
+
+lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib")
+sys.path.append(lib_path)
+from maskMetricsRender import findRenderData,selectRenderData,renderReports
+from constants import query_exception
+import fileOps
+
+parser = argparse.ArgumentParser(description='Render the per-probe HTML reports of the mask scorer.')
+parser.add_argument('-oR','--outRoot',type=str,
+help="The directory root plus prefix the scorer saved its outputs to. The reports are rendered for the render data found in the probe subdirectories of its directory.",metavar='character')
+parser.add_argument('--worst',type=int,default=0,
+help="Render the reports of only this many probes, those with the lowest OptimumMCC. (default: %(default)s, which renders them all)",metavar='integer')
+parser.add_argument('-q','--query',type=str,default='',
+help="Render the reports of only the probes whose scores match this query (e.g. \"OptimumMCC < 0.5\"). Applied before --worst.",metavar='character')
+parser.add_argument('--rocFormat',type=str,default='pdf',choices=['pdf','png'],
+help="The format to save the per-probe ROC curves in. PNG is faster to render. (default: %(default)s)")
+parser.add_argument('-p','--processors',type=int,default=1,
+help="The number of processors to render the reports with. (default: %(default)s)",metavar='integer')
+parser.add_argument('-v','--verbose',action='store_true',help="Print output.")
+
+args = parser.parse_args()
+
+if len(sys.argv) < 2:
+    parser.print_help()
+    exit(0)
+
+def printerr(string,exitcode=1):
+    if args.verbose:
+        parser.print_help()
+    print(string)
+    exit(exitcode)
+
+if args.outRoot in [None,'']:
+    printerr("ERROR: the folder name and prefix for outputs must be supplied.")
+if args.worst < 0:
+    printerr("ERROR: The number of probes to render must be a positive integer, or 0 to render them all.")
+
+outdir = os.path.dirname(args.outRoot)
+if outdir == '':
+    outdir = '.'
+paths = findRenderData(outdir)
+if len(paths) == 0:
+    printerr("ERROR: No render data was found in {}. Please score with -html first.".format(outdir))
+
+try:
+    paths = selectRenderData(paths,args.worst,args.query)
+except query_exception:
+    printerr("ERROR: The query '{}' does not match the columns of the scores.".format(args.query))
+
+if args.verbose:
+    print("Rendering {} HTML reports...".format(len(paths)))
+errlist = renderReports(paths,args.processors,args.verbose,args.rocFormat)
+if args.verbose:
+    print(fileOps.summary())
+if len(errlist) > 0:
+    print("{} of the {} HTML reports could not be rendered.".format(len(errlist),len(paths)))
+    exit(1)
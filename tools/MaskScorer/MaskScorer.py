@@ -46,8 +46,12 @@ import configparser
 lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib")
 sys.path.append(lib_path)
 from metricRunner import maskMetricRunner
+from maskMetricsRender import renderReports
 import Partition_mask as pt
+from queryMasks import queryMasks
+import csvCache
 from myround import myround
+import fileOps
 #import masks
 #execfile(os.path.join(lib_path,"masks.py"))
 #execfile('maskreport.py')
@@ -106,6 +110,8 @@ parser.add_argument('--rbin',type=int,default=-1,
 help="Binarize the reference mask in the relevant mask file to black and white with a numeric threshold in the interval [0,255]. Pick -1 to evaluate the relevant regions based on the other arguments. [default=-1]",metavar='integer')
 parser.add_argument('--sbin',type=int,default=-10,
 help="Binarize the system output mask to black and white with a numeric threshold in the interval [-1,255]. -1 can be chosen to binarize the entire mask to white. -10 indicates that the threshold for the mask will be chosen at the maximal absolute MCC value. [default=-10]",metavar='integer')
+parser.add_argument('--sbinList',type=int,nargs='+',default=[],
+help="Additional thresholds in the interval [-1,255] at which to report the Actual metrics, alongside --sbin. They are looked up in the same table of thresholds as the Optimum metrics. Each threshold T adds the columns ActualNMM_T, ActualMCC_T, ActualBWL1_T, and ActualPixelTP_T through ActualPixelFN_T.",metavar='integer')
 parser.add_argument('--jpeg2000',action='store_true',help="Evaluate JPEG2000 reference masks. Individual regions in the JPEG2000 masks may interserct; each pixel may contain multiple manipulations.")
 parser.add_argument('--nspx',type=int,default=-1,
 help="Set a pixel value for all system output masks to serve as a no-score region [0,255]. -1 indicates that no particular pixel value will be chosen to be the no-score zone. [default=-1]",metavar='integer')
@@ -123,14 +129,26 @@ help="The number of digits to round computed scores. Note that rounding is not a
 parser.add_argument('--truncate',action='store_true',
 help="Truncate rather than round the figures to the specified precision. If no number is specified for precision, the default 16 will be used.")
 parser.add_argument('-html',help="Output data to HTML files.",action="store_true")
+parser.add_argument('--deferRender',action='store_true',help="With -html, save only the data the per-probe HTML reports are rendered from, and leave the rendering to MaskReportRenderer.py, so that the scores are not held up by the reports.")
+parser.add_argument('--rocFormat',type=str,default='pdf',choices=['pdf','png'],
+help="The format to save the per-probe ROC curves of the HTML reports in. PNG is faster to render. (default: %(default)s)")
 parser.add_argument('--optOut',action='store_true',help="Evaluate algorithm performance on a select number of trials determined by the performer via values in the ProbeStatus column.")
 parser.add_argument('--displayScoredOnly',action='store_true',help="Display only the data for which a localized score could be generated.")
 parser.add_argument('-xF','--indexFilter',action='store_true',help="Filter scoring to only files that are present in the index file. This option permits scoring to select smaller index files for the purpose of testing.")
 parser.add_argument('--speedup',action='store_true',help="Run mask evaluation with a sped-up evaluator.")
+parser.add_argument('--engine',type=str,default='bincount',choices=['bincount','unique'],
+help="The method used by the sped-up evaluator to count the confusion measures over all thresholds: [bincount] counts over a compact key of the system output, reference, and weight values; [unique] counts the distinct values of a full-size composite matrix, as in earlier versions. (default: %(default)s)",metavar='character')
+parser.add_argument('--strip_rows',type=int,default=0,
+help="Score each pair of masks in horizontal strips of this many rows, keeping only the threshold histograms for the whole mask. This bounds the memory used to generate the no-score zones and count the confusion measures for very large masks. The masks themselves are still read, binarized, and checked for a region in their entirety. Implies --speedup, and cannot be used with -html. (default: %(default)s, which scores each mask in its entirety)",metavar='integer')
+parser.add_argument('--artifacts',type=str,default='none',choices=['none','summary','full'],
+help="The per-probe output to keep besides the scores: [none] keeps nothing; [summary] saves the confusion measures at each threshold of every probe in a single file, <outRoot>_thresMets.npz (<outRoot>_probe_thresMets.npz and <outRoot>_donor_thresMets.npz for the splice task); [full] saves the whole threshold tables in that file, and the system output masks binarized at --sbin in a subdirectory for each probe. The -html report writes its own files for each probe regardless. (default: %(default)s)",metavar='character')
 parser.add_argument('--debug_off',action='store_false',help="Continue running localization scorer on the next probe even when encountering errors. This can be used to skip unwanted .")
 parser.add_argument('--cache_dir',type=str,default=None,
 help="The directory to cache reference mask data for future use. Subdirectories will be created according to specific details related to the task.",metavar='valid file directory')
+parser.add_argument('--cache_size',type=int,default=1024,
+help="The maximum size in megabytes of the reference no-score zones kept in the cache directory. The least recently used entries are removed once the cache grows past this size. Set to 0 for no limit. (default: %(default)s)",metavar='integer')
 parser.add_argument('--cache_flush',action='store_true',help="Flush the cache directory before starting computation. This is especially crucial when the queryManipulation options are used in conjunction with --cache_dir.")
+parser.add_argument('--incremental',action='store_true',help="Store the scores of each probe in the cache directory, and reuse them on later runs for the probes whose reference mask, system output mask, row of system output, and scoring parameters are unchanged. Only the other probes are scored again before the scores are aggregated. Requires --cache_dir, and has no effect with -html or where --artifacts full saves the binarized masks.")
 
 args = parser.parse_args()
 
@@ -178,6 +196,20 @@ if args.inSys is None:
 if args.inIndex is None:
     printerr("ERROR: Input file name for index files must be supplied.")
 
+if args.strip_rows < 0:
+    printerr("ERROR: The number of rows in each strip must be a positive integer, or 0 to score each mask in its entirety.")
+if (args.strip_rows > 0) and args.html:
+    printerr("ERROR: The HTML report requires the full no-score zones. Please do not use --strip_rows with -html.")
+if args.cache_size < 0:
+    printerr("ERROR: The cache size must be a positive number of megabytes, or 0 for no limit.")
+if args.incremental and not args.cache_dir:
+    printerr("ERROR: Incremental scoring stores the scores in the cache directory. Please set --cache_dir with --incremental.")
+for th in args.sbinList:
+    if (th < -1) or (th > 255):
+        printerr("ERROR: The thresholds in --sbinList must be in the interval [-1,255].")
+#drop repeats, keeping the order given
+args.sbinList = [th for i,th in enumerate(args.sbinList) if th not in args.sbinList[:i]]
+
 #create the folder and save the mask outputs
 #set.seed(1)
 
@@ -194,9 +226,7 @@ if args.outRoot in [None,'']:
 outdir=os.path.dirname(args.outRoot)
 outpfx=os.path.basename(args.outRoot)
 
-def mkdir(dirname):
-    if not os.path.isdir(dirname):
-        os.system('mkdir {}'.format(dirname))
+mkdir = fileOps.mkdir
 
 mkdir(outdir)
 
@@ -236,10 +266,10 @@ myRefFile = os.path.join(myRefDir,args.inRef)
 with open(myRefFile,'r') as ref:
     ref_dtype = {h:str for h in ref.readline().rstrip().split('|')} #treat it as string
 
-myRef = pd.read_csv(myRefFile,sep="|",header=0,dtype=ref_dtype,na_filter=False)
+myRef = csvCache.read_csv(myRefFile,sep="|",header=0,dtype=ref_dtype,na_filter=False)
 #sub_ref = myRef[myRef['IsTarget']=="Y"].copy()
 sub_ref = myRef
-myIndex = pd.read_csv(os.path.join(myRefDir,args.inIndex),sep="|",header=0,dtype=index_dtype,na_filter=False)
+myIndex = csvCache.read_csv(os.path.join(myRefDir,args.inIndex),sep="|",header=0,dtype=index_dtype,na_filter=False)
 
 param_pfx = ['Probe']
 if args.task == 'splice':
@@ -384,6 +414,14 @@ class loc_scoring_params:
     def __init__(self,**kwds):
         self.__dict__.update(kwds)
 
+def sbin_list_cols(pfx='',mets=['NMM','MCC','BWL1'],pix=[]):
+    #the names of the columns of the Actual metrics at the thresholds in --sbinList
+    cols = []
+    for th in args.sbinList:
+        cols.extend(['%sActual%s_%d' % (pfx,met,th) for met in mets])
+        cols.extend(['%sActualPixel%s_%d' % (pfx,mes,th) for mes in pix])
+    return cols
+
 def round_df(my_df,metlist):
     df_cols = list(my_df)
     final_metlist = [met for met in metlist if met in df_cols]
@@ -400,7 +438,7 @@ if args.task == 'manipulation':
         # convert to the str type to the float type for computations
         #m_df['ConfidenceScore'] = m_df['ConfidenceScore'].astype(np.float)
     
-        metricRunner = maskMetricRunner(m_df,args.refDir,sysDir,args.rbin,args.sbin,journalData,probeJournalJoin,index,speedup=args.speedup,color=args.jpeg2000)
+        metricRunner = maskMetricRunner(m_df,args.refDir,sysDir,args.rbin,args.sbin,journalData,probeJournalJoin,index,speedup=args.speedup,engine=args.engine,color=args.jpeg2000)
 
         #revise this to outputRoot and loc_scoring_params
 #        params = loc_scoring_params(0,args.eks,args.dks,args.ntdks,args.nspx,args.perProbePixelNoScore,args.kernel,args.verbose,args.html,precision,args.truncate,args.processors,args.debug_off,cache_dir=cache_dir)
@@ -417,11 +455,20 @@ if args.task == 'manipulation':
                                     precision = precision,
                                     truncate = args.truncate,
                                     processors = args.processors,
+                                    strip_rows = args.strip_rows,
+                                    sbin_list = args.sbinList,
+                                    artifacts = args.artifacts,
                                     debug_off = args.debug_off,
-                                    cache_dir = cache_dir
+                                    cache_dir = cache_dir,
+                                    cache_size = args.cache_size,
+                                    incremental = args.incremental
                                    )
 
         df = metricRunner.getMetricList(outputRoot,params)
+        if args.artifacts != 'none':
+            metricRunner.saveThresholdTables(os.path.join(outputRoot,'_'.join([prefix,'thresMets.npz'])))
+        if args.html and not args.deferRender:
+            renderReports(metricRunner.render_data,args.processors,verbose,args.rocFormat,remove=True)
 #        df = metricRunner.getMetricList(args.eks,args.dks,args.ntdks,args.nspx,args.kernel,outputRoot,args.verbose,args.html,precision=args.precision,processors=args.processors)
         merged_df = pd.merge(m_df.drop('Scored',1),df,how='left',on='ProbeFileID')
 
@@ -435,7 +482,7 @@ if args.task == 'manipulation':
         #remove the rows that were not scored due to no region being present. We set those rows to have MCC == -2.
         if args.displayScoredOnly:
             #get the list of non-scored and delete them
-            nonscore_df['ProbeFileID'].apply(lambda x: os.system('rm -rf {}'.format(os.path.join(outputRoot,x))))
+            nonscore_df['ProbeFileID'].apply(lambda x: fileOps.rmtree(os.path.join(outputRoot,x)))
 #            nonscore_df['ProbeFileID'].apply(lambda x: os.system('echo {}'.format(os.path.join(outputRoot,x))))
             merged_df = merged_df.query('OptimumMCC > -2')
     
@@ -447,6 +494,7 @@ if args.task == 'manipulation':
                           'MaximumPixelTP','MaximumPixelTN','MaximumPixelFP','MaximumPixelFN',
                           'ActualThreshold','ActualNMM','ActualMCC','ActualBWL1',
                           'ActualPixelTP','ActualPixelTN','ActualPixelFP','ActualPixelFN'])
+        firstcols.extend(sbin_list_cols(pix=['TP','TN','FP','FN']))
 
         metadata = [t for t in rcols if t not in firstcols]
         firstcols.extend(metadata)
@@ -498,6 +546,7 @@ if args.task == 'manipulation':
             #if nothing was scored, print a message and return
             print("None of the masks that we attempted to score for query {} had regions to be scored. Further factor analysis is futile.".format(query))
             return 0
+        metrics_to_be_scored.extend(sbin_list_cols())
         r_dfc = r_df.copy()
         r_idx = r_dfc.query('OptimumMCC == -2').index
         r_dfc.loc[r_idx,'Scored'] = 'N'
@@ -653,6 +702,8 @@ if args.task == 'manipulation':
                     metriclist['Actual%s' % met] = 3
             for met in ['GWL1','AUC','EER']:
                 metriclist[met] = 3
+            for met in sbin_list_cols():
+                metriclist[met] = 3
             
             a_df_copy = average_df.copy().round(metriclist)
             myf.write('<h3>Average Scores</h3>\n')
@@ -681,13 +732,13 @@ elif args.task == 'splice':
         # convert to the str type to the float type for computations
         #m_df['ConfidenceScore'] = m_df['ConfidenceScore'].astype(np.float)
 #        maskMetricRunner = mm.maskMetricList(m_df,refDir,sysDir,rbin,sbin,journalData,probeJournalJoin,index,mode=1)
-        metricRunner = maskMetricRunner(m_df,refDir,sysDir,rbin,args.sbin,journalData,probeJournalJoin,index,speedup=args.speedup,color=False)
+        metricRunner = maskMetricRunner(m_df,refDir,sysDir,rbin,args.sbin,journalData,probeJournalJoin,index,speedup=args.speedup,engine=args.engine,color=False)
 #        probe_df = maskMetricRunner.getMetricList(erodeKernSize,dilateKernSize,0,kern,outputRoot,verbose,html,precision=precision)
         #TODO: temporary until we can evaluate color for the splice task
         cache_dir_new=None
         if cache_dir:
             if args.cache_flush:
-                os.system('rm -rf {}/*'.format(cache_dir))
+                fileOps.clear_dir(cache_dir)
             cache_dir_new = os.path.join(cache_dir,'probe')
             mkdir(cache_dir_new)
 
@@ -706,10 +757,19 @@ elif args.task == 'splice':
                                     precision = precision,
                                     truncate = args.truncate,
                                     processors = args.processors,
+                                    strip_rows = args.strip_rows,
+                                    sbin_list = args.sbinList,
+                                    artifacts = args.artifacts,
                                     debug_off = args.debug_off,
-                                    cache_dir = cache_dir_new
+                                    cache_dir = cache_dir_new,
+                                    cache_size = args.cache_size,
+                                    incremental = args.incremental
                                    )
         probe_df = metricRunner.getMetricList(outputRoot,params)
+        if args.artifacts != 'none':
+            metricRunner.saveThresholdTables(os.path.join(outputRoot,'_'.join([prefix,'probe','thresMets.npz'])))
+        if args.html and not args.deferRender:
+            renderReports(metricRunner.render_data,args.processors,verbose,args.rocFormat,remove=True)
 #        probe_df = metricRunner.getMetricList(args.eks,args.dks,0,args.nspx,args.kernel,outputRoot,args.verbose,args.html,precision=args.precision,processors=args.processors)
     
 #        maskMetricRunner = mm.maskMetricList(m_df,refDir,sysDir,rbin,sbin,journalData,probeJournalJoin,index,mode=2) #donor images
@@ -733,10 +793,19 @@ elif args.task == 'splice':
                                     precision = precision,
                                     truncate = args.truncate,
                                     processors = args.processors,
+                                    strip_rows = args.strip_rows,
+                                    sbin_list = args.sbinList,
+                                    artifacts = args.artifacts,
                                     debug_off = args.debug_off,
-                                    cache_dir = cache_dir_new
+                                    cache_dir = cache_dir_new,
+                                    cache_size = args.cache_size,
+                                    incremental = args.incremental
                                    )
         donor_df = metricRunner.getMetricList(outputRoot,params)
+        if args.artifacts != 'none':
+            metricRunner.saveThresholdTables(os.path.join(outputRoot,'_'.join([prefix,'donor','thresMets.npz'])))
+        if args.html and not args.deferRender:
+            renderReports(metricRunner.render_data,args.processors,verbose,args.rocFormat,remove=True)
 #        donor_df = metricRunner.getMetricList(args.eks,args.dks,0,args.nspx,args.kernel,outputRoot,args.verbose,args.html,precision=args.precision,processors=args.processors)
 
         #make another dataframe here that's formatted distinctly from the first.
@@ -801,6 +870,7 @@ elif args.task == 'splice':
                                            "ColMaskFileName":"ProbeColMaskFileName",
                                            "AggMaskFileName":"ProbeAggMaskFileName",
                                            "Scored":"ProbeScored"},inplace=True)
+        probe_df.rename(index=str,columns=dict([(c,''.join(['p',c])) for c in sbin_list_cols(pix=['TP','TN','FP','FN'])]),inplace=True)
     
         donor_df.rename(index=str,columns={"OptimumNMM":"dOptimumNMM",
                                            "OptimumMCC":"dOptimumMCC",
@@ -838,6 +908,7 @@ elif args.task == 'splice':
                                            "ColMaskFileName":"DonorColMaskFileName",
                                            "AggMaskFileName":"DonorAggMaskFileName",
                                            "Scored":"DonorScored"},inplace=True)
+        donor_df.rename(index=str,columns=dict([(c,''.join(['d',c])) for c in sbin_list_cols(pix=['TP','TN','FP','FN'])]),inplace=True)
     
         pd_df = pd.concat([probe_df,donor_df],axis=1)
         merged_df = pd.merge(m_df,pd_df,how='left',on=['ProbeFileID','DonorFileID']).drop('Scored',1)
@@ -857,6 +928,8 @@ elif args.task == 'splice':
                           'pActualPixelTP','pActualPixelTN','pActualPixelFP','pActualPixelFN',
                           'dActualThreshold','dActualNMM','dActualMCC','dActualBWL1',
                           'dActualPixelTP','dActualPixelTN','dActualPixelFP','dActualPixelFN'])
+        for pfx in ['p','d']:
+            firstcols.extend(sbin_list_cols(pfx,pix=['TP','TN','FP','FN']))
         metadata = [t for t in rcols if t not in firstcols]
         firstcols.extend(metadata)
         merged_df = merged_df[firstcols]
@@ -871,6 +944,7 @@ elif args.task == 'splice':
                                        'MaximumPixelTP','MaximumPixelTN','MaximumPixelFP','MaximumPixelFN',
                                        'ActualThreshold','ActualNMM','ActualMCC','ActualBWL1',
                                        'ActualPixelTP','ActualPixelTN','ActualPixelFP','ActualPixelFN'])
+            metriclist.extend(sbin_list_cols(pix=['TP','TN','FP','FN']))
             
             for met in metriclist:
                 merged_df.loc[p_idx,''.join(['p',met])] = np.nan
@@ -892,7 +966,7 @@ elif args.task == 'splice':
 
         if args.displayScoredOnly:
             #get the list of non-scored and delete them
-            nonscore_df.apply(lambda x: os.system('rm -rf {}'.format(os.path.join(outputRoot,'_'.join(x['ProbeFileID'],x['DonorFileID'])))))
+            nonscore_df.apply(lambda x: fileOps.rmtree(os.path.join(outputRoot,'_'.join(x['ProbeFileID'],x['DonorFileID']))))
 #            nonscore_df.apply(lambda x: os.system('echo {}'.format(os.path.join(outputRoot,'_'.join(x['ProbeFileID'],x['DonorFileID'])))))
             merged_df = merged_df.query('(pOptimumMCC > -2) and (dOptimumMCC > -2)')
         return merged_df,stackmerge
@@ -941,6 +1015,8 @@ elif args.task == 'splice':
             #if nothing was scored, print a message and return
             print("None of the masks that we attempted to score for query {} had regions to be scored. Further factor analysis is futile.".format(query))
             return 0
+        for pfx in ['p','d']:
+            metrics_to_be_scored.extend(sbin_list_cols(pfx))
         p_idx = r_df.query('pOptimumMCC == -2').index
         d_idx = r_df.query('dOptimumMCC == -2').index
         r_dfc = r_df.copy()
@@ -1121,6 +1197,8 @@ elif args.task == 'splice':
                     if args.sbin >= -1:
                         metriclist[''.join([pfx,'Maximum',met])] = 3
                         metriclist[''.join([pfx,'Actual',met])] = 3
+                for met in sbin_list_cols(pfx):
+                    metriclist[met] = 3
                 for met in ['GWL1','AUC','EER']:
                     metriclist[''.join([pfx,met])] = 3
 
@@ -1175,13 +1253,13 @@ if args.precision < 1:
 refpfx = os.path.join(myRefDir,args.inRef.split('.')[0])
 #try/catch this
 try:
-    probeJournalJoin = pd.read_csv('-'.join([refpfx,'probejournaljoin.csv']),sep="|",header=0,na_filter=False)
+    probeJournalJoin = csvCache.read_csv('-'.join([refpfx,'probejournaljoin.csv']),sep="|",header=0,na_filter=False)
 except IOError:
     print("No probeJournalJoin file is present. This run will terminate.")
     exit(1)
 
 try:
-    journalMask = pd.read_csv('-'.join([refpfx,'journalmask.csv']),sep="|",header=0,na_filter=False)
+    journalMask = csvCache.read_csv('-'.join([refpfx,'journalmask.csv']),sep="|",header=0,na_filter=False)
 except IOError:
     print("No journalMask file is present. This run will terminate.")
     exit(1)
@@ -1190,7 +1268,7 @@ except IOError:
 
 def cache_init(cache_dir,output_dir,query=''):
     if args.cache_flush:
-        os.system('rm -rf {}/*'.format(cache_dir))
+        fileOps.clear_dir(cache_dir)
     mkdir(cache_dir)
     #save all metadata in a file in this directory.
     config_meta = configparser.ConfigParser()
@@ -1225,7 +1303,7 @@ def cache_init(cache_dir,output_dir,query=''):
         #if not equal, print a warning
         if existing_config != config_meta:
             print("Warning: a config file exists, but is not identical to the parameters generated.")
-            os.system('diff {} {}'.format(tmp_path,config_name))
+            print("\n".join(fileOps.diff_files(tmp_path,config_name)))
             #if reference files are not identical, terminate and ask for a new reference directory
             score_status = 0
             config_check_fields = ['eval_task:task:evaluation tasks',
@@ -1239,17 +1317,7 @@ def cache_init(cache_dir,output_dir,query=''):
             for fields in config_check_fields:
                 f1,f2,ferr = fields.split(':')
                 if (f1 == 'no_score_parameters') and (score_status == 0) and (existing_config[f1][f2] != config_meta[f1][f2]):
-                    print("The {} are not equal between the configuration files. Preparing to reset the no-score masks.".format(ferr))
-                    #remove all bns.png and sns.png.
-                    if args.task == 'manipulation':
-                        os.system('rm -f {}'.format(os.path.join(cache_dir,'*_bns.png')))
-                        os.system('rm -f {}'.format(os.path.join(cache_dir,'*_sns.png')))
-                    elif args.task == 'splice':
-                        #append probe and donor dirs if splice
-                        for sub_dir in ['probe','donor']:
-                            cache_sub_dir = os.path.join(cache_dir,sub_dir)
-                            os.system('rm -f {}'.format(os.path.join(cache_sub_dir,'*_bns.png')))
-                            os.system('rm -f {}'.format(os.path.join(cache_sub_dir,'*_sns.png')))
+                    print("The {} are not equal between the configuration files. No-score zones are cached under the parameters that generated them, and will be regenerated for the new parameters.".format(ferr))
                     continue
                 if existing_config[f1][f2] != config_meta[f1][f2]:
                     print("Error: the {} are not equal between the configuration files.".format(ferr))
@@ -1284,6 +1352,9 @@ if args.task == 'manipulation':
 
     if factor_mode == 'qm':
         queryM = query
+        #the merged data is the same for every query, so merge once and evaluate each condition once
+        printq("Merging main data and journal data for querying...")
+        qm_masks = queryMasks(pd.merge(m_df,pd.merge(probeJournalJoin,journalMask,how='left',on=journaljoinfields),how='left',on=['ProbeFileID','JournalName']))
     else:
         queryM = ['']
 
@@ -1301,16 +1372,16 @@ if args.task == 'manipulation':
         #use big_df to filter from the list as a temporary thing
         if q is not '':
             #exit if query does not match
-            printq("Merging main data and journal data and querying the result...")
+            printq("Querying the merged main data and journal data...")
             try:
-                big_df = pd.merge(m_df,journalData_df,how='left',on=['ProbeFileID','JournalName']).query(q) #TODO: test on sample with a print?
+                big_df = qm_masks.select(q) #TODO: test on sample with a print?
             except pd.computation.ops.UndefinedVariableError:
                 print("The query '{}' doesn't seem to refer to a valid key. Please correct the query and try again.".format(q))
                 exit(1)
 
-            m_dfc = m_dfc.query("ProbeFileID=={}".format(np.unique(big_df.ProbeFileID).tolist()))
+            m_dfc = m_dfc[m_dfc['ProbeFileID'].isin(big_df['ProbeFileID'])]
             #journalData = journalData.query("ProbeFileID=={}".format(list(big_df.ProbeFileID)))
-            journalData_df = journalData_df.query("ProbeFileID=={}".format(list(big_df.ProbeFileID)))
+            journalData_df = journalData_df[journalData_df['ProbeFileID'].isin(big_df['ProbeFileID'])]
 #            journalData_df = journalData_df.merge(big_df[['ProbeFileID','JournalName','StartNodeID','EndNodeID']],how='left',on=['ProbeFileID','JournalName','StartNodeID','EndNodeID'])
             journalData0.loc[journalData0.reset_index().merge(big_df[['ProbeFileID','ProbeMaskFileName'] + journaljoinfields],\
                              how='left',on=journaljoinfields).set_index('index').dropna().drop('ProbeMaskFileName',1).index,'Evaluated'] = 'Y'
@@ -1346,6 +1417,7 @@ if args.task == 'manipulation':
 #        if args.sbin >= -1:
         metrics.extend(['MaximumNMM','MaximumMCC','MaximumBWL1',
                         'ActualNMM','ActualMCC','ActualBWL1'])
+        metrics.extend(sbin_list_cols())
         constant_mets = ['PixelAverageAUC','MaskAverageAUC']
 #        if args.sbin >= -1:
         constant_mets.extend(['MaximumThreshold','ActualThreshold'])
@@ -1381,6 +1453,7 @@ if args.task == 'manipulation':
         if args.sbin >= -1:
             pix2ints.extend(['MaximumPixelTP','MaximumPixelFP','MaximumPixelTN','MaximumPixelFN',
                              'ActualPixelTP','ActualPixelFP','ActualPixelTN','ActualPixelFN'])
+        pix2ints.extend(sbin_list_cols(mets=[],pix=['TP','FP','TN','FN']))
 
         for pix in pix2ints:
             r_df[pix] = r_df[pix].dropna().apply(lambda x: str(int(x)))
@@ -1442,8 +1515,17 @@ elif args.task == 'splice':
     journalData0.index = range(n_journals)
     #TODO: basic data cleanup ends here
 
+    #use big_df to filter from the list as a temporary thing
+    journalData_df = pd.merge(probeJournalJoin,journalMask,how='left',on=journaljoinfields)
+    bigdf_join_fields = param_ids
+    if 'JournalName' in m_df.columns.values.tolist():
+        bigdf_join_fields = param_ids + ['JournalName']
+
     if factor_mode == 'qm':
         queryM = query
+        #the merged data is the same for every query, so merge once and evaluate each condition once
+        printq("Merging main data and journal data for querying...")
+        qm_masks = queryMasks(pd.merge(m_df,journalData_df,how='left',on=bigdf_join_fields))
     else:
         queryM = ['']
 
@@ -1457,23 +1539,19 @@ elif args.task == 'splice':
             else:
                 journalData0[param+'Evaluated'] = pd.Series(['Y']*n_journals)
 
-        #use big_df to filter from the list as a temporary thing
-        journalData_df = pd.merge(probeJournalJoin,journalMask,how='left',on=journaljoinfields)
         #journalData = journalData0.copy()
 
         if q is not '':
             #exit if query does not match
-            printq("Merging main data and journal data and querying the result...")
+            printq("Querying the merged main data and journal data...")
             try:
-                bigdf_join_fields = param_ids
-                if 'JournalName' in m_df.columns.values.tolist():
-                    bigdf_join_fields = param_ids + ['JournalName']
-                big_df = pd.merge(m_df,journalData_df,how='left',on=bigdf_join_fields).query(q)
+                big_df = qm_masks.select(q)
             except pd.computation.ops.UndefinedVariableError:
                 print("The query '{}' doesn't seem to refer to a valid key. Please correct the query and try again.".format(q))
                 exit(1)
 
-            #do a join with the big dataframe and filter out the stuff that doesn't show up by pairs
+            #do a join with the big dataframe and filter out the stuff that doesn't show up by pairs.
+            #This stays a merge rather than an isin lookup, since it keeps a row per matching operation
             m_dfc = pd.merge(m_dfc,big_df[bigdf_join_fields + ['Operation']],how='left',on=bigdf_join_fields).dropna().drop('Operation',1)
             #journalData = pd.merge(journalData0,big_df[['ProbeFileID','DonorFileID','JournalName']],how='left',on=['ProbeFileID','DonorFileID','JournalName'])
             journalData0.loc[journalData0.reset_index().merge(big_df[journaljoinfields + ['ProbeFileID','DonorFileID','ProbeMaskFileName']],\
@@ -1515,6 +1593,8 @@ elif args.task == 'splice':
                         'dMaximumNMM','dMaximumMCC','dMaximumBWL1',
                         'pActualNMM','pActualMCC','pActualBWL1',
                         'dActualNMM','dActualMCC','dActualBWL1'])
+        for pfx in ['p','d']:
+            metrics.extend(sbin_list_cols(pfx))
         constant_mets = ['pPixelAverageAUC','dPixelAverageAUC','pMaskAverageAUC','dMaskAverageAUC']
 #        if args.sbin >= -1:
         constant_mets.extend(['pMaximumThreshold','dMaximumThreshold','pActualThreshold','dActualThreshold'])
@@ -1561,6 +1641,8 @@ elif args.task == 'splice':
                              'pActualPixelTP','pActualPixelFP','pActualPixelTN','pActualPixelFN',
                              'dMaximumPixelTP','dMaximumPixelFP','dMaximumPixelTN','dMaximumPixelFN',
                              'dActualPixelTP','dActualPixelFP','dActualPixelTN','dActualPixelFN'])
+        for pfx in ['p','d']:
+            pix2ints.extend(sbin_list_cols(pfx,mets=[],pix=['TP','FP','TN','FN']))
 
         for pix in pix2ints:
             r_df[pix] = r_df[pix].dropna().apply(lambda x: str(int(x)))
@@ -1597,6 +1679,7 @@ elif args.task == 'splice':
 
         r_df.to_csv(path_or_buf=os.path.join(outRootQuery,'_'.join([prefix,'mask_scores_perimage.csv'])),sep="|",index=False)
 
+printq(fileOps.summary())
 printq("Ending the mask scoring report.")
 exit(0)
 
@@ -0,0 +1,131 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+# Micro-benchmarks of the mask scorer's per-probe stages against the implementations they replaced.
+import sys
+import os
+import shutil
+import tempfile
+import timeit
+import argparse
+import numpy as np
+import cv2
+
+lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib")
+sys.path.append(lib_path)
+from maskMetricsRender import detPackage, plotROC, rocPlotter
+import masks
+import maskMetrics as mm
+
+
+def make_curves(n_curves, n_points, seed=0):
+    """ n_curves random ROC curves of n_points points each from (0,0) to (1,1)
+    """
+    rng = np.random.RandomState(seed)
+    curves = []
+    for i in range(n_curves):
+        fpr = np.sort(rng.uniform(size=n_points))
+        tpr = np.sort(rng.uniform(size=n_points)) ** 0.25
+        fpr[0], tpr[0] = 0, 0
+        fpr[-1], tpr[-1] = 1, 1
+        curves.append((fpr, tpr))
+    return curves
+
+
+def best_time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def benchmark_roc(n_curves, n_points, repeat):
+    """ times plotting the per-probe ROC curves through plotROC, one new figure per curve,
+    and through one rocPlotter per format, checking that both plot the same curves
+    """
+    curves = make_curves(n_curves, n_points)
+    dets = [detPackage(tpr, fpr, 1, 0, 0.5, 100, 1000) for fpr, tpr in curves]
+    out_dir = tempfile.mkdtemp()
+
+    def plot_new_figures():
+        return [plotROC(d, 'roc_%d' % i, 'Probe %d' % i, out_dir) for i, d in enumerate(dets)]
+
+    print("{:>10} {:>8} {:>14} {:>16} {:>10}".format('curves', 'format', 'plotROC (s)', 'rocPlotter (s)', 'speedup'))
+    ref_figs = plot_new_figures()
+    new_time = best_time(plot_new_figures, repeat)
+    for roc_format in ['pdf', 'png']:
+        plotter = rocPlotter(roc_format)
+
+        def plot_reused_figure():
+            return [plotter.plot(fpr, tpr, d.auc, d.t_num, d.nt_num, 'Probe %d' % i, out_dir, 'roc_%d' % i)
+                    for i, ((fpr, tpr), d) in enumerate(zip(curves, dets))]
+        reused_time = best_time(plot_reused_figure, repeat)
+        #the last curve plotted is the one left on the reused figure
+        np.testing.assert_array_equal(plotter.curve.get_xdata(), ref_figs[-1].axes[0].lines[0].get_xdata())
+        np.testing.assert_array_equal(plotter.curve.get_ydata(), ref_figs[-1].axes[0].lines[0].get_ydata())
+        print("{:>10} {:>8} {:>14.3f} {:>16.3f} {:>9.1f}x".format(n_curves, roc_format, new_time, reused_time, new_time / reused_time))
+    shutil.rmtree(out_dir)
+
+
+def make_masks(side, out_dir, seed=0):
+    """ a side x side reference mask with a manipulated square, a noisy system output mask
+    scoring the square lower than the rest, and weights with no-score zones around the square
+    and in a separate strip
+    """
+    rng = np.random.RandomState(seed)
+    lo, hi = side // 4, 3 * side // 4
+    bwmat = 255 * np.ones((side, side), dtype=np.uint8)
+    bwmat[lo:hi, lo:hi] = 0
+    ones = np.ones((side, side), dtype=np.uint8)
+    rImg = masks.storedmask('ref_%d' % side, bwmat, ones, ones)
+
+    sysmat = rng.randint(0, 256, (side, side)).astype(np.uint8)
+    sysmat[lo:hi, lo:hi] = rng.randint(0, 128, (hi - lo, hi - lo))
+    sys_name = os.path.join(out_dir, 'sys_%d.png' % side)
+    cv2.imwrite(sys_name, sysmat)
+    sImg = masks.mask(sys_name)
+
+    w = ones.copy()
+    w[lo - 3:hi + 3, lo - 3:lo + 3] = 0
+    w[lo - 3:hi + 3, hi - 3:hi + 3] = 0
+    w[side - side // 10:, :] = 0
+    return rImg, sImg, w
+
+
+def benchmark_confusion(sides, repeat):
+    """ times counting the system output values per reference class with the 'unique' engine, which
+    counts the distinct values of a full-size composite matrix, and with the 'bincount' engine, checking
+    that both give the same histograms and threshold tables
+    """
+    out_dir = tempfile.mkdtemp()
+    print("{:>10} {:>12} {:>14} {:>10}".format('side', 'unique (s)', 'bincount (s)', 'speedup'))
+    for side in sides:
+        rImg, sImg, w = make_masks(side, out_dir)
+        times = {}
+        hists = {}
+        tables = {}
+        for engine in ['unique', 'bincount']:
+            metobj = mm.maskMetrics(rImg, sImg, w, engine=engine)
+            times[engine] = best_time(lambda: metobj.confusion_histograms(rImg, sImg, w), repeat)
+            hists[engine] = metobj.confusion_histograms(rImg, sImg, w)
+            tables[engine] = metobj.confusion_mets_all_thresholds(rImg, sImg, w)
+        np.testing.assert_array_equal(hists['unique'], hists['bincount'])
+        np.testing.assert_array_equal(tables['unique'][['TP', 'TN', 'FP', 'FN', 'N']].values,
+                                      tables['bincount'][['TP', 'TN', 'FP', 'FN', 'N']].values)
+        print("{:>10} {:>12.4f} {:>14.4f} {:>9.1f}x".format(side, times['unique'], times['bincount'], times['unique'] / times['bincount']))
+    shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the per-probe stages of the mask scorer against the implementations they replaced.')
+    parser.add_argument('--stage', type=str, default='all', choices=['all', 'confusion', 'roc'],
+                        help='The stage to time: [confusion] counts the confusion measures over all thresholds with each engine; [roc] plots the per-probe ROC curves; [all] times both (default: %(default)s)')
+    parser.add_argument('--sides', type=int, nargs='+', default=[512, 1024, 2048, 4096],
+                        help='The side lengths of the square masks to count the confusion measures of (default: %(default)s)', metavar='integer')
+    parser.add_argument('--curves', type=int, default=50,
+                        help='The number of per-probe ROC curves to plot (default: %(default)s)', metavar='integer')
+    parser.add_argument('--points', type=int, default=256,
+                        help='The number of points in each ROC curve (default: %(default)s)', metavar='integer')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='The number of timings to take the best of (default: %(default)s)', metavar='integer')
+    args = parser.parse_args()
+    if args.stage in ['all', 'confusion']:
+        benchmark_confusion(args.sides, args.repeat)
+    if args.stage in ['all', 'roc']:
+        benchmark_roc(args.curves, args.points, args.repeat)
@@ -0,0 +1,71 @@
+#!/bin/bash
+procs=4
+source test_init.sh
+TESTDIR=../../data/test_suite/maskScorerTests
+
+echo
+echo "CASE 4: VALIDATING STRIP AND INCREMENTAL SCORING"
+echo
+
+#score each suite in its entirety and in strips narrower than the halo of the erosion kernel
+for test_fields in\
+    manipulation:reference/manipulation/NC2017-manipulation-ref.csv:indexes/NC2017-manipulation-index.csv:B_NC2017_Unittest_Manipulation_ImgOnly_c-me2_1\
+    splice:reference/splice/NC2017-splice-ref.csv:indexes/NC2017-splice-index.csv:B_NC2017_Unittest_Splice_ImgOnly_p-me_1; do
+    task=`echo $test_fields | awk -F: '{print $1}'`
+    ref=`echo $test_fields | awk -F: '{print $2}'`
+    idx=`echo $test_fields | awk -F: '{print $3}'`
+    sys=`echo $test_fields | awk -F: '{print $4}'`
+    $mypython MaskScorer.py -t $task --refDir $TESTDIR -r $ref -x $idx -s $TESTDIR/$sys/$sys.csv -oR $TESTDIR/striptest_whole/$sys -p $procs --speedup --eks 21 --precision 12
+    $mypython MaskScorer.py -t $task --refDir $TESTDIR -r $ref -x $idx -s $TESTDIR/$sys/$sys.csv -oR $TESTDIR/striptest_strip/$sys -p $procs --speedup --eks 21 --strip_rows 4 --precision 12
+done
+
+flagsum=0
+
+#the scores in strips must match the scores over the whole masks
+for sys in B_NC2017_Unittest_Manipulation_ImgOnly_c-me2_1 B_NC2017_Unittest_Splice_ImgOnly_p-me_1; do
+    for f_sfx in _mask_score _mask_scores_perimage _journalResults; do
+        check_file $TESTDIR/striptest_whole/${sys}${f_sfx}.csv $TESTDIR/striptest_strip/${sys}${f_sfx}.csv comp_maskreport_strip_${sys}${f_sfx}.txt
+        flagsum=$((flagsum+$?))
+    done
+done
+
+#score a copy of a system output incrementally, then change one of its masks and score it again
+sys=B_NC2017_Unittest_Manipulation_ImgOnly_c-me2_1
+rm -rf $TESTDIR/incrtest_sys $TESTDIR/incrtest_cache
+mkdir -p $TESTDIR/incrtest_sys
+cp -r $TESTDIR/$sys $TESTDIR/incrtest_sys/
+$mypython MaskScorer.py -t manipulation --refDir $TESTDIR -r reference/manipulation/NC2017-manipulation-ref.csv -x indexes/NC2017-manipulation-index.csv -s $TESTDIR/incrtest_sys/$sys/$sys.csv -oR $TESTDIR/incrtest_1/$sys -p $procs --speedup --precision 12 --incremental --cache_dir $TESTDIR/incrtest_cache -v 1 > incrlog_1.txt
+#only the probe 07e65ca7be451f9fc756e9cc7a458eb6 uses plus-mask.png
+$mypython -c "import cv2; m = cv2.imread('$TESTDIR/incrtest_sys/$sys/mask/plus-mask.png',0); cv2.imwrite('$TESTDIR/incrtest_sys/$sys/mask/plus-mask.png',255 - m)"
+$mypython MaskScorer.py -t manipulation --refDir $TESTDIR -r reference/manipulation/NC2017-manipulation-ref.csv -x indexes/NC2017-manipulation-index.csv -s $TESTDIR/incrtest_sys/$sys/$sys.csv -oR $TESTDIR/incrtest_2/$sys -p $procs --speedup --precision 12 --incremental --cache_dir $TESTDIR/incrtest_cache -v 1 > incrlog_2.txt
+$mypython MaskScorer.py -t manipulation --refDir $TESTDIR -r reference/manipulation/NC2017-manipulation-ref.csv -x indexes/NC2017-manipulation-index.csv -s $TESTDIR/incrtest_sys/$sys/$sys.csv -oR $TESTDIR/incrtest_whole/$sys -p $procs --speedup --precision 12
+
+if `grep -q "Score store.*: 0 reused, 4 scored" incrlog_1.txt` && `grep -q "Score store.*: 3 reused, 1 scored" incrlog_2.txt` && `grep -q "Reusing the stored scores of ProbeFileID 43e1d6f0a9306a629a51062729549d76-2" incrlog_2.txt` && ! `grep -q "Reusing the stored scores of ProbeFileID 07e65ca7be451f9fc756e9cc7a458eb6" incrlog_2.txt` ; then
+    rm incrlog_1.txt incrlog_2.txt
+else
+    echo "ERROR: The incremental run did not score only the probe whose mask changed."
+    flagsum=$((flagsum+1))
+fi
+
+#the incremental scores must match the scores of the changed system output scored anew
+for f_sfx in _mask_score _mask_scores_perimage _journalResults; do
+    check_file $TESTDIR/incrtest_whole/${sys}${f_sfx}.csv $TESTDIR/incrtest_2/${sys}${f_sfx}.csv comp_maskreport_incr_${sys}${f_sfx}.txt
+    flagsum=$((flagsum+$?))
+done
+
+if ([ $flagsum -eq 0 ]); then
+  echo
+  echo "CASE 4 SUCCESSFULLY PASSED"
+  echo
+	if [ $clean = "TRUE" ] ; then
+		rm -rf $TESTDIR/striptest_whole
+		rm -rf $TESTDIR/striptest_strip
+		rm -rf $TESTDIR/incrtest_sys $TESTDIR/incrtest_cache
+		rm -rf $TESTDIR/incrtest_1 $TESTDIR/incrtest_2 $TESTDIR/incrtest_whole
+	fi
+else
+  echo
+  echo "    !!!!! MASK SCORER TEST FAILED AT CASE 4 !!!!!    "
+  echo
+  exit 1
+fi
@@ -0,0 +1,123 @@
+#!/bin/bash
+procs=4
+source test_init.sh
+TESTDIR=../../data/test_suite/maskScorerTests
+
+echo
+echo "CASE 5: VALIDATING DEFERRED RENDERING AND ARTIFACTS"
+echo
+
+flagsum=0
+
+#checks that each of the files exists, or with -n that none of them do
+check_exist(){
+    expect=1
+    if [ "$1" = "-n" ]; then
+        expect=0
+        shift
+    fi
+    for f in "$@"; do
+        if ([ -f $f ] && [ $expect -eq 0 ]) || ([ ! -f $f ] && [ $expect -eq 1 ]); then
+            if [ $expect -eq 1 ]; then
+                echo "ERROR: Expected $f. Failed to generate the file."
+            else
+                echo "ERROR: Did not expect $f."
+            fi
+            return 1
+        fi
+    done
+    return 0
+}
+
+#score with the rendering deferred, then render the worst probe, and the probes matching a query
+sys=B_NC2017_Unittest_Manipulation_ImgOnly_c-me2_1
+outdir=$TESTDIR/rendertest
+$mypython MaskScorer.py -t manipulation --refDir $TESTDIR -r reference/manipulation/NC2017-manipulation-ref.csv -x indexes/NC2017-manipulation-index.csv -s $TESTDIR/$sys/$sys.csv -oR $outdir/$sys -p $procs --speedup -html --deferRender --precision 12
+
+probes="07e65ca7be451f9fc756e9cc7a458eb6 43e1d6f0a9306a629a51062729549d76 43e1d6f0a9306a629a51062729549d76-2 43e1d6f0a9306a629a51062729549d76-3"
+for p in $probes; do
+    check_exist $outdir/$p/renderData.npz
+    flagsum=$((flagsum+$?))
+    check_exist -n $outdir/$p/$p.html $outdir/$p/thresMets.png $outdir/$p/roc.pdf
+    flagsum=$((flagsum+$?))
+done
+
+#07e65ca7be451f9fc756e9cc7a458eb6 has the lowest OptimumMCC, and 43e1d6f0a9306a629a51062729549d76-2 the only one over 0.75
+$mypython MaskReportRenderer.py -oR $outdir/$sys --worst 1
+$mypython MaskReportRenderer.py -oR $outdir/$sys -q "OptimumMCC > 0.75" --rocFormat png
+
+check_exist $outdir/07e65ca7be451f9fc756e9cc7a458eb6/07e65ca7be451f9fc756e9cc7a458eb6.html $outdir/07e65ca7be451f9fc756e9cc7a458eb6/thresMets.png $outdir/07e65ca7be451f9fc756e9cc7a458eb6/roc.pdf $outdir/07e65ca7be451f9fc756e9cc7a458eb6/plus-mask_colored.jpg $outdir/07e65ca7be451f9fc756e9cc7a458eb6/plus-mask_composite.jpg
+flagsum=$((flagsum+$?))
+check_exist $outdir/43e1d6f0a9306a629a51062729549d76-2/43e1d6f0a9306a629a51062729549d76-2.html $outdir/43e1d6f0a9306a629a51062729549d76-2/thresMets.png $outdir/43e1d6f0a9306a629a51062729549d76-2/roc.png
+flagsum=$((flagsum+$?))
+for p in 43e1d6f0a9306a629a51062729549d76 43e1d6f0a9306a629a51062729549d76-3; do
+    check_exist -n $outdir/$p/$p.html $outdir/$p/thresMets.png $outdir/$p/roc.pdf $outdir/$p/roc.png
+    flagsum=$((flagsum+$?))
+done
+
+#score with each kind of artifacts kept
+for a in none summary full; do
+    $mypython MaskScorer.py -t manipulation --refDir $TESTDIR -r reference/manipulation/NC2017-manipulation-ref.csv -x indexes/NC2017-manipulation-index.csv -s $TESTDIR/$sys/$sys.csv -oR $TESTDIR/artifacttest_$a/$sys -p $procs --speedup --sbin 128 --precision 12 --artifacts $a
+done
+$mypython MaskScorer.py -t splice --refDir $TESTDIR -r reference/splice/NC2017-splice-ref.csv -x indexes/NC2017-splice-index.csv -s $TESTDIR/B_NC2017_Unittest_Splice_ImgOnly_p-me_1/B_NC2017_Unittest_Splice_ImgOnly_p-me_1.csv -oR $TESTDIR/artifacttest_splice/B_NC2017_Unittest_Splice_ImgOnly_p-me_1 -p $procs --speedup --precision 12 --artifacts summary
+
+#the scores do not depend on the artifacts kept
+for a in summary full; do
+    for f_sfx in _mask_score _mask_scores_perimage _journalResults; do
+        check_file $TESTDIR/artifacttest_none/${sys}${f_sfx}.csv $TESTDIR/artifacttest_$a/${sys}${f_sfx}.csv comp_maskreport_artifacts_${a}${f_sfx}.txt
+        flagsum=$((flagsum+$?))
+    done
+done
+
+#none keeps nothing, summary keeps only the threshold tables, and full also keeps the binarized system output masks
+check_exist -n $TESTDIR/artifacttest_none/${sys}_thresMets.npz
+flagsum=$((flagsum+$?))
+check_exist $TESTDIR/artifacttest_summary/${sys}_thresMets.npz $TESTDIR/artifacttest_full/${sys}_thresMets.npz $TESTDIR/artifacttest_splice/B_NC2017_Unittest_Splice_ImgOnly_p-me_1_probe_thresMets.npz $TESTDIR/artifacttest_splice/B_NC2017_Unittest_Splice_ImgOnly_p-me_1_donor_thresMets.npz
+flagsum=$((flagsum+$?))
+for a in none summary; do
+    if [ `ls -d $TESTDIR/artifacttest_$a/*/ 2>/dev/null | wc -l` -ne 0 ]; then
+        echo "ERROR: Did not expect the probe directories in $TESTDIR/artifacttest_$a."
+        flagsum=$((flagsum+1))
+    fi
+done
+check_exist $TESTDIR/artifacttest_full/07e65ca7be451f9fc756e9cc7a458eb6/plus-mask-actual_bin.png\
+            $TESTDIR/artifacttest_full/43e1d6f0a9306a629a51062729549d76/leaves-mask-actual_bin.png\
+            $TESTDIR/artifacttest_full/43e1d6f0a9306a629a51062729549d76-2/leaves-mask-graydient-actual_bin.png\
+            $TESTDIR/artifacttest_full/43e1d6f0a9306a629a51062729549d76-3/leaves-mask-actual_bin.png
+flagsum=$((flagsum+$?))
+
+#the threshold tables hold every probe's confusion measures, and full adds the metrics to the same columns
+$mypython -c "
+import numpy as np
+summary = np.load('$TESTDIR/artifacttest_summary/${sys}_thresMets.npz')
+full = np.load('$TESTDIR/artifacttest_full/${sys}_thresMets.npz')
+ok = sorted(summary.files) == sorted(['ProbeFileID','Threshold','TP','TN','FP','FN','N'])
+ok = ok and (set(summary.files) < set(full.files)) and (set(['NMM','MCC','BWL1','BNS','SNS','PNS','TPR','FPR']) <= set(full.files))
+ok = ok and all([np.array_equal(summary[c],full[c]) for c in summary.files])
+ok = ok and (sorted(set(summary['ProbeFileID'])) == sorted('$probes'.split()))
+ok = ok and np.array_equal(summary['TP'] + summary['TN'] + summary['FP'] + summary['FN'],summary['N'])
+for root in ['probe','donor']:
+    splice = np.load('$TESTDIR/artifacttest_splice/B_NC2017_Unittest_Splice_ImgOnly_p-me_1_%s_thresMets.npz' % root)
+    ok = ok and (sorted(splice.files) == sorted(['ProbeFileID','DonorFileID','Threshold','TP','TN','FP','FN','N']))
+    ok = ok and (splice['ProbeFileID'].shape[0] > 0)
+exit(0 if ok else 1)
+"
+if [ $? -ne 0 ]; then
+    echo "ERROR: The threshold tables saved do not match the artifacts kept."
+    flagsum=$((flagsum+1))
+fi
+
+if ([ $flagsum -eq 0 ]); then
+  echo
+  echo "CASE 5 SUCCESSFULLY PASSED"
+  echo
+	if [ $clean = "TRUE" ] ; then
+		rm -rf $outdir
+		rm -rf $TESTDIR/artifacttest_none $TESTDIR/artifacttest_summary $TESTDIR/artifacttest_full $TESTDIR/artifacttest_splice
+	fi
+else
+  echo
+  echo "    !!!!! MASK SCORER TEST FAILED AT CASE 5 !!!!!    "
+  echo
+  exit 1
+fi
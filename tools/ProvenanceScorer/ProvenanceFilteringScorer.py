@@ -1,10 +1,14 @@
 #!/usr/bin/env python2
 import os
+import sys
+lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib")
+sys.path.append(lib_path)
 import json
 import argparse
 import errno
 import numpy as np
 import pandas as pd
+import csvCache
 # from arghelper import Args
 
 
@@ -28,8 +32,11 @@ def load_json(json_fn):
         err_quit("{}. Aborting!".format(ioerr))
 
 
-def load_csv(csv_fn, sep="|"):
+def load_csv(csv_fn, sep="|", cached=False):
     try:
+        if cached:
+            # reference files, which are read for every system scored
+            return csvCache.read_csv(csv_fn, sep=sep)
         return pd.read_csv(csv_fn, sep)
     except IOError as ioerr:
         err_quit("{}. Aborting!".format(ioerr))
@@ -84,13 +91,13 @@ def check_for_trial_disparity(trial_index, system_output_index, only_warn_on_ext
 
 def create_data_dataframes(args, log):
     # TaskID, ProvenanceProbeFileID, ProvenanceProbeFileName, ProvenanceProbeWidth, ProvenanceProbeHeight
-    trial_index = load_csv(args.index_file)
+    trial_index = load_csv(args.index_file, cached=True)
     # TaskID, ProvenanceProbeFileID, ProvenanceProbeFileName, BaseFileName, BaseBrowserFileName, JournalName, JournalFileName, JournalMD5
-    ref_file = load_csv(args.reference_file)
+    ref_file = load_csv(args.reference_file, cached=True)
     # ProvenanceProbeFileID, WorldFileID, WorldFileName, JournalNodeID
-    nodes_file = load_csv(args.node_file)
+    nodes_file = load_csv(args.node_file, cached=True)
     # TaskID, WorldFileID, WorldFileName, WorldWidth, WorldHeight
-    world_index = load_csv(args.world_file)
+    world_index = load_csv(args.world_file, cached=True)
     # ProvenanceProbeFileID, ProvenanceOutputFileName, ProvenanceProbeStatus
     system_output_index = load_csv(args.system_output_file)
 
@@ -9,6 +9,7 @@ import json
 import argparse
 from pandas import DataFrame, read_csv, merge, set_option
 import errno
+import csvCache
 
 from ProvenanceGraphBuilding import *
 from ProvenanceMetrics import *
@@ -31,8 +32,11 @@ def load_json(json_fn):
     except IOError as ioerr:
         err_quit("{}. Aborting!".format(ioerr))
 
-def load_csv(csv_fn, sep="|"):
+def load_csv(csv_fn, sep="|", cached=False):
     try:
+        if cached:
+            # reference files, which are read for every system scored
+            return csvCache.read_csv(csv_fn, sep=sep)
         return read_csv(csv_fn, sep)
     except IOError as ioerr:
         err_quit("{}. Aborting!".format(ioerr))
@@ -100,10 +104,10 @@ if __name__ == '__main__':
     verbosity_threshold = 1 if args.verbose else 0
     log = build_logger(verbosity_threshold)
 
-    trial_index = load_csv(args.index_file)
-    ref_file = load_csv(args.reference_file)
-    nodes_file = load_csv(args.node_file)
-    world_index = load_csv(args.world_file)
+    trial_index = load_csv(args.index_file, cached=True)
+    ref_file = load_csv(args.reference_file, cached=True)
+    nodes_file = load_csv(args.node_file, cached=True)
+    world_index = load_csv(args.world_file, cached=True)
 
     abs_reference_dir = os.path.abspath(args.reference_dir)
 
@@ -49,6 +49,8 @@ from abc import ABCMeta, abstractmethod
 lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),'../../lib')
 sys.path.append(lib_path)
 #from printbuffer import printbuffer
+from scheduler import imap_largest_first,batch_largest_first
+import csvCache
 
 #print_lock = multiprocessing.Lock() #for printout
 
@@ -64,6 +66,16 @@ def printq(mystring,iserr=False):
     if iserr:
         print(mystring)
 
+def read_mask_dims(maskname):
+    #decode the whole mask rather than only its header, so that corrupt masks fail validation
+    try:
+        mat = cv2.imread(maskname,cv2.IMREAD_UNCHANGED)
+    except cv2.error:
+        return None
+    if mat is None:
+        return None
+    return mat.shape
+
 def is_finite_number(s):
     try:
         s = float(s)
@@ -78,8 +90,12 @@ def is_integer(s):
     except ValueError:
         return False
 
-def checkProbe(args):
-    return SSD_Validator.checkMoreProbes(*args)
+#the validator used by the worker processes. It is set before the pool is created so that the
+#workers inherit it when forked, rather than having it pickled along with every task.
+shared_validator = None
+
+def checkProbe(rows):
+    return shared_validator.checkMoreProbes(shared_validator.maskData.iloc[rows])
 
 class validator:
     __metaclass__ = ABCMeta
@@ -252,7 +268,7 @@ class SSD_Validator(validator):
                  'ProbeWidth':np.int64,
                  'ProbeHeight':np.int64}
         
-        idxfile = pd.read_csv(self.idxname,sep='|',dtype=index_dtype,na_filter=False)
+        idxfile = csvCache.read_csv(self.idxname,sep='|',dtype=index_dtype,na_filter=False)
         sysfile = pd.read_csv(self.sysname,sep='|',na_filter=False)
         idxmini = 0
         self.identify = identify
@@ -316,7 +332,7 @@ class SSD_Validator(validator):
 
         if reffname is not 0:
             #filter idxfile based on ProbeFileID's in reffile
-            reffile = pd.read_csv(reffname,sep='|',na_filter=False)
+            reffile = csvCache.read_csv(reffname,sep='|',na_filter=False)
             #set up dual-ID's for the relevant task
             if self.task == 'camera':
                 reffile['ProbeCamID'] = reffile['ProbeFileID'] + ":" + reffile['TrainCamID']
@@ -446,13 +462,19 @@ class SSD_Validator(validator):
             processors = max(maxprocs,1)
 
         if processors > 1:
-            chunksize = nrow//processors
-            maskDataS = [[self,maskData[i:(i+chunksize)]] for i in range(0,nrow,chunksize)]
-            p = multiprocessing.Pool(processes=processors)
-            maskDataS = p.map(checkProbe,maskDataS)
-            p.close()
-            p.join()
-            maskData = pd.concat(maskDataS)
+            #check the rows in batches of about equal total size, handing out the largest masks first to whichever processor is free.
+            #Only the positions of the rows are sent to the processes, which read the rows from their copy of the validator
+            batches,batch_sizes = batch_largest_first(self.getProbeSizes(maskData),4*processors)
+            self.maskData = maskData
+            global shared_validator
+            shared_validator = self
+            try:
+                maskDataS = imap_largest_first(checkProbe,batches,batch_sizes,processors)
+            finally:
+                del self.maskData
+            #put the rows back in their original order
+            positions = [i for batch in batches for i in batch]
+            maskData = pd.concat(maskDataS).iloc[np.argsort(positions,kind='mergesort')]
         else:
             maskData = self.checkMoreProbes(maskData)
         #add all mask 'Message' entries to printBuffer
@@ -460,6 +482,15 @@ class SSD_Validator(validator):
 
         return maskData
 
+    def getProbeSizes(self,maskData):
+        #the number of pixels in each probe according to the index file, 0 where not found
+        idxcols = list(self.idxfile)
+        if not set(['ProbeFileID','ProbeWidth','ProbeHeight']).issubset(idxcols) or ('ProbeFileID' not in list(maskData)):
+            return [0]*len(maskData)
+        dims = self.idxfile[['ProbeFileID','ProbeWidth','ProbeHeight']].drop_duplicates('ProbeFileID').set_index('ProbeFileID')
+        npx = dims['ProbeWidth'].astype(np.int64)*dims['ProbeHeight'].astype(np.int64)
+        return [int(npx.get(i,0)) for i in maskData['ProbeFileID']]
+
     def checkMoreProbes(self,maskData):
         return maskData.apply(self.checkOneProbe,axis=1,reduce=False)
 
@@ -585,9 +616,8 @@ class SSD_Validator(validator):
             dimoutput = subprocess.check_output(["identify","-format","'%f|%w|%h'",maskname]).rstrip().replace("'","").split('|')
             dims = (int(dimoutput[2]),int(dimoutput[1]))
         else:
-            try:
-                dims = cv2.imread(maskname,cv2.IMREAD_UNCHANGED).shape
-            except:
+            dims = read_mask_dims(maskname)
+            if dims is None:
                 msg.append("ERROR: system probe mask {} cannot be read as a png.".format(maskname))
                 return 1,"\n".join(msg)
     
@@ -1096,10 +1126,9 @@ class DSD_Validator(validator):
             dimoutput = subprocess.check_output(["identify","-format","'%f|%w|%h'",maskname]).rstrip().replace("'","").split('|')
             dims = (int(dimoutput[2]),int(dimoutput[1]))
         else:
-            try:
-                dims = cv2.imread(maskname,cv2.IMREAD_UNCHANGED).shape
-            except:
-                self.printbuffer.put("ERROR: system probe mask {} cannot be read as a png.".format(maskname))
+            dims = read_mask_dims(maskname)
+            if dims is None:
+                self.printbuffer.put("ERROR: {} mask {} cannot be read as a png.".format(mode,maskname))
                 return 1
     
         if (probeHeight != dims[0]) or (probeWidth != dims[1]):
@@ -1152,7 +1181,10 @@ class DSD_Validator(validator):
     
         pbaseHeight = list(map(int,indexfile['ProbeHeight'][(indexfile['ProbeFileID'] == probeid) & (indexfile['DonorFileID'] == donorid)]))[0] 
         pbaseWidth = list(map(int,indexfile['ProbeWidth'][(indexfile['ProbeFileID'] == probeid) & (indexfile['DonorFileID'] == donorid)]))[0]
-        pdims = cv2.imread(pmaskname,cv2.IMREAD_UNCHANGED).shape
+        pdims = read_mask_dims(pmaskname)
+        if pdims is None:
+            self.printbuffer.put("ERROR: Probe mask {} cannot be read as a png.".format(pmaskname))
+            return 1
     
         if len(pdims)>2:
             self.printbuffer.put("ERROR: {} is not single-channel. It has {} channels. Make it single-channel.".format(pmaskname,pdims[2]))
@@ -1164,7 +1196,10 @@ class DSD_Validator(validator):
          
         dbaseHeight = list(map(int,indexfile['DonorHeight'][(indexfile['ProbeFileID'] == probeid) & (indexfile['DonorFileID'] == donorid)]))[0] 
         dbaseWidth = list(indexfile['DonorWidth'][(indexfile['ProbeFileID'] == probeid) & (indexfile['DonorFileID'] == donorid)])[0]
-        ddims = cv2.imread(dmaskname,cv2.IMREAD_UNCHANGED).shape
+        ddims = read_mask_dims(dmaskname)
+        if ddims is None:
+            self.printbuffer.put("ERROR: Donor mask {} cannot be read as a png.".format(dmaskname))
+            return 1
     
         if len(ddims)>2:
             self.printbuffer.put("ERROR: {} is not single-channel. It has {} channels. Make it single-channel.".format(dmaskname,ddims[2]))
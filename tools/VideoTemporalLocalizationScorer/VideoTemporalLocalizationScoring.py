@@ -6,9 +6,13 @@ Created on Mon Nov 20 16:27:22 2017
 @author: tnk12
 """
 import os
+import sys
 import argparse
 import numpy as np
 import pandas as pd
+lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../lib")
+sys.path.append(lib_path)
+import csvCache
 from shutil import copytree
 from intervalcompute import IntervalCompute as IC
 from TemporalVideoScoring import VideoScoring
@@ -61,10 +65,10 @@ class VTLScorer():
         self.path_index = path_index
         self.path_journalmask = path_journalmask
         self.path_probejournaljoin = path_probejournaljoin
-        self.df_ref = pd.read_csv(path_ref, sep = delimiter)
-        self.df_index = pd.read_csv(path_index, sep = delimiter)
-        self.df_journalmask = pd.read_csv(path_journalmask, sep = delimiter)
-        self.df_probejournaljoin = pd.read_csv(path_probejournaljoin, sep = delimiter)
+        self.df_ref = csvCache.read_csv(path_ref, sep = delimiter)
+        self.df_index = csvCache.read_csv(path_index, sep = delimiter)
+        self.df_journalmask = csvCache.read_csv(path_journalmask, sep = delimiter)
+        self.df_probejournaljoin = csvCache.read_csv(path_probejournaljoin, sep = delimiter)
         
         self.df_ref_probe_journal_merge = pd.merge(self.df_probejournaljoin,self.df_journalmask, on=["JournalName","StartNodeID","EndNodeID"])
         self.df_ref_probe_journal_index_merge = pd.merge(self.df_ref_probe_journal_merge, self.df_index, on=["ProbeFileID"])